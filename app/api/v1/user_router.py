@@ -1,6 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+import json
+from dataclasses import asdict
+from typing import Any, Callable, Iterator, List, Literal, Optional
+from fastapi import APIRouter, UploadFile, File, Depends, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from app.use_cases.user.user_use_case import UserUseCase
-from app.domain.user import NewUser, User
+from app.domain.user import NewUser, User, UserAggregation, UserDedupStrategy, UserField, UserImportMode
+from app.interfaces.user_repository import UserGrouping
+from app.infrastructure.services.response_cache import ResponseCache
+from app.infrastructure.services.import_jobs import ImportJobManager
+from app.infrastructure.services.upload_cache import UploadCache
 from app.di.container import container
 from app.core.settings import settings
 
@@ -11,6 +19,45 @@ def get_user_use_case() -> UserUseCase:
     """依賴項函數，提供 UserUseCase 實例"""
     return container.user_use_case()
 
+def get_response_cache() -> ResponseCache:
+    """依賴項函數，提供 ResponseCache 實例"""
+    return container.response_cache()
+
+def get_import_jobs() -> ImportJobManager:
+    """依賴項函數，提供 ImportJobManager 實例"""
+    return container.import_jobs()
+
+def get_upload_cache() -> UploadCache:
+    """依賴項函數，提供 UploadCache 實例"""
+    return container.upload_cache()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """檢查 If-None-Match 是否包含 etag（忽略弱驗證前綴 W/）"""
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def versioned_json(request: Request, use_case: UserUseCase, cache: ResponseCache,
+                   render: Callable[[], Any]) -> Response:
+    """依資料版本快取編碼後的 JSON；資料未變時以 304 回應，不重新計算也不重新序列化"""
+    version = use_case.get_data_version()
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    key = (request.url.path, request.url.query)
+    body = cache.get(key, version)
+    if body is None:
+        body = JSONResponse(content=render()).body
+        if use_case.get_data_version() != version:
+            # 計算期間有寫入，無法確定內容對應哪個版本：不快取也不附 ETag
+            return Response(content=body, media_type="application/json")
+        cache.put(key, version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def percentile_keys(values: dict) -> dict:
+    """JSON 的 key 必須是字串，以最短表示法呈現百分位數（50.0 -> "50"）"""
+    return {f"{q:g}": value for q, value in values.items()}
+
 @router.post("/create_user")
 def create_user(user: NewUser, use_case: UserUseCase = Depends(get_user_use_case)):
     return use_case.create_user(user)
@@ -19,31 +66,186 @@ def create_user(user: NewUser, use_case: UserUseCase = Depends(get_user_use_case
 def delete_user(user: User, use_case: UserUseCase = Depends(get_user_use_case)):
     return use_case.delete_user(user)
 
+# 資料已在 repository 端驗證過，直接編碼成 JSON 以略過 jsonable_encoder
 @router.get("/get_added_user")
-def get_added_user(use_case: UserUseCase = Depends(get_user_use_case)):
-    added_user_list = use_case.get_added_user()
-    res = [d.model_dump() for d in added_user_list]
-    return res
+def get_added_user(
+    request: Request,
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    return versioned_json(request, use_case, cache, use_case.get_added_user_records)
+
+def iter_ndjson(chunks: Iterator[list]) -> Iterator[bytes]:
+    """將每個 chunk 編碼成 NDJSON（一行一筆）"""
+    for chunk in chunks:
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk).encode()
 
 @router.get("/get_all_users")
-def get_all_users(use_case: UserUseCase = Depends(get_user_use_case)):
-    all_users = use_case.get_all_users()
-    res = [{'is_new': isinstance(d, NewUser), **d.model_dump()} for d in all_users]
+def get_all_users(
+    request: Request,
+    cursor: Optional[int] = Query(None, description="上一頁回傳的 next_cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.users_page_size_max),
+    format: Literal["json", "ndjson"] = "json",
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    # NDJSON：逐 chunk 串流，記憶體用量與總筆數無關
+    if format == "ndjson":
+        chunks = use_case.iter_user_record_chunks(settings.users_stream_chunk_size, cursor)
+        return StreamingResponse(iter_ndjson(chunks), media_type="application/x-ndjson")
+    # 不帶分頁參數時維持原本的完整陣列
+    if cursor is None and limit is None:
+        return versioned_json(request, use_case, cache, use_case.get_all_user_records)
+
+    def render_page():
+        users, next_cursor = use_case.get_user_records_page(cursor, limit or settings.users_page_size)
+        return {"users": users, "next_cursor": next_cursor}
+    return versioned_json(request, use_case, cache, render_page)
+
+@router.get("/users/by_name/{name}")
+def get_users_by_name(name: str, use_case: UserUseCase = Depends(get_user_use_case)):
+    users = use_case.get_users_by_name(name)
+    res = [{'is_new': isinstance(d, NewUser), **d.model_dump()} for d in users]
     return res
 
+@router.get("/users/by_age")
+def get_users_by_age(
+    request: Request,
+    min_age: Optional[int] = Query(None, ge=0),
+    max_age: Optional[int] = Query(None, ge=0),
+    limit: int = Query(settings.users_page_size, ge=1, le=settings.users_page_size_max),
+    offset: int = Query(0, ge=0),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    def render():
+        users, total = use_case.get_users_by_age(min_age, max_age, limit, offset)
+        return {"users": users, "total": total}
+    return versioned_json(request, use_case, cache, render)
+
+@router.get("/users/age_percentiles")
+def get_age_percentiles(
+    request: Request,
+    q: List[float] = Query([50.0], description="百分位數（0-100），50 為中位數"),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    return versioned_json(request, use_case, cache,
+                          lambda: percentile_keys(use_case.get_age_percentiles(q)))
+
+@router.get("/users/top_by_age")
+def get_users_by_age_rank(
+    request: Request,
+    order: Literal["oldest", "youngest"] = "oldest",
+    limit: int = Query(10, ge=1, le=settings.users_page_size_max),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    return versioned_json(request, use_case, cache,
+                          lambda: use_case.get_users_by_age_rank(limit, order == "oldest"))
+
+@router.get("/users/sketch_stats")
+def get_sketch_stats(
+    request: Request,
+    q: List[float] = Query([50.0, 90.0, 99.0], description="年齡百分位數（0-100）"),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    # 近似統計：t-digest 百分位數、HyperLogLog 不重複名稱數、年齡直方圖
+    def render():
+        stats = use_case.get_sketch_stats(q)
+        summaries = [*stats["groups"].values(), stats["total"]]
+        for summary in summaries:
+            summary["percentiles"] = percentile_keys(summary["percentiles"])
+        return stats
+    return versioned_json(request, use_case, cache, render)
+
+@router.get("/users/sketches")
+def export_sketches(use_case: UserUseCase = Depends(get_user_use_case)):
+    # 二進位格式，可由其他 worker 以 UserSketches.from_bytes 讀回並合併
+    return Response(content=use_case.export_sketches(), media_type="application/octet-stream")
+
+@router.get("/users/search")
+def search_users(
+    request: Request,
+    prefix: str = Query(..., min_length=1, description="名稱前綴（區分大小寫）"),
+    limit: int = Query(settings.users_search_limit, ge=1, le=settings.users_page_size_max),
+    offset: int = Query(0, ge=0),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    # 以排序名稱索引二分搜尋，不逐列掃描 Name 欄位
+    return versioned_json(request, use_case, cache,
+                          lambda: use_case.search_users(prefix, limit, offset))
+
+@router.get("/users/storage")
+def get_storage_stats(
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache),
+    upload_cache: UploadCache = Depends(get_upload_cache)
+):
+    return {**use_case.get_storage_stats(), **cache.get_stats(), **upload_cache.get_stats()}
+
+@router.get("/users/memory")
+def get_memory_usage(use_case: UserUseCase = Depends(get_user_use_case)):
+    return use_case.get_memory_usage()
+
+@router.get("/users/stats")
+def get_user_stats(
+    request: Request,
+    group_by: str = UserField.NAME.value,
+    field: str = UserField.AGE.value,
+    prefix: Optional[int] = Query(None, ge=1, description="以前 N 個字元分組"),
+    bucket: Optional[int] = Query(None, ge=1, description="數值欄位以此寬度分桶"),
+    casefold: bool = False,
+    agg: List[UserAggregation] = Query([UserAggregation.COUNT, UserAggregation.MEAN]),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    # 一次掃描計算所有聚合，取代多次呼叫各自的分組 API
+    grouping = UserGrouping(group_by, prefix_length=prefix, bucket_size=bucket, casefold=casefold)
+    return versioned_json(request, use_case, cache,
+                          lambda: use_case.get_user_stats(grouping, field, agg))
+
 @router.post("/add_multiple_users_from_csv")
 def add_multiple_users_from_csv(
     file: UploadFile = File(...),
+    mode: UserImportMode = Query(UserImportMode.STRICT, description="strict：有不合格列即整批拒絕；partial：略過不合格列"),
+    on_duplicate: UserDedupStrategy = Query(UserDedupStrategy.APPEND, description="與既有使用者重複時：append、skip_duplicates 或 upsert"),
     use_case: UserUseCase = Depends(get_user_use_case)
 ):
-    temp_file_path = f"{settings.csv_upload_path}/{file.filename}"
-    with open(temp_file_path, "wb") as f:
-        f.write(file.file.read())
-    users = use_case.load_users_from_csv(temp_file_path)
-    return use_case.add_multiple_users(users)
+    # 直接從上傳的暫存檔分塊解析並寫入，不把整個檔案讀進記憶體，也不另存到 csv_upload_path
+    report = use_case.import_users_from_csv(file.file, settings.csv_import_chunk_size, mode,
+                                            settings.csv_import_rejection_limit, strategy=on_duplicate)
+    return {"imported": report.imported, "inserted": report.inserted, "skipped": report.skipped,
+            "updated": report.updated, "rejected_count": report.rejected_count,
+            "rejected": [asdict(row) for row in report.rejected]}
+
+@router.post("/imports", status_code=202)
+def create_import_job(
+    file: UploadFile = File(...),
+    mode: UserImportMode = Query(UserImportMode.STRICT, description="strict：有不合格列即整批拒絕；partial：略過不合格列"),
+    on_duplicate: UserDedupStrategy = Query(UserDedupStrategy.APPEND, description="與既有使用者重複時：append、skip_duplicates 或 upsert"),
+    use_case: UserUseCase = Depends(get_user_use_case),
+    jobs: ImportJobManager = Depends(get_import_jobs)
+):
+    # 只把上傳檔存到磁碟並排入佇列，立即回傳工作 id；以 GET /imports/{id} 查詢進度
+    return jobs.submit(use_case.import_users_from_csv, file.file, mode, on_duplicate).to_dict()
+
+@router.get("/imports/{job_id}")
+def get_import_job(job_id: str, jobs: ImportJobManager = Depends(get_import_jobs)):
+    return jobs.get(job_id).to_dict()
+
+@router.delete("/imports/{job_id}")
+def cancel_import_job(job_id: str, jobs: ImportJobManager = Depends(get_import_jobs)):
+    # 執行中的工作在目前的 chunk 寫入後停止，已寫入的資料保留
+    return jobs.cancel(job_id).to_dict()
 
 @router.get("/calc_average_age_of_user_grouped_by_first_char_of_name")
 def calc_average_age_of_user_grouped_by_first_char_of_name(
-    use_case: UserUseCase = Depends(get_user_use_case)
+    request: Request,
+    use_case: UserUseCase = Depends(get_user_use_case),
+    cache: ResponseCache = Depends(get_response_cache)
 ):
-    return use_case.calc_average_age_grouped_by_first_char_of_name()
+    return versioned_json(request, use_case, cache,
+                          use_case.calc_average_age_grouped_by_first_char_of_name)
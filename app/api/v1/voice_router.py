@@ -5,6 +5,7 @@ from app.use_cases.speech.recognize_speech_use_case import RecognizeSpeechUseCas
 from app.use_cases.user.user_use_case import UserUseCase
 from app.domain.user import NewUser, User
 from app.di.container import container
+from app.core.settings import settings
 from app.interfaces.command_understanding import ICommandUnderstanding
 from app.interfaces.command_operations import ICommandOperations
 
@@ -91,13 +92,13 @@ async def execute_command(
             return {"action": "delete_user_by_name", "command": text, "data": result}
             
         elif action == "get_all_users":
-            all_users = user_use_case.get_all_users()
-            result = [{'is_new': isinstance(user, NewUser), **user.model_dump()} for user in all_users]
-            return {"action": "get_all_users", "command": text, "data": result}
+            # 只回傳第一頁，其餘以 next_cursor 呼叫 GET /api/v1/get_all_users 取得
+            result, next_cursor = user_use_case.get_user_records_page(None, settings.users_page_size)
+            return {"action": "get_all_users", "command": text, "data": result,
+                    "next_cursor": next_cursor}
 
         elif action == "get_added_user":
-            added_users = user_use_case.get_added_user()
-            result = [user.model_dump() for user in added_users]
+            result = user_use_case.get_added_user_records()
             return {"action": "get_added_user", "command": text, "data": result}
             
         elif action == "calc_average_age":
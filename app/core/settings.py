@@ -3,6 +3,57 @@ from pathlib import Path
 
 class Settings(BaseSettings):
     csv_path: Path = Path("data/backend_users.csv")
+    # 背景匯入工作暫存上傳檔的目錄，工作結束後刪除
     csv_upload_path: Path = Path("data/upload")
+    # 上傳 CSV 分塊匯入時每塊的列數
+    csv_import_chunk_size: int = 50000
+    # 匯入報告最多列出幾筆被拒絕的列（總數仍會完整計算）
+    csv_import_rejection_limit: int = 1000
+    # 以檔案路徑匯入（種子檔、批次匯入）時平行解析的行程數，1 表示在本行程解析
+    csv_import_workers: int = 1
+    # 背景匯入工作：同時執行的上限（其餘排隊），以及保留供查詢的已結束工作數
+    import_jobs_max_concurrent: int = 1
+    import_jobs_retained: int = 100
+    # 種子 CSV 編譯後的欄位快取目錄，CSV 未變動時啟動直接載入
+    seed_cache_path: Path = Path("data/cache/seed")
+    # 上傳 CSV 解析結果的快取（以內容雜湊為 key），相同檔案重新上傳時略過解析與驗證；超過上限依 LRU 淘汰，0 表示停用
+    upload_cache_path: Path = Path("data/cache/uploads")
+    upload_cache_max_bytes: int = 1024 * 1024 * 1024
+    # 啟動時載入使用者資料的方式："eager"（啟動完成前載入）、"background"（背景載入，/ready 回報進度）、"lazy"（第一個請求時載入）
+    warmup_mode: str = "eager"
+    # 使用者資料儲存後端："csv"（記憶體 DataFrame）、"sqlite"，或 "shared"（多個 worker 共用 state server 的資料）
+    user_repository_backend: str = "csv"
+    sqlite_path: Path = Path("data/users.sqlite3")
+    # shared 模式：state server 的 Unix socket、驗證金鑰，以及保留給落後 worker 追趕的變更筆數。
+    # 未設定金鑰時，state server 首次啟動會產生隨機金鑰寫入僅擁有者可讀（0600）的金鑰檔，worker 由該檔讀取
+    shared_state_socket: Path = Path("data/state/users.sock")
+    shared_state_authkey: str = ""
+    shared_state_authkey_path: Path = Path("data/state/users.key")
+    shared_state_feed_size: int = 10000
+    # get_all_users 分頁：預設與最大每頁筆數，NDJSON 串流每次輸出的筆數
+    users_page_size: int = 1000
+    users_page_size_max: int = 10000
+    users_stream_chunk_size: int = 5000
+    # 名稱前綴搜尋（自動完成）預設回傳筆數
+    users_search_limit: int = 20
+    # 讀取 API 的回應快取上限（位元組），依資料版本快取編碼後的 JSON
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    # 已刪除列佔比超過此值時，下一次讀取會壓縮主表
+    compaction_threshold: float = 0.25
+    # 每次查詢時以完整重算驗證增量維護的分組平均（僅供測試/除錯）
+    verify_aggregates: bool = False
+    # 精簡記憶體布局：年齡與列 id 用能容納的最小整數型別，名稱重複多時以字典編碼（categorical）
+    compact_storage: bool = False
+    # 近似統計（sketch）：啟用增量模式時每次插入即更新，否則查詢時由資料表建立
+    incremental_sketches: bool = False
+    # t-digest 壓縮參數（centroid 數量上限約為此值）、HyperLogLog 精度（2^p 個暫存器）、年齡直方圖寬度
+    sketch_compression: float = 100.0
+    sketch_hll_precision: int = 12
+    sketch_age_bin_width: int = 1
+    # 持久化：寫入先記錄到 WAL，定期寫成二進位快照，重啟時由快照 + WAL 尾端復原
+    persistence_enabled: bool = False
+    persistence_path: Path = Path("data/state")
+    wal_fsync: bool = True
+    snapshot_interval: int = 10000
 
 settings = Settings()
@@ -1,12 +1,21 @@
 from dependency_injector import containers, providers
 from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.infrastructure.repositories.user_repository_sqlite import UserSQLiteRepository
+from app.infrastructure.repositories.user_repository_shared import UserSharedRepository
+from app.infrastructure.repositories.user_sketches import UserSketches
+from app.infrastructure.persistence.user_journal import UserJournal
 from app.infrastructure.services.csv_user_parser import CsvUserParserService
+from app.infrastructure.services.columnar_user_cache import CachedUserDataLoader
+from app.infrastructure.services.response_cache import ResponseCache
+from app.infrastructure.services.upload_cache import UploadCache
+from app.infrastructure.services.import_jobs import ImportJobManager
 from app.infrastructure.speech.openai_whisper_recognizer import OpenAIWhisperRecognizer
 from app.infrastructure.repositories.user_command_operations import UserCommandOperations
 from app.use_cases.user.user_use_case import UserUseCase
 from app.use_cases.speech.recognize_speech_use_case import RecognizeSpeechUseCase
 from app.use_cases.speech.command_understanding_use_case import CommandUnderstandingUseCase
 import os
+import threading
 from dotenv import load_dotenv
 from app.core.settings import settings
 
@@ -15,8 +24,72 @@ class Container(containers.DeclarativeContainer):
     config = providers.Configuration()
     
     # 基礎設施層（單例）
-    user_repository = providers.Singleton(UserCSVRepository)
-    csv_parser = providers.Singleton(CsvUserParserService)
+    user_sketches = providers.Factory(
+        UserSketches,
+        compression=settings.sketch_compression,
+        precision=settings.sketch_hll_precision,
+        bin_width=settings.sketch_age_bin_width
+    )
+    csv_user_repository = providers.Singleton(
+        UserCSVRepository,
+        compaction_threshold=settings.compaction_threshold,
+        verify_aggregates=settings.verify_aggregates,
+        compact_storage=settings.compact_storage,
+        sketches=user_sketches,
+        incremental_sketches=settings.incremental_sketches
+    )
+    user_repository = providers.Selector(
+        lambda: settings.user_repository_backend,
+        csv=csv_user_repository,
+        sqlite=providers.Singleton(
+            UserSQLiteRepository,
+            path=settings.sqlite_path,
+            sketches=user_sketches
+        ),
+        shared=providers.Singleton(
+            UserSharedRepository,
+            address=settings.shared_state_socket,
+            authkey=settings.shared_state_authkey.encode() or None,
+            authkey_path=settings.shared_state_authkey_path,
+            compaction_threshold=settings.compaction_threshold,
+            compact_storage=settings.compact_storage,
+            sketches=user_sketches,
+            incremental_sketches=settings.incremental_sketches
+        )
+    )
+    user_journal = providers.Singleton(
+        UserJournal,
+        directory=settings.persistence_path,
+        fsync=settings.wal_fsync,
+        snapshot_interval=settings.snapshot_interval
+    )
+    csv_parser = providers.Singleton(
+        CsvUserParserService,
+        workers=settings.csv_import_workers
+    )
+    upload_cache = providers.Singleton(
+        UploadCache,
+        cache_dir=settings.upload_cache_path,
+        max_bytes=settings.upload_cache_max_bytes
+    )
+    user_loader = providers.Singleton(
+        CachedUserDataLoader,
+        loader=csv_parser,
+        cache_dir=settings.seed_cache_path,
+        upload_cache=upload_cache
+    )
+    response_cache = providers.Singleton(
+        ResponseCache,
+        max_bytes=settings.response_cache_max_bytes
+    )
+    import_jobs = providers.Singleton(
+        ImportJobManager,
+        upload_dir=settings.csv_upload_path,
+        max_concurrent=settings.import_jobs_max_concurrent,
+        chunk_size=settings.csv_import_chunk_size,
+        rejection_limit=settings.csv_import_rejection_limit,
+        max_retained=settings.import_jobs_retained
+    )
     speech_recognizer = providers.Singleton(
         OpenAIWhisperRecognizer,
         openai_api_key=os.getenv("OPENAI_API_KEY")
@@ -27,7 +100,7 @@ class Container(containers.DeclarativeContainer):
     user_use_case = providers.Singleton(
         UserUseCase,
         repo=user_repository,
-        loader=csv_parser
+        loader=user_loader
     )
     
     transcribe_use_case = providers.Factory(
@@ -44,16 +117,54 @@ class Container(containers.DeclarativeContainer):
 # 創建容器實例
 container = Container()
 
+# user_use_case 完成初始化（種子資料載入完畢）後設定
+user_use_case_ready = threading.Event()
+
+def load_initial_users(use_case: UserUseCase, repo, backend: str) -> None:
+    """Restore persisted users, or load the seed CSV if there is nothing to restore.
+
+    Args:
+        use_case: Use case used to load the seed CSV
+        repo: The repository to fill
+        backend: The repository backend name, see Settings.user_repository_backend
+    """
+    if backend == "shared":
+        # 資料由 state server 載入，worker 只需連線
+        return
+    if backend == "sqlite":
+        # SQLite 檔案本身即持久化，已有資料時不重複載入種子 CSV
+        restored = repo.get_storage_stats()['rows'] > 0
+    else:
+        # 啟用持久化時先從快照與 WAL 復原，沒有既有狀態才載入種子 CSV
+        restored = settings.persistence_enabled and repo.attach_journal(container.user_journal())
+    if not restored:
+        use_case.add_user_columns(use_case.init_user_columns(settings.csv_path))
+
 # 初始化 user_use_case
 def init_user_use_case():
     # 直接創建 UserUseCase 實例，而不是通過 container
+    repo = container.user_repository()
     use_case = UserUseCase(
-        repo=container.user_repository(),
-        loader=container.csv_parser()
+        repo=repo,
+        loader=container.user_loader()
     )
-    init_users = use_case.init_users(settings.csv_path)
-    use_case.add_multiple_users(init_users)
+    load_initial_users(use_case, repo, settings.user_repository_backend)
+    user_use_case_ready.set()
     return use_case
 
-# 覆蓋原有的 user_use_case provider
-container.user_use_case.override(providers.Singleton(init_user_use_case))
+# 覆蓋原有的 user_use_case provider；執行緒安全，避免並行的第一批請求重複初始化
+container.user_use_case.override(providers.ThreadSafeSingleton(init_user_use_case))
+
+def warm_up_user_use_case(mode: str) -> None:
+    """Initialize the user use case off the request path.
+
+    Args:
+        mode: "eager" loads before returning, "background" loads in a daemon
+            thread, "lazy" leaves loading to the first request
+    """
+    if mode == "eager":
+        container.user_use_case()
+    elif mode == "background":
+        threading.Thread(target=container.user_use_case, name="user-warmup", daemon=True).start()
+    else:
+        user_use_case_ready.set()
@@ -1,4 +1,7 @@
-from .models import User, NewUser
+from .models import User, NewUser, UserColumns, RejectedRow, UserImportReport
 from .fields import UserField, OUTPUT_KEYS
+from .aggregations import UserAggregation
+from .import_modes import UserDedupStrategy, UserImportMode
 
-__all__ = ["User", "NewUser", "UserField", "OUTPUT_KEYS"]
+__all__ = ["User", "NewUser", "UserColumns", "UserField", "OUTPUT_KEYS", "UserAggregation",
+           "RejectedRow", "UserImportReport", "UserImportMode", "UserDedupStrategy"]
@@ -0,0 +1,9 @@
+from enum import Enum
+
+class UserAggregation(str, Enum):
+    COUNT = "count"
+    MEAN = "mean"
+    MIN = "min"
+    MAX = "max"
+    SUM = "sum"
+    STD = "std"
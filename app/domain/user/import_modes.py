@@ -0,0 +1,12 @@
+from enum import Enum
+
+class UserImportMode(str, Enum):
+    # strict：任何一列不合格就整批拒絕；partial：略過不合格的列，匯入其餘資料
+    STRICT = "strict"
+    PARTIAL = "partial"
+
+class UserDedupStrategy(str, Enum):
+    # append：全部附加；skip_duplicates：略過 (Name, Age) 已存在的列；upsert：以 Name 為鍵取代既有的列
+    APPEND = "append"
+    SKIP_DUPLICATES = "skip_duplicates"
+    UPSERT = "upsert"
@@ -1,4 +1,6 @@
 from .user import User
 from .new_user import NewUser
+from .user_columns import UserColumns
+from .user_import_report import RejectedRow, UserImportReport
 
-__all__ = ['User', 'NewUser'] 
\ No newline at end of file
+__all__ = ['User', 'NewUser', 'UserColumns', 'RejectedRow', 'UserImportReport'] 
\ No newline at end of file
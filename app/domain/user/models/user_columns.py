@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+from typing import Sequence
+import numpy as np
+
+@dataclass
+class UserColumns:
+    """Column-oriented batch of users that have already been validated.
+
+    Lets loaders hand whole columns to a repository without building a
+    User model per row.
+    """
+    names: Sequence[str]
+    ages: np.ndarray
+    is_new: bool = False
+
+    def __len__(self) -> int:
+        return len(self.names)
@@ -0,0 +1,40 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+@dataclass
+class RejectedRow:
+    """A data row that failed validation; rows are numbered from 1, header excluded."""
+    row: int
+    reason: str
+
+@dataclass
+class UserImportReport:
+    """Outcome of a bulk import.
+
+    imported counts the rows written, i.e. inserted plus updated; skipped
+    counts valid rows left out as duplicates. Every rejection is counted,
+    but only the first rejection_limit of them are kept in rejected, so a
+    file full of bad rows cannot make the report itself unbounded.
+    source_digest is the content hash of the source once a loader has
+    computed it, so a second pass over the same import can reuse it.
+    """
+    imported: int = 0
+    inserted: int = 0
+    skipped: int = 0
+    updated: int = 0
+    rejected_count: int = 0
+    rejected: List[RejectedRow] = field(default_factory=list)
+    rejection_limit: int = 1000
+    source_digest: Optional[str] = None
+
+    def add_rejected(self, rows: Sequence[int], reasons: Sequence[str]) -> None:
+        room = max(self.rejection_limit - len(self.rejected), 0)
+        self.rejected.extend(RejectedRow(row, reason) for row, reason in zip(rows[:room], reasons[:room]))
+        self.rejected_count += len(rows)
+
+    def add_merged(self, summary: Dict[str, int]) -> None:
+        """Count one chunk's inserted / skipped / updated rows."""
+        self.inserted += summary['inserted']
+        self.skipped += summary['skipped']
+        self.updated += summary['updated']
+        self.imported += summary['inserted'] + summary['updated']
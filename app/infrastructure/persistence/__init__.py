@@ -0,0 +1,3 @@
+"""
+Persistence package initialization
+"""
@@ -0,0 +1,23 @@
+import numpy as np
+from typing import List, Sequence, Tuple
+
+
+def encode_names(names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack names into one UTF-8 buffer plus character offsets.
+
+    Args:
+        names: The names to pack
+    Returns:
+        (utf-8 bytes as uint8 array, int64 offsets of length len(names) + 1)
+    """
+    text = ''.join(names)
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, names), dtype=np.int64, count=len(names)), out=offsets[1:])
+    return np.frombuffer(text.encode('utf-8'), dtype=np.uint8), offsets
+
+
+def decode_names(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    """Inverse of encode_names: one decode, then slicing by character offsets."""
+    text = data.tobytes().decode('utf-8')
+    bounds = offsets.tolist()
+    return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from .columnar import decode_names, encode_names
+from .write_ahead_log import WriteAheadLog
+
+
+class UserJournal:
+    """Durable history of user repository writes.
+
+    Writes go to an append-only log; every `snapshot_interval` records the
+    repository hands over its live rows, which are written as one binary
+    snapshot tagged with the last log sequence, after which the log is
+    truncated. Recovery loads the snapshot and replays only the log tail.
+    """
+
+    SNAPSHOT_FILE = 'users.snapshot.npz'
+    LOG_FILE = 'users.wal'
+
+    def __init__(self, directory: Path, fsync: bool = True, snapshot_interval: int = 10000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._fsync = fsync
+        self.snapshot_interval = snapshot_interval
+        self.snapshots = 0
+        self._snapshot_seq = 0
+        self._wal: Optional[WriteAheadLog] = None
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.directory / self.SNAPSHOT_FILE
+
+    @property
+    def log_path(self) -> Path:
+        return self.directory / self.LOG_FILE
+
+    def recover(self) -> Tuple[Optional[Tuple[List[str], np.ndarray, np.ndarray]], List[dict]]:
+        """Load the latest snapshot and the log records written after it.
+
+        Returns:
+            ((names, ages, is_new) or None, log records newer than the snapshot)
+        """
+        snapshot = None
+        if self.snapshot_path.exists():
+            with np.load(self.snapshot_path) as data:
+                self._snapshot_seq = int(data['seq'])
+                ages = data['ages']
+                if 'is_new_bits' in data:
+                    is_new = np.unpackbits(data['is_new_bits'], count=len(ages)).astype(bool)
+                else:
+                    # 舊版快照：每筆一個 byte 的 bool 陣列
+                    is_new = data['is_new']
+                snapshot = (decode_names(data['name_data'], data['name_offsets']), ages, is_new)
+        # 崩潰時寫到一半的最後一筆必須截掉，否則之後的記錄會接在同一行而在下次復原時全部遺失
+        WriteAheadLog.repair(self.log_path, fsync=self._fsync)
+        tail = [r for r in WriteAheadLog.read(self.log_path) if r['seq'] > self._snapshot_seq]
+        last_seq = tail[-1]['seq'] if tail else self._snapshot_seq
+        self._wal = WriteAheadLog(self.log_path, fsync=self._fsync, next_seq=last_seq + 1)
+        return snapshot, tail
+
+    def append(self, record: dict) -> int:
+        return self._wal.append(record)
+
+    def commit(self, seq: int) -> None:
+        self._wal.commit(seq)
+
+    def get_stats(self) -> dict:
+        return {
+            'wal_records': self._wal.records,
+            'wal_commits': self._wal.commits,
+            'snapshots': self.snapshots,
+        }
+
+    def needs_snapshot(self) -> bool:
+        return self._wal.records >= self.snapshot_interval
+
+    def write_snapshot(self, names: Sequence[str], ages: np.ndarray, is_new: np.ndarray) -> None:
+        """Persist the given live rows as of the last appended log record."""
+        seq = self._wal.last_seq
+        self._wal.commit(seq)
+        name_data, name_offsets = encode_names(names)
+        ages = np.asarray(ages)
+        # 年齡以能容納最大值的最小無號整數存放，is_new 壓成每筆 1 bit
+        age_dtype = np.int64
+        if len(ages) and ages.min() >= 0:
+            age_dtype = np.min_scalar_type(int(ages.max()))
+        tmp_path = self.snapshot_path.with_suffix('.tmp.npz')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, seq=np.int64(seq), name_data=name_data, name_offsets=name_offsets,
+                     ages=ages.astype(age_dtype), is_new_bits=np.packbits(np.asarray(is_new, dtype=bool)))
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._snapshot_seq = seq
+        self._wal.truncate()
+        self.snapshots += 1
+
+    def close(self) -> None:
+        if self._wal is not None:
+            self._wal.close()
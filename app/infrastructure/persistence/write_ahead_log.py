@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+
+class WriteAheadLog:
+    """Append-only JSON-lines log with leader-based group commit.
+
+    append() only assigns a sequence number and buffers the record.
+    commit() makes it durable: the first waiting writer becomes the leader,
+    writes every buffered record with one write + fsync and wakes the rest,
+    so concurrent writers share a single fsync.
+    """
+
+    def __init__(self, path: Path, fsync: bool = True, next_seq: int = 1):
+        self.path = Path(path)
+        self._fsync = fsync
+        self._file = open(self.path, 'ab')
+        self._cond = threading.Condition()
+        self._buffer: List[bytes] = []
+        self._next_seq = next_seq
+        self._durable_seq = next_seq - 1
+        self._flushing = False
+        self.records = 0
+        self.commits = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def append(self, record: dict) -> int:
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._buffer.append(json.dumps({'seq': seq, **record}).encode('utf-8') + b'\n')
+            self.records += 1
+            return seq
+
+    def commit(self, seq: int) -> None:
+        with self._cond:
+            while self._durable_seq < seq:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                batch, self._buffer = self._buffer, []
+                last_seq = self._next_seq - 1
+                self._cond.release()
+                try:
+                    self._write(batch)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._cond.notify_all()
+                self._durable_seq = last_seq
+                self.commits += 1
+
+    def truncate(self) -> None:
+        """Drop every durable record; callers must have snapshotted them first."""
+        with self._cond:
+            self._file.truncate(0)
+            self.records = 0
+
+    def close(self) -> None:
+        self.commit(self.last_seq)
+        self._file.close()
+
+    def _write(self, batch: List[bytes]) -> None:
+        self._file.write(b''.join(batch))
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def read(path: Path) -> Iterator[dict]:
+        """Yield records in log order, stopping at a torn trailing record."""
+        for record, _ in WriteAheadLog._scan(path):
+            yield record
+
+    @staticmethod
+    def repair(path: Path, fsync: bool = True) -> int:
+        """Cut a torn trailing record off the log so later appends start on a new line.
+
+        Returns:
+            Number of bytes removed
+        """
+        if not Path(path).exists():
+            return 0
+        end = 0
+        for _, end in WriteAheadLog._scan(path):
+            pass
+        with open(path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == end:
+                return 0
+            f.truncate(end)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        return size - end
+
+    @staticmethod
+    def _scan(path: Path) -> Iterator[Tuple[dict, int]]:
+        """Yield each complete record with the byte offset just past its newline."""
+        if not Path(path).exists():
+            return
+        offset = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                # 沒有換行結尾的最後一行即使能解析也是寫到一半的記錄
+                if not line.endswith(b'\n'):
+                    return
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return
+                offset += len(line)
+                yield record, offset
@@ -13,3 +13,17 @@ class GroupbyKeyException(AppBaseException):
 
     def __init__(self, message: str):
         self.detail = f"{message}"
+
+class AggregateConsistencyException(AppBaseException):
+    status_code: int = 500
+    exception_type: str = "AggregateConsistencyException"
+
+    def __init__(self, message: str):
+        self.detail = f"{message}"
+
+class SharedStateUnavailableException(AppBaseException):
+    status_code: int = 503
+    exception_type: str = "SharedStateUnavailableException"
+
+    def __init__(self, message: str):
+        self.detail = f"{message}"
@@ -0,0 +1,124 @@
+import bisect
+import sys
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+class AgeIndex:
+    """Order-maintained index of row ids by age.
+
+    Rows are kept in (age, row id) order: every distinct age has a sorted
+    bucket of row ids, and a Fenwick tree over the bucket sizes answers
+    "how many rows are younger than x" and "which age holds the k-th row"
+    in O(log D), where D is the number of distinct ages. Ages are
+    coordinate-compressed, so the tree stays small whatever the values are;
+    a new distinct age rebuilds it in O(D).
+    """
+
+    def __init__(self):
+        self._values: List[int] = []
+        self._buckets: Dict[int, List[int]] = {}
+        self._tree: List[int] = [0]
+        self.total = 0
+
+    def add_many(self, ages: Sequence[int], row_ids: Sequence[int]) -> None:
+        """Add rows; row ids must be larger than every id already indexed."""
+        added: Dict[int, int] = {}
+        buckets = self._buckets
+        for age, row_id in zip(ages, row_ids):
+            bucket = buckets.get(age)
+            if bucket is None:
+                buckets[age] = bucket = []
+            bucket.append(row_id)
+            added[age] = added.get(age, 0) + 1
+        self.total += sum(added.values())
+        if len(buckets) != len(self._values):
+            self._rebuild()
+        else:
+            for age, count in added.items():
+                self._update(bisect.bisect_left(self._values, age), count)
+
+    def remove(self, age: int, row_id: int) -> None:
+        bucket = self._buckets[age]
+        del bucket[bisect.bisect_left(bucket, row_id)]
+        self.total -= 1
+        self._update(bisect.bisect_left(self._values, age), -1)
+
+    def count_below(self, age: int) -> int:
+        """Number of rows younger than age."""
+        return self._prefix(bisect.bisect_left(self._values, age))
+
+    def count_at_most(self, age: int) -> int:
+        """Number of rows not older than age."""
+        return self._prefix(bisect.bisect_right(self._values, age))
+
+    def kth(self, rank: int) -> int:
+        """Age of the rank-th youngest row (0-based)."""
+        position, remaining = 0, rank
+        step = 1 << (len(self._values).bit_length() - 1) if self._values else 0
+        # Fenwick 二元提升：找出前綴和不超過 rank 的最大位置
+        while step:
+            following = position + step
+            if following <= len(self._values) and self._tree[following] <= remaining:
+                position, remaining = following, remaining - self._tree[following]
+            step >>= 1
+        return self._values[position]
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Exact q-th percentile with linear interpolation, the same as numpy's default."""
+        if self.total == 0:
+            return None
+        position = q / 100 * (self.total - 1)
+        lower = int(position)
+        low = self.kth(lower)
+        if lower + 1 >= self.total or position == lower:
+            return float(low)
+        return low + (self.kth(lower + 1) - low) * (position - lower)
+
+    def ids_from(self, rank: int, limit: int) -> List[int]:
+        """Up to limit row ids in (age, row id) order, starting at a rank."""
+        ids: List[int] = []
+        while len(ids) < limit and rank < self.total:
+            age = self.kth(rank)
+            bucket = self._buckets[age]
+            start = rank - self.count_below(age)
+            ids.extend(bucket[start:start + limit - len(ids)])
+            rank += len(bucket) - start
+        return ids
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the index containers (row id ints are shared)."""
+        return (sys.getsizeof(self._buckets) + sys.getsizeof(self._values) + sys.getsizeof(self._tree)
+                + sum(sys.getsizeof(bucket) for bucket in list(self._buckets.values())))
+
+    def oldest_ids(self, limit: int) -> List[int]:
+        """Up to limit row ids from the oldest age down; equal ages in insertion order."""
+        ids: List[int] = []
+        rank = self.total - 1
+        while len(ids) < limit and rank >= 0:
+            age = self.kth(rank)
+            bucket = self._buckets[age]
+            ids.extend(bucket[:limit - len(ids)])
+            rank -= len(bucket)
+        return ids
+
+    def _prefix(self, position: int) -> int:
+        total = 0
+        while position > 0:
+            total += self._tree[position]
+            position &= position - 1
+        return total
+
+    def _rebuild(self) -> None:
+        # 只保留仍有資料的年齡，並以向量運算一次建好 Fenwick 樹
+        self._buckets = {age: ids for age, ids in self._buckets.items() if ids}
+        self._values = sorted(self._buckets)
+        counts = np.array([len(self._buckets[age]) for age in self._values], dtype=np.int64)
+        prefix = np.concatenate(([0], np.cumsum(counts)))
+        positions = np.arange(1, len(counts) + 1)
+        self._tree = [0] + (prefix[positions] - prefix[positions - (positions & -positions)]).tolist()
+
+    def _update(self, position: int, delta: int) -> None:
+        position += 1
+        while position < len(self._tree):
+            self._tree[position] += delta
+            position += position & -position
@@ -0,0 +1,74 @@
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+from app.domain.user import UserAggregation
+from app.interfaces.user_repository import UserGrouping
+from .exceptions import GroupbyKeyException
+
+def group_keys(values: np.ndarray, grouping: UserGrouping) -> np.ndarray:
+    """Derive the group key of every row with array operations.
+
+    Args:
+        values: Column named by grouping.field
+        grouping: How the column is turned into keys
+    Returns:
+        Array of keys, one per row
+    """
+    if grouping.bucket_size is not None:
+        if not np.issubdtype(values.dtype, np.number):
+            raise GroupbyKeyException(f"Field {grouping.field} is not numeric and cannot be bucketed")
+        # 精簡布局的年齡可能是 uint8/uint16，先放寬型別以免分桶寬度超出範圍
+        values = values.astype(np.int64, copy=False)
+        return (values // grouping.bucket_size) * grouping.bucket_size
+    if grouping.prefix_length is None and not grouping.casefold:
+        return values
+    # 轉成定長 unicode 陣列時超出長度的部分會直接截掉，等同取前 N 個字
+    keys = values.astype(f'<U{grouping.prefix_length}' if grouping.prefix_length else str)
+    if grouping.casefold:
+        # 只對不重複的 key 做 casefold，筆數與資料量無關
+        distinct, inverse = np.unique(keys, return_inverse=True)
+        keys = np.array([key.casefold() for key in distinct.tolist()], dtype=str)[inverse]
+    return keys
+
+def aggregate_groups(keys: np.ndarray,
+                     values: np.ndarray,
+                     aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+    """Compute every requested aggregation per key in one vectorized pass.
+
+    Args:
+        keys: Group key of every row
+        values: Numeric value of every row
+        aggregations: The aggregations to compute
+    Returns:
+        Mapping of key to {aggregation name: value}, ordered by key
+    """
+    if len(keys) == 0:
+        return {}
+    distinct, codes = np.unique(keys, return_inverse=True)
+    raw, values = values, values.astype(np.float64)
+    counts = np.bincount(codes)
+    sums = np.bincount(codes, weights=values)
+    means = sums / counts
+    columns: Dict[str, list] = {}
+    for aggregation in map(UserAggregation, aggregations):
+        if aggregation is UserAggregation.COUNT:
+            columns[aggregation.value] = counts.tolist()
+        elif aggregation is UserAggregation.SUM:
+            integral = np.issubdtype(raw.dtype, np.integer) or raw.dtype == bool
+            columns[aggregation.value] = (sums.astype(np.int64) if integral else sums).tolist()
+        elif aggregation is UserAggregation.MEAN:
+            columns[aggregation.value] = means.tolist()
+        elif aggregation is UserAggregation.STD:
+            # 兩段式計算（先平均再平方差），避免平方和公式的精度損失
+            squares = np.bincount(codes, weights=(values - means[codes]) ** 2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                std = np.sqrt(squares / (counts - 1))
+            columns[aggregation.value] = [None if count < 2 else s
+                                          for count, s in zip(counts.tolist(), std.tolist())]
+        else:
+            # np.unique 已依 key 排序，依 code 排序後每組是連續區段，可用 reduceat
+            order = np.argsort(codes, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            ufunc = np.minimum if aggregation is UserAggregation.MIN else np.maximum
+            columns[aggregation.value] = ufunc.reduceat(raw[order], starts).tolist()
+    return {key: {name: column[i] for name, column in columns.items()}
+            for i, key in enumerate(distinct.tolist())}
@@ -1,65 +1,881 @@
+import bisect
+import math
+import sys
+import threading
+import time
+import uuid
+import numpy as np
 import pandas as pd
-from pandas.core.groupby.generic import DataFrameGroupBy
-from app.interfaces.user_repository import IUserRepository
-from app.domain.user import User, NewUser, UserField
-from typing import List, Union
-from .exceptions import DataframeKeyException, GroupbyKeyException
+from contextlib import contextmanager
+from app.interfaces.user_repository import IUserRepository, UserGrouping
+from app.domain.user import User, NewUser, UserAggregation, UserColumns, UserDedupStrategy, UserField
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+from app.infrastructure.persistence.user_journal import UserJournal
+from .exceptions import AggregateConsistencyException, DataframeKeyException, GroupbyKeyException
+from .user_age_index import AgeIndex
+from .user_aggregation import aggregate_groups, group_keys
+from .user_sketches import UserSketches
+
+class _UserSnapshot(NamedTuple):
+    """Live rows as of a data version; never mutated once published."""
+    version: int
+    frame: pd.DataFrame
+
+def _small_uint_dtype(values: np.ndarray) -> np.dtype:
+    """Narrowest unsigned dtype holding every value, int64 if any is negative."""
+    if len(values) == 0 or values.min() < 0:
+        return np.dtype(np.int64)
+    maximum = int(values.max())
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+def _index_ids(entry: Union[None, int, List[int]]) -> List[int]:
+    """Row ids held by a name index entry (a single id or a list of ids)."""
+    if entry is None:
+        return []
+    return [entry] if isinstance(entry, int) else list(entry)
 
 class UserCSVRepository(IUserRepository):
+    """In-memory user table.
+
+    Writers are serialized by a single lock. Reads that only need rows
+    take the published snapshot without locking; only the first read after
+    a write locks to materialize (merge the append buffer, drop tombstones)
+    a new snapshot. The name index, sorted names, age index and running
+    aggregates are updated in place by writers, so every read that consults
+    them (name and prefix lookups, age ranges and percentiles, averages by
+    first character, memory and storage stats) takes the writer lock too.
+
+    With compact_storage, ages and row ids use the narrowest unsigned dtype
+    that holds them (widened automatically when a larger value arrives),
+    is_new is kept as bool and names are dictionary-encoded (categorical)
+    while at most CATEGORY_MAX_RATIO of them are distinct. Mostly distinct
+    names stay plain strings: the dictionary would save little and growing
+    it on every flush costs time proportional to its size.
+    """
+
+    COLUMNS = ['is_new', UserField.NAME.value, UserField.AGE.value]
+    # 緩衝區至少累積這麼多筆才會主動合併，避免小表頻繁 concat
+    MIN_FLUSH_ROWS = 1024
+    # 不重複名稱占列數的比例超過此值時，名稱不做字典編碼
+    CATEGORY_MAX_RATIO = 0.5
 
-    def __init__(self):
-        self.df = pd.DataFrame()
+    def __init__(self, compaction_threshold: float = 0.25, verify_aggregates: bool = False,
+                 compact_storage: bool = False, sketches: Optional[UserSketches] = None,
+                 incremental_sketches: bool = False):
+        self._compact_storage = compact_storage
+        # sketch 的參數樣板；啟用增量模式時每次插入即更新，刪除後於下次查詢重建（sketch 只能新增）
+        self._sketch_template = sketches or UserSketches()
+        self._incremental_sketches = incremental_sketches
+        self._sketches: Optional[UserSketches] = self._sketch_template.empty() if incremental_sketches else None
+        self._frame = pd.DataFrame(columns=self.COLUMNS)
+        self._pending = self._empty_buffer()
+        self._pending_ids: List[int] = []
+        self._next_row_id = 0
+        # 墓碑位元圖：每個實體列（主表 + 緩衝區）一個 byte，非零代表已刪除
+        self._dead = bytearray()
+        self._dead_count = 0
+        self._compaction_threshold = compaction_threshold
+        self._compactions = 0
+        # Name -> 同名使用者的列 id；只有一筆時直接存 int，省下 list 的記憶體。
+        # (Name, Age) 查詢在同名的少數列中比對年齡，不另外維護 tuple 鍵的索引
+        self._name_index: Dict[str, Union[int, List[int]]] = {}
+        # 排序後的不重複名稱，供前綴搜尋以二分搜尋定位
+        self._sorted_names: List[str] = []
+        # 依 (Age, 列 id) 排序的索引，供年齡範圍、百分位數與最老/最年輕查詢
+        self._age_index = AgeIndex()
+        # 名稱首字母 -> (年齡總和, 人數)，隨寫入增量維護；整個 tuple 替換，讀取不會看到一半的更新
+        self._first_char_aggregates: Dict[str, Tuple[int, int]] = {}
+        self._verify_aggregates = verify_aggregates
+        self._journal: Optional[UserJournal] = None
+        # 單一寫入鎖；RLock 讓寫入流程中可以再讀取快照
+        self._lock = threading.RLock()
+        self._version = 0
+        # 每次實際新增或標記刪除列時遞增；寫入結束時只有它改變才發布新版本
+        self._mutations = 0
+        # 版本號只在同一個實例內遞增，加上實例 id 讓重啟後的版本不會與舊的混淆
+        self._instance = uuid.uuid4().hex[:16]
+        self._snapshot = _UserSnapshot(-1, self._frame)
+        self._lock_acquisitions = 0
+        self._lock_wait_seconds = 0.0
+        self._lock_wait_max_seconds = 0.0
+
+    @property
+    def data_version(self) -> int:
+        """Monotonically increasing counter, bumped by every write that changes rows."""
+        return self._version
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """Snapshot of the live users as of the latest write; treat it as read-only."""
+        snapshot = self._snapshot
+        if snapshot.version == self._version:
+            return snapshot.frame
+        with self._locked():
+            if self._snapshot.version != self._version:
+                self._snapshot = _UserSnapshot(self._version, self._materialize())
+            return self._snapshot.frame
+
+    @df.setter
+    def df(self, frame: pd.DataFrame) -> None:
+        self.load(frame.reset_index(drop=True))
+
+    @property
+    def next_row_id(self) -> int:
+        """Row id the next appended user will get."""
+        return self._next_row_id
 
     def add_multiple_users(self, users: List[Union[NewUser, User]]) -> None:
-        users_df = pd.DataFrame([
-            self._user_to_dict(user) for user in users])
-        self.df = pd.concat([self.df, users_df], ignore_index=True)
+        names = [user.Name for user in users]
+        ages = [user.Age for user in users]
+        flags = [isinstance(user, NewUser) for user in users]
+        with self._writing():
+            self._append_columns(names, ages, flags)
+            seq = self._log({'op': 'bulk', 'Name': names, 'Age': ages, 'is_new': flags})
+        self.commit(seq)
+
+    def add_user_columns(self, columns: UserColumns) -> None:
+        names = list(columns.names)
+        ages = np.asarray(columns.ages).tolist()
+        flags = [columns.is_new] * len(names)
+        with self._writing():
+            self._append_columns(names, ages, flags)
+            seq = self._log({'op': 'bulk', 'Name': names, 'Age': ages, 'is_new': flags})
+        self.commit(seq)
+
+    def attach_journal(self, journal: UserJournal) -> bool:
+        """Restore the latest snapshot plus log tail, then journal every later write.
+
+        Args:
+            journal: The journal to recover from and write to
+        Returns:
+            True if any persisted state was restored
+        """
+        with self._writing():
+            snapshot, tail = journal.recover()
+            if snapshot is not None:
+                names, ages, flags = snapshot
+                self._append_columns(names, ages.tolist(), flags.tolist())
+            for record in tail:
+                self._replay(record)
+            self._journal = journal
+        return snapshot is not None or bool(tail)
+
+    def apply_change(self, record: dict) -> int:
+        """Apply one write in journal record form, e.g. one received from a change feed.
+
+        Args:
+            record: A record as written to the journal ('op' plus its arguments)
+        Returns:
+            Number of rows the write added or deleted
+        """
+        count, seq = self.stage_change(record)
+        self.commit(seq)
+        return count
+
+    def commit(self, seq: Optional[int]) -> None:
+        """Wait for a logged write to become durable, outside the writer lock.
+
+        Waiting here rather than under the lock lets concurrent writers share
+        one group commit. Callers that serialize writes with a lock of their
+        own (see stage_change) should likewise call this after releasing it.
+
+        Args:
+            seq: Journal sequence number of the write, None if nothing was logged
+        """
+        if seq is None:
+            return
+        self._journal.commit(seq)
+        if self._journal.needs_snapshot():
+            with self._locked():
+                if self._journal.needs_snapshot():
+                    self.snapshot()
+
+    def compact(self) -> None:
+        """Physically drop tombstoned rows and reset the tombstone bitmap."""
+        with self._locked():
+            self._flush_pending()
+            self._compact()
 
     def compute_group_average(self,
-                              groupby: DataFrameGroupBy,
-                              field: str) -> pd.Series:
-        if field not in groupby.obj.columns:
+                              grouping: UserGrouping,
+                              field: str) -> Dict[Any, float]:
+        stats = self.compute_group_stats(grouping, field, [UserAggregation.MEAN])
+        return {key: values[UserAggregation.MEAN.value] for key, values in stats.items()}
+
+    def compute_group_stats(self,
+                            grouping: UserGrouping,
+                            field: str,
+                            aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+        df = self.df
+        if field not in df.columns:
             raise GroupbyKeyException(f"Field {field} not found in GroupBy")
-        return groupby[field].mean()
+        if grouping.field not in df.columns:
+            raise DataframeKeyException(f"Field {grouping.field} not found in Dataframe")
+        if df.empty:
+            # 空資料表的欄位是 object 型別，無法判斷是否為數值；沒有分組可回傳
+            return {}
+        values = df[field].to_numpy()
+        if not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+            raise GroupbyKeyException(f"Field {field} is not numeric")
+        column = df[grouping.field]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # 字典編碼：只對不重複的值推導 key，再以 code 對應回每一列
+            categories = column.cat.categories.to_numpy()
+            keys = group_keys(categories, grouping)[column.cat.codes.to_numpy()]
+        else:
+            keys = group_keys(column.to_numpy(), grouping)
+        return aggregate_groups(keys, values, aggregations)
 
     def create_user(self, user: NewUser) -> None:
-        self.df = pd.concat([self.df,
-                             pd.DataFrame([self._user_to_dict(user)])],
-                             ignore_index=True)
-    
-    def delete_user(self, user: User) -> None:
-        self.df = self.df.drop(self._query_user(user).index)
-
-    def delete_user_by_name(self, name: str) -> None:
-        self.df = self.df[self.df['Name'] != name]
-    
+        with self._writing():
+            self._append_row(user.Name, user.Age, True)
+            self._maybe_flush_pending()
+            seq = self._log({'op': 'create', 'Name': user.Name, 'Age': user.Age})
+        self.commit(seq)
+
+    def delete_user(self, user: User) -> int:
+        with self._writing():
+            deleted = self._delete_user(user.Name, user.Age)
+            if not deleted:
+                return 0
+            seq = self._log({'op': 'delete', 'Name': user.Name, 'Age': user.Age})
+        self.commit(seq)
+        return deleted
+
+    def delete_user_by_name(self, name: str) -> int:
+        with self._writing():
+            deleted = self._delete_names([name])
+            if not deleted:
+                return 0
+            seq = self._log({'op': 'delete_by_name', 'Name': name})
+        self.commit(seq)
+        return deleted
+
     def get_added_user(self) -> List[NewUser]:
-        added_users = self.df[self.df['is_new']]
+        df = self.df
+        added_users = df[df['is_new']]
         return [NewUser(**row) for _, row in added_users.iterrows()]
-    
+
+    def get_added_user_records(self) -> List[dict]:
+        df = self.df
+        added = df[df['is_new'].astype(bool)]
+        return self._to_records(added, with_is_new=False)
+
     def get_all_users(self) -> List[User]:
         return [NewUser(**row) if row['is_new'] else User(**row) for _, row in self.df.iterrows()]
-    
-    def get_grouped_users_by(self, field: str) -> DataFrameGroupBy:
+
+    def get_all_user_records(self) -> List[dict]:
+        return self._to_records(self.df, with_is_new=True)
+
+    def get_average_age_by_first_char(self) -> Dict[str, float]:
+        if self._verify_aggregates:
+            # 驗證模式下鎖住寫入，讓增量值與完整重算看到同一版資料
+            with self._locked():
+                averages = self._current_average_age_by_first_char()
+                expected = self._recompute_average_age_by_first_char()
+            if averages.keys() != expected.keys() or not all(
+                    math.isclose(averages[char], expected[char]) for char in expected):
+                raise AggregateConsistencyException(
+                    f"Incremental averages {averages} differ from full recompute {expected}")
+            return averages
+        with self._locked():
+            return self._current_average_age_by_first_char()
+
+    def get_age_percentiles(self, percentiles: Sequence[float]) -> Dict[float, Optional[float]]:
+        with self._locked():
+            return {q: self._age_index.percentile(q) for q in percentiles}
+
+    def export_sketches(self) -> bytes:
+        with self._locked():
+            return self._current_sketches().to_bytes()
+
+    def get_data_version(self) -> str:
+        return f"{self._instance}-{self._version}"
+
+    def get_grouped_users_by(self, field: str) -> UserGrouping:
         if field not in self.df.columns:
             raise DataframeKeyException(f"Field {field} not found")
-        return self.df.groupby(field)
-    
-    def get_grouped_users_by_first_char(self, field: str) -> DataFrameGroupBy:
+        return UserGrouping(field)
+
+    def get_grouped_users_by_first_char(self, field: str) -> UserGrouping:
         if field not in self.df.columns:
             raise DataframeKeyException(f"Field {field} not found in Dataframe")
-        return self.df.groupby(self.df[field].str[0])
+        return UserGrouping(field, prefix_length=1)
+
+    def get_sketch_stats(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        with self._locked():
+            return self._current_sketches().stats(percentiles)
+
+    def get_storage_stats(self) -> Dict[str, float]:
+        with self._locked():
+            stats = {
+                'rows': len(self._dead),
+                'live_rows': len(self._dead) - self._dead_count,
+                'dead_rows': self._dead_count,
+                'dead_ratio': self._dead_ratio(),
+                'compaction_threshold': self._compaction_threshold,
+                'compactions': self._compactions,
+                'data_version': self._version,
+                'lock_acquisitions': self._lock_acquisitions,
+                'lock_wait_seconds_total': self._lock_wait_seconds,
+                'lock_wait_seconds_max': self._lock_wait_max_seconds,
+            }
+            if self._journal is not None:
+                stats.update(self._journal.get_stats())
+            return stats
+
+    def get_memory_usage(self) -> Dict[str, Any]:
+        with self._locked():
+            frame = self.df
+            columns = frame.memory_usage(index=True, deep=True)
+            frame_bytes = {('index' if column == 'Index' else column): int(size)
+                           for column, size in columns.items()}
+            plain_bytes = {'index': 8 * len(frame), 'is_new': len(frame), 'Age': 8 * len(frame),
+                           'Name': self._plain_name_bytes(frame['Name'])}
+            index_bytes = sys.getsizeof(self._name_index) + sys.getsizeof(self._sorted_names) + sum(
+                sys.getsizeof(entry) for entry in self._name_index.values())
+            age_index_bytes = self._age_index.memory_bytes()
+            total = sum(frame_bytes.values()) + index_bytes + age_index_bytes
+            plain_total = sum(plain_bytes.values()) + index_bytes + age_index_bytes
+            return {
+                'layout': 'compact' if self._compact_storage else 'plain',
+                'rows': len(frame),
+                'distinct_names': len(self._name_index),
+                'dtypes': {column: str(dtype) for column, dtype in frame.dtypes.items()},
+                'frame_bytes': frame_bytes,
+                'plain_frame_bytes': plain_bytes,
+                'name_index_bytes': index_bytes,
+                'age_index_bytes': age_index_bytes,
+                'total_bytes': total,
+                'plain_total_bytes': plain_total,
+                'bytes_per_user': total / len(frame) if len(frame) else 0.0,
+                'savings_ratio': plain_total / total if total else 1.0,
+            }
+
+    def get_user_records_by_age(self, min_age: Optional[int], max_age: Optional[int],
+                                limit: int, offset: int = 0) -> Tuple[List[dict], int]:
+        # 以排名定位範圍起點，只讀取回傳的列，不掃描整個 Age 欄位
+        with self._locked():
+            index = self._age_index
+            start = 0 if min_age is None else index.count_below(min_age)
+            stop = index.total if max_age is None else index.count_at_most(max_age)
+            total = max(stop - start, 0)
+            row_ids = index.ids_from(start + offset, min(limit, total - offset)) if offset < total else []
+            return self._records_by_ids(self.df, row_ids), total
+
+    def get_user_records_by_age_rank(self, limit: int, oldest: bool) -> List[dict]:
+        with self._locked():
+            index = self._age_index
+            row_ids = index.oldest_ids(limit) if oldest else index.ids_from(0, limit)
+            return self._records_by_ids(self.df, row_ids)
+
+    def get_users_by_name(self, name: str) -> List[User]:
+        # 索引與快照在同一把鎖下取得，兩者對應同一版資料
+        with self._locked():
+            row_ids = sorted(_index_ids(self._name_index.get(name)))
+            if not row_ids:
+                return []
+            frame = self.df
+        matched = frame.iloc[frame.index.searchsorted(row_ids)]
+        return [NewUser(**row) if row['is_new'] else User(**row) for _, row in matched.iterrows()]
+
+    def get_user_ids(self, user: User) -> List[int]:
+        # 需要讀取年齡的實體位置，與寫入互斥以免遇到合併中的緩衝區
+        with self._locked():
+            row_ids = _index_ids(self._name_index.get(user.Name))
+            return [row_id for row_id, age in zip(row_ids, self._ages_of(row_ids)) if age == user.Age]
+
+    def get_user_records_page(self, after: Optional[int],
+                              limit: int) -> Tuple[List[dict], Optional[int]]:
+        frame = self.df
+        start = 0 if after is None or after < 0 else int(frame.index.searchsorted(after, side='right'))
+        page = frame.iloc[start:start + limit]
+        next_cursor = int(page.index[-1]) if start + limit < len(frame) else None
+        return self._to_records(page, with_is_new=True), next_cursor
 
     def has_user(self, user: User) -> bool:
-        query = self._query_user(user)
-        return not query.empty
-
-    def _describe_user(self, user: User) -> str:
-        return f"{UserField.NAME.value} == '{user.Name}' and {UserField.AGE.value} == {user.Age}"
-
-    def _query_user(self, user: User) -> pd.DataFrame:
-        return self.df.query(self._describe_user(user))
-    
-    def _user_to_dict(self, user: Union[NewUser, User]) -> dict:
-        return {'is_new': True if isinstance(user, NewUser) else False,
-             **user.model_dump()}
+        return bool(self.get_user_ids(user))
+
+    def load(self, frame: pd.DataFrame, next_row_id: Optional[int] = None) -> None:
+        """Replace the table, keeping the frame's index as row ids.
+
+        Args:
+            frame: Live users; the index must be unique and increasing integers
+            next_row_id: Id for the next appended row, defaults to one past the last index
+        """
+        with self._writing():
+            self._frame = self._compact_layout(frame)
+            self._pending = self._empty_buffer()
+            self._pending_ids = []
+            if next_row_id is None:
+                next_row_id = int(frame.index[-1]) + 1 if len(frame) else 0
+            self._next_row_id = next_row_id
+            self._dead = bytearray(len(self._frame))
+            self._dead_count = 0
+            self._rebuild_indexes()
+            self._mutations += 1
+
+    def merge_user_columns(self, columns: UserColumns, strategy: UserDedupStrategy) -> Dict[str, int]:
+        summary, seq = self.stage_merge(columns, strategy)
+        self.commit(seq)
+        return summary
+
+    def search_user_records(self, prefix: str, limit: int, offset: int = 0) -> List[dict]:
+        # 持鎖讀取排序名稱清單，避免與寫入時的插入/刪除交錯
+        with self._locked():
+            names, row_ids, skip = self._sorted_names, [], offset
+            for i in range(bisect.bisect_left(names, prefix), len(names)):
+                if len(row_ids) >= limit or not names[i].startswith(prefix):
+                    break
+                ids = _index_ids(self._name_index[names[i]])
+                # 整個名稱都落在 offset 內時只需計數，不讀取各列
+                if skip >= len(ids):
+                    skip -= len(ids)
+                    continue
+                row_ids.extend(sorted(ids)[skip:])
+                skip = 0
+            return self._records_by_ids(self.df, row_ids[:limit])
+
+    def snapshot(self) -> None:
+        """Write the live rows to the journal as a snapshot and truncate its log."""
+        if self._journal is None:
+            return
+        with self._locked():
+            df = self.df
+            self._journal.write_snapshot(df['Name'].tolist(), df['Age'].to_numpy(),
+                                         df['is_new'].to_numpy(dtype=bool))
+
+    def stage_change(self, record: dict) -> Tuple[int, Optional[int]]:
+        """Apply and journal a write in journal record form without waiting for durability.
+
+        Args:
+            record: A record as written to the journal ('op' plus its arguments)
+        Returns:
+            Number of rows the write added, updated or deleted, and the sequence
+            number to pass to commit (None if nothing was logged)
+        """
+        with self._writing():
+            count = self._replay(record)
+            self._maybe_flush_pending()
+            seq = self._log(record) if count else None
+        return count, seq
+
+    def stage_merge(self, columns: UserColumns,
+                    strategy: UserDedupStrategy) -> Tuple[Dict[str, int], Optional[int]]:
+        """merge_user_columns without waiting for durability; pass the sequence number to commit."""
+        names = list(columns.names)
+        ages = np.asarray(columns.ages).tolist()
+        with self._writing():
+            summary = self._merge_columns(names, ages, columns.is_new, strategy)
+            seq = None
+            if summary['inserted'] or summary['updated']:
+                seq = self._log({'op': 'merge', 'strategy': strategy.value, 'Name': names,
+                                 'Age': ages, 'is_new': columns.is_new})
+        return summary, seq
+
+    def _ages_of(self, row_ids: Sequence[int]) -> List[int]:
+        """Ages of live row ids, whether they are in the main frame or the buffer."""
+        # 主表的列以一次 searchsorted 定位並向量化取值，緩衝區的列逐一取
+        positions = self._positions(row_ids)
+        frame_rows = len(self._frame)
+        buffered = positions >= frame_rows
+        ages = np.empty(len(positions), dtype=np.int64)
+        if buffered.any():
+            pending_ages = self._pending['Age']
+            ages[buffered] = [pending_ages[offset] for offset in (positions[buffered] - frame_rows).tolist()]
+        if not buffered.all():
+            ages[~buffered] = self._frame['Age'].to_numpy()[positions[~buffered]]
+        return ages.tolist()
+
+    def _append_columns(self, names: Sequence[str], ages: Sequence[int],
+                        flags: Sequence[bool]) -> None:
+        """Append a whole block to the buffer; only index upkeep is per row."""
+        if not names:
+            return
+        self._mutations += 1
+        start = self._next_row_id
+        # 名稱與年齡索引共用同一批 int 物件
+        row_ids = list(range(start, start + len(names)))
+        self._next_row_id = start + len(names)
+        self._pending['is_new'].extend(flags)
+        self._pending['Name'].extend(names)
+        self._pending['Age'].extend(ages)
+        self._pending_ids.extend(row_ids)
+        self._dead.extend(bytes(len(row_ids)))
+        self._add_sorted_names([name for row_id, name in zip(row_ids, names)
+                                if self._index_name(name, row_id)])
+        self._age_index.add_many(ages, row_ids)
+        if self._sketches is not None:
+            self._sketches.add_many(names, ages)
+        for char, stats in self._first_char_stats(np.asarray(names), np.asarray(ages)).items():
+            self._add_first_char_aggregate(char, stats['sum'], stats['count'])
+        self._maybe_flush_pending()
+
+    def _append_row(self, name: str, age: int, is_new: bool) -> None:
+        self._mutations += 1
+        row_id = self._next_row_id
+        self._next_row_id += 1
+        self._pending['is_new'].append(is_new)
+        self._pending['Name'].append(name)
+        self._pending['Age'].append(age)
+        self._pending_ids.append(row_id)
+        self._dead.append(0)
+        if self._index_name(name, row_id):
+            self._add_sorted_names([name])
+        self._age_index.add_many((age,), (row_id,))
+        if self._sketches is not None:
+            self._sketches.add_many((name,), (age,))
+        self._update_first_char_aggregate(name, age, 1)
+
+    def _add_first_char_aggregate(self, char: str, age_sum: int, count: int) -> None:
+        current_sum, current_count = self._first_char_aggregates.get(char, (0, 0))
+        if current_count + count == 0:
+            self._first_char_aggregates.pop(char, None)
+        else:
+            self._first_char_aggregates[char] = (current_sum + age_sum, current_count + count)
+
+    def _compact(self) -> None:
+        if self._dead_count == 0:
+            return
+        frame = self._frame[~np.frombuffer(self._dead, dtype=bool)]
+        if isinstance(frame['Name'].dtype, pd.CategoricalDtype):
+            frame = frame.assign(Name=frame['Name'].cat.remove_unused_categories())
+        self._frame = frame
+        self._dead = bytearray(len(self._frame))
+        self._dead_count = 0
+        self._compactions += 1
+
+    def _compact_layout(self, frame: pd.DataFrame, categories: Optional[pd.Index] = None,
+                        encode_names: Optional[bool] = None) -> pd.DataFrame:
+        """Convert a frame to the compact dtypes, if compact storage is on.
+
+        Args:
+            frame: Frame to convert
+            categories: Name dictionary to encode against; must already hold every name
+            encode_names: Whether to dictionary-encode names; by default only
+                when categories is given or few of the names are distinct
+        """
+        if not self._compact_storage or frame.empty:
+            return frame
+        columns = {}
+        if encode_names is None:
+            encode_names = categories is not None or (
+                'Name' in frame and frame['Name'].nunique() <= self.CATEGORY_MAX_RATIO * len(frame))
+        if 'Name' in frame and encode_names:
+            columns['Name'] = pd.Categorical(frame['Name'], categories=categories)
+        if 'Age' in frame:
+            ages = frame['Age'].to_numpy()
+            columns['Age'] = ages.astype(_small_uint_dtype(ages))
+        if 'is_new' in frame:
+            columns['is_new'] = frame['is_new'].to_numpy(dtype=bool)
+        index = frame.index.to_numpy()
+        return frame.assign(**columns).set_axis(pd.Index(index, dtype=_small_uint_dtype(index)))
+
+    def _current_average_age_by_first_char(self) -> Dict[str, float]:
+        return {char: age_sum / count
+                for char, (age_sum, count) in sorted(self._first_char_aggregates.items())}
+
+    def _current_sketches(self) -> UserSketches:
+        """Sketches of the live rows; caller holds the lock."""
+        if self._sketches is not None:
+            return self._sketches
+        frame = self.df
+        sketches = self._sketch_template.empty()
+        sketches.add_many(frame['Name'].tolist(), frame['Age'].tolist())
+        if self._incremental_sketches:
+            self._sketches = sketches
+        return sketches
+
+    def _dead_ratio(self) -> float:
+        return self._dead_count / len(self._dead) if self._dead else 0.0
+
+    def _delete_names(self, names: Sequence[str], keep_names: bool = False) -> int:
+        """Tombstone every row of the given names; caller holds the lock and logs.
+
+        With keep_names the names stay in the sorted name index with no rows,
+        for a caller that adds rows under them before releasing the lock.
+        """
+        row_names, row_ids = [], []
+        for name in names:
+            ids = _index_ids(self._name_index.pop(name, None))
+            if not ids:
+                continue
+            if keep_names:
+                self._name_index[name] = []
+            else:
+                self._remove_sorted_name(name)
+            row_names.extend([name] * len(ids))
+            row_ids.extend(ids)
+        for name, row_id, age in zip(row_names, row_ids, self._ages_of(row_ids)):
+            self._update_first_char_aggregate(name, age, -1)
+            self._age_index.remove(age, row_id)
+        if row_ids:
+            self._mark_dead(row_ids)
+        return len(row_ids)
+
+    def _delete_user(self, name: str, age: int) -> int:
+        """Tombstone every row matching (name, age); caller holds the lock and logs."""
+        same_name = _index_ids(self._name_index.get(name))
+        ages = self._ages_of(same_name)
+        row_ids = [row_id for row_id, row_age in zip(same_name, ages) if row_age == age]
+        if not row_ids:
+            return 0
+        self._set_name_ids(name, [row_id for row_id, row_age in zip(same_name, ages) if row_age != age])
+        self._update_first_char_aggregate(name, age, -len(row_ids))
+        for row_id in row_ids:
+            self._age_index.remove(age, row_id)
+        self._mark_dead(row_ids)
+        return len(row_ids)
+
+    def _empty_buffer(self) -> dict:
+        return {column: [] for column in self.COLUMNS}
+
+    def _add_sorted_names(self, names: List[str]) -> None:
+        if len(names) == 1:
+            bisect.insort(self._sorted_names, names[0])
+        elif names:
+            # 整批新名稱：附加後重新排序，Timsort 會直接合併兩段已排序的資料
+            self._sorted_names.extend(sorted(names))
+            self._sorted_names.sort()
+
+    def _align_categories(self, block: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Put the main frame and a new block on one shared name dictionary.
+
+        New names are appended to the end of the dictionary, so the existing
+        codes stay valid and concat keeps the categorical dtype.
+        """
+        frame = self._frame
+        if not isinstance(frame['Name'].dtype, pd.CategoricalDtype):
+            return frame, self._compact_layout(block, encode_names=False)
+        categories = frame['Name'].cat.categories
+        new_names = pd.unique(block['Name'].to_numpy())
+        new_names = new_names[categories.get_indexer(new_names) < 0]
+        if len(categories) + len(new_names) > self.CATEGORY_MAX_RATIO * (len(frame) + len(block)):
+            # 名稱大多不重複：改回一般字串欄位，之後的合併不必再擴充字典
+            frame = frame.assign(Name=frame['Name'].astype(object))
+            return frame, self._compact_layout(block, encode_names=False)
+        if len(new_names):
+            frame = frame.assign(Name=frame['Name'].cat.add_categories(new_names))
+            categories = frame['Name'].cat.categories
+        return frame, self._compact_layout(block, categories)
+
+    def _first_char_stats(self, names: np.ndarray, ages: np.ndarray) -> Dict[str, dict]:
+        keys = group_keys(names, UserGrouping(UserField.NAME.value, prefix_length=1))
+        return aggregate_groups(keys, ages, [UserAggregation.SUM, UserAggregation.COUNT])
+
+    def _flush_pending(self) -> None:
+        """Merge the append buffer into the main frame with a single concat."""
+        if not self._pending_ids:
+            return
+        block = pd.DataFrame(self._pending, index=self._pending_ids)
+        if self._frame.empty:
+            self._frame = self._compact_layout(block)
+        else:
+            self._frame = pd.concat([*self._align_categories(block)])
+        self._pending = self._empty_buffer()
+        self._pending_ids = []
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Acquire the writer lock, recording how long the caller waited."""
+        start = time.perf_counter()
+        self._lock.acquire()
+        waited = time.perf_counter() - start
+        self._lock_acquisitions += 1
+        self._lock_wait_seconds += waited
+        self._lock_wait_max_seconds = max(self._lock_wait_max_seconds, waited)
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    def _log(self, record: dict) -> Optional[int]:
+        """Append a write to the journal, if journaling is on; see _commit."""
+        if self._journal is None:
+            return None
+        return self._journal.append(record)
+
+    def _mark_dead(self, row_ids) -> None:
+        if not len(row_ids):
+            return
+        self._mutations += 1
+        dead = self._dead
+        for position in self._positions(row_ids).tolist():
+            dead[position] = 1
+        self._dead_count += len(row_ids)
+        self._sketches = None
+
+    def _materialize(self) -> pd.DataFrame:
+        self._flush_pending()
+        if self._dead_count and self._dead_ratio() >= self._compaction_threshold:
+            self._compact()
+        if self._dead_count == 0:
+            return self._frame
+        return self._frame[~np.frombuffer(self._dead, dtype=bool)]
+
+    def _maybe_flush_pending(self) -> None:
+        # 緩衝區大小與主表成比例時才合併，使每筆寫入的攤銷成本維持 O(1)
+        if len(self._pending_ids) >= max(self.MIN_FLUSH_ROWS, len(self._frame)):
+            self._flush_pending()
+
+    def _positions(self, row_ids: Sequence[int]) -> np.ndarray:
+        """Physical positions of row ids; ids increase monotonically with position."""
+        ids = np.asarray(row_ids, dtype=np.int64)
+        pending_start = self._pending_ids[0] if self._pending_ids else self._next_row_id
+        buffered = ids >= pending_start
+        positions = ids - pending_start + len(self._frame)
+        if not buffered.all():
+            positions[~buffered] = self._frame.index.searchsorted(ids[~buffered])
+        return positions
+
+    def _index_name(self, name: str, row_id: int) -> bool:
+        """Add a row id to the name index; returns True if the name is new."""
+        entry = self._name_index.get(name)
+        if entry is None:
+            self._name_index[name] = row_id
+            return True
+        elif isinstance(entry, int):
+            self._name_index[name] = [entry, row_id]
+        else:
+            entry.append(row_id)
+        return False
+
+    def _merge_columns(self, names: List[str], ages: List[int], is_new: bool,
+                       strategy: UserDedupStrategy) -> Dict[str, int]:
+        """Resolve a batch against the stored rows and apply it; caller holds the lock and logs."""
+        if strategy == UserDedupStrategy.APPEND:
+            self._append_columns(names, ages, [is_new] * len(names))
+            return {'inserted': len(names), 'skipped': 0, 'updated': 0}
+        batch = pd.DataFrame({'Name': names, 'Age': ages})
+        if strategy == UserDedupStrategy.UPSERT:
+            # 批次內同名的列以最後一筆為準
+            batch = batch[~batch['Name'].duplicated(keep='last')]
+        # 只取出批次中出現的名稱的既有列（經由名稱索引），再以雜湊比對，成本與資料表大小無關
+        stored_names, stored_ids = [], []
+        for name in batch['Name'].unique().tolist():
+            row_ids = _index_ids(self._name_index.get(name))
+            stored_names.extend([name] * len(row_ids))
+            stored_ids.extend(row_ids)
+        stored = pd.DataFrame({'Name': stored_names, 'Age': self._ages_of(stored_ids)})
+        if strategy == UserDedupStrategy.SKIP_DUPLICATES:
+            keys = pd.MultiIndex.from_frame(batch)
+            keep = ~keys.duplicated() & ~keys.isin(pd.MultiIndex.from_frame(stored))
+            updated = 0
+        else:
+            counts = stored.groupby('Name', sort=False)['Age'].agg(['size', 'first'])
+            matched = batch['Name'].isin(counts.index).to_numpy()
+            # 該名稱只有一列且年齡相同時內容不變，不需改寫
+            unchanged = matched & ((batch['Name'].map(counts['size']) == 1)
+                                   & (batch['Name'].map(counts['first']) == batch['Age'])).to_numpy()
+            replaced = batch['Name'][matched & ~unchanged].tolist()
+            # 被取代的名稱馬上會再加入，保留在排序名稱索引中，不必逐一移除再插入
+            self._delete_names(replaced, keep_names=True)
+            keep = ~unchanged
+            updated = len(replaced)
+        kept = batch[keep]
+        self._append_columns(kept['Name'].tolist(), kept['Age'].tolist(), [is_new] * len(kept))
+        if updated:
+            for name in replaced:
+                self._set_name_ids(name, self._name_index[name])
+        return {'inserted': len(kept) - updated, 'skipped': len(names) - len(kept), 'updated': updated}
+
+    def _plain_name_bytes(self, names: pd.Series) -> int:
+        """Size the Name column would have as one Python string object per row."""
+        if not isinstance(names.dtype, pd.CategoricalDtype):
+            return int(names.memory_usage(index=False, deep=True))
+        sizes = np.array([sys.getsizeof(name) for name in names.cat.categories.tolist()], dtype=np.int64)
+        return 8 * len(names) + int(sizes[names.cat.codes.to_numpy()].sum()) if len(sizes) else 0
+
+    def _rebuild_indexes(self) -> None:
+        self._name_index = {}
+        self._first_char_aggregates = {}
+        self._age_index = AgeIndex()
+        self._sketches = None
+        if self._frame.empty:
+            self._sorted_names = []
+            return
+        row_ids = self._frame.index.tolist()
+        for row_id, name in zip(row_ids, self._frame['Name'].tolist()):
+            self._index_name(name, row_id)
+        self._sorted_names = sorted(self._name_index)
+        self._age_index.add_many(self._frame['Age'].tolist(), row_ids)
+        stats = self._first_char_stats(self._frame['Name'].to_numpy(), self._frame['Age'].to_numpy())
+        self._first_char_aggregates = {char: (s['sum'], s['count']) for char, s in stats.items()}
+
+    def _recompute_average_age_by_first_char(self) -> Dict[str, float]:
+        """Full regroup of the live rows, used to verify the running aggregates."""
+        grouping = UserGrouping(UserField.NAME.value, prefix_length=1)
+        return self.compute_group_average(grouping, UserField.AGE.value)
+
+    def _replay(self, record: dict) -> int:
+        op = record['op']
+        if op == 'create':
+            self._append_row(record['Name'], record['Age'], True)
+            return 1
+        if op == 'bulk':
+            self._append_columns(record['Name'], record['Age'], record['is_new'])
+            return len(record['Name'])
+        if op == 'delete':
+            return self._delete_user(record['Name'], record['Age'])
+        if op == 'delete_by_name':
+            return self._delete_names([record['Name']])
+        if op == 'merge':
+            summary = self._merge_columns(record['Name'], record['Age'], record['is_new'],
+                                          UserDedupStrategy(record['strategy']))
+            return summary['inserted'] + summary['updated']
+        return 0
+
+    def _to_records(self, df: pd.DataFrame, with_is_new: bool) -> List[dict]:
+        """Convert columns straight to JSON-ready dicts without per-row Series or models."""
+        names = df['Name'].tolist()
+        ages = df['Age'].tolist()
+        if not with_is_new:
+            return [{'Name': name, 'Age': age} for name, age in zip(names, ages)]
+        flags = df['is_new'].astype(bool).tolist()
+        return [{'is_new': is_new, 'Name': name, 'Age': age}
+                for is_new, name, age in zip(flags, names, ages)]
+
+    def _records_by_ids(self, frame: pd.DataFrame, row_ids: List[int]) -> List[dict]:
+        """Records of the given row ids in the given order, skipping ids not in the frame."""
+        if not row_ids:
+            return []
+        ids = np.asarray(row_ids)
+        positions = np.asarray(frame.index.searchsorted(ids))
+        found = positions < len(frame)
+        found[found] = frame.index.to_numpy()[positions[found]] == ids[found]
+        positions = positions[found]
+        # 逐欄取出少數幾列，比 frame.iloc 建立子表便宜
+        names = frame['Name'].array.take(positions).tolist()
+        ages = frame['Age'].to_numpy()[positions].tolist()
+        flags = frame['is_new'].to_numpy(dtype=bool)[positions].tolist()
+        return [{'is_new': is_new, 'Name': name, 'Age': age}
+                for is_new, name, age in zip(flags, names, ages)]
+
+    def _remove_sorted_name(self, name: str) -> None:
+        del self._sorted_names[bisect.bisect_left(self._sorted_names, name)]
+
+    def _set_name_ids(self, name: str, row_ids: List[int]) -> None:
+        # 以新物件取代而非原地修改，未持鎖的讀取者不會看到改到一半的 list
+        if not row_ids:
+            del self._name_index[name]
+            self._remove_sorted_name(name)
+        else:
+            self._name_index[name] = row_ids[0] if len(row_ids) == 1 else row_ids
+
+    def _update_first_char_aggregate(self, name: str, age: int, count: int) -> None:
+        self._add_first_char_aggregate(name[0], age * count, count)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Writer lock that publishes a new data version when released, if rows changed."""
+        with self._locked():
+            mutations = self._mutations
+            try:
+                yield
+            finally:
+                # 沒有新增或刪除任何列（例如刪除不存在的使用者）時保留版本，ETag 與回應快取仍有效
+                if self._mutations != mutations:
+                    self._version += 1
@@ -0,0 +1,177 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from app.interfaces.user_repository import IUserRepository, UserGrouping
+from app.domain.user import User, NewUser, UserAggregation, UserColumns, UserDedupStrategy
+from .exceptions import SharedStateUnavailableException
+from .user_repository_csv import UserCSVRepository
+from .user_sketches import UserSketches
+from .user_state_service import UserStateManager, read_authkey
+
+class UserSharedRepository(IUserRepository):
+    """Worker-side view of the user table owned by the state server.
+
+    Writes are forwarded to the server. Reads are served from a local
+    UserCSVRepository replica, which first pulls any newer records from the
+    server's change feed, so every worker reads its own and other workers'
+    acknowledged writes while the read work itself stays in the worker.
+    """
+
+    def __init__(self, address: Union[str, Path], authkey: Optional[bytes] = None,
+                 compaction_threshold: float = 0.25, connect_timeout: float = 10.0,
+                 compact_storage: bool = False, sketches: Optional[UserSketches] = None,
+                 incremental_sketches: bool = False,
+                 authkey_path: Optional[Union[str, Path]] = None):
+        if authkey is None and authkey_path is None:
+            raise ValueError("UserSharedRepository needs an authkey or an authkey_path")
+        self._compaction_threshold = compaction_threshold
+        self._compact_storage = compact_storage
+        self._sketch_template = sketches
+        self._incremental_sketches = incremental_sketches
+        self._state = self._connect(str(address), authkey, authkey_path, connect_timeout)
+        self._replica = self._new_replica()
+        self._epoch = None
+        self._seq = 0
+        self._resyncs = 0
+        self._sync_lock = threading.Lock()
+
+    def add_multiple_users(self, users: List[Union[NewUser, User]]) -> None:
+        self._state.add_multiple_users(users)
+
+    def add_user_columns(self, columns: UserColumns) -> None:
+        self._state.add_user_columns(columns)
+
+    def compute_group_average(self,
+                              grouping: UserGrouping,
+                              field: str) -> Dict[Any, float]:
+        return self._synced().compute_group_average(grouping, field)
+
+    def compute_group_stats(self,
+                            grouping: UserGrouping,
+                            field: str,
+                            aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+        return self._synced().compute_group_stats(grouping, field, aggregations)
+
+    def create_user(self, user: NewUser) -> None:
+        self._state.create_user(user)
+
+    def delete_user(self, user: User) -> int:
+        return self._state.delete_user(user)
+
+    def delete_user_by_name(self, name: str) -> int:
+        return self._state.delete_user_by_name(name)
+
+    def export_sketches(self) -> bytes:
+        return self._synced().export_sketches()
+
+    def get_added_user(self) -> List[NewUser]:
+        return self._synced().get_added_user()
+
+    def get_added_user_records(self) -> List[dict]:
+        return self._synced().get_added_user_records()
+
+    def get_all_users(self) -> List[User]:
+        return self._synced().get_all_users()
+
+    def get_all_user_records(self) -> List[dict]:
+        return self._synced().get_all_user_records()
+
+    def get_average_age_by_first_char(self) -> Dict[str, float]:
+        return self._synced().get_average_age_by_first_char()
+
+    def get_data_version(self) -> str:
+        # 以 state server 的 epoch 與 change feed 序號為版本，所有 worker 一致
+        with self._sync_lock:
+            self._sync()
+            return f"{self._epoch}-{self._seq}"
+
+    def get_grouped_users_by(self, field: str) -> UserGrouping:
+        return self._synced().get_grouped_users_by(field)
+
+    def get_grouped_users_by_first_char(self, field: str) -> UserGrouping:
+        return self._synced().get_grouped_users_by_first_char(field)
+
+    def get_sketch_stats(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        return self._synced().get_sketch_stats(percentiles)
+
+    def get_storage_stats(self) -> Dict[str, float]:
+        stats = self._synced().get_storage_stats()
+        stats.update({'replica_seq': self._seq, 'replica_resyncs': self._resyncs})
+        return stats
+
+    def get_age_percentiles(self, percentiles: Sequence[float]) -> Dict[float, Optional[float]]:
+        return self._synced().get_age_percentiles(percentiles)
+
+    def get_memory_usage(self) -> Dict[str, Any]:
+        return self._synced().get_memory_usage()
+
+    def get_users_by_name(self, name: str) -> List[User]:
+        return self._synced().get_users_by_name(name)
+
+    def get_user_ids(self, user: User) -> List[int]:
+        return self._synced().get_user_ids(user)
+
+    def get_user_records_by_age(self, min_age: Optional[int], max_age: Optional[int],
+                                limit: int, offset: int = 0) -> Tuple[List[dict], int]:
+        return self._synced().get_user_records_by_age(min_age, max_age, limit, offset)
+
+    def get_user_records_by_age_rank(self, limit: int, oldest: bool) -> List[dict]:
+        return self._synced().get_user_records_by_age_rank(limit, oldest)
+
+    def get_user_records_page(self, after: Optional[int],
+                              limit: int) -> Tuple[List[dict], Optional[int]]:
+        return self._synced().get_user_records_page(after, limit)
+
+    def has_user(self, user: User) -> bool:
+        return self._synced().has_user(user)
+
+    def merge_user_columns(self, columns: UserColumns, strategy: UserDedupStrategy) -> Dict[str, int]:
+        return self._state.merge_user_columns(columns, strategy)
+
+    def search_user_records(self, prefix: str, limit: int, offset: int = 0) -> List[dict]:
+        return self._synced().search_user_records(prefix, limit, offset)
+
+    def _connect(self, address: str, authkey: Optional[bytes],
+                 authkey_path: Optional[Union[str, Path]], timeout: float):
+        # worker 可能比 state server 先啟動（金鑰檔與 socket 都還不存在），逾時前持續重試
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                key = authkey if authkey is not None else read_authkey(authkey_path)
+                manager = UserStateManager(address=address, authkey=key)
+                manager.connect()
+                return manager.user_state()
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise SharedStateUnavailableException(
+                        f"User state server at {address} is not reachable: {e}")
+                time.sleep(0.1)
+
+    def _new_replica(self) -> UserCSVRepository:
+        return UserCSVRepository(compaction_threshold=self._compaction_threshold,
+                                 compact_storage=self._compact_storage,
+                                 sketches=self._sketch_template,
+                                 incremental_sketches=self._incremental_sketches)
+
+    def _resync(self) -> None:
+        epoch, seq, frame, next_row_id = self._state.export()
+        replica = self._new_replica()
+        replica.load(frame, next_row_id)
+        self._replica, self._epoch, self._seq = replica, epoch, seq
+        self._resyncs += 1
+
+    def _sync(self) -> None:
+        changes = self._state.changes_since(self._epoch, self._seq)
+        if changes is None:
+            self._resync()
+        else:
+            for seq, record in changes:
+                self._replica.apply_change(record)
+                self._seq = seq
+
+    def _synced(self) -> UserCSVRepository:
+        """Bring the replica up to date with the server and return it."""
+        with self._sync_lock:
+            self._sync()
+            return self._replica
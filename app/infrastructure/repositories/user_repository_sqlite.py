@@ -0,0 +1,350 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from app.interfaces.user_repository import IUserRepository, UserGrouping
+from app.domain.user import User, NewUser, UserAggregation, UserColumns, UserDedupStrategy, UserField
+from .exceptions import DataframeKeyException, GroupbyKeyException
+from .user_sketches import UserSketches
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with prefix, None if unbounded."""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    code = ord(prefix[-1]) + 1
+    # 代理字元無法編碼成 UTF-8，直接跳到代理區之後
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return prefix[:-1] + chr(code)
+
+class UserSQLiteRepository(IUserRepository):
+    """User repository backed by a local SQLite file.
+
+    Each thread gets its own connection; the database runs in WAL journal
+    mode so other processes can read while one writes. Aggregations are
+    pushed down into SQL instead of loading rows into Python.
+    """
+
+    COLUMNS = {'is_new', UserField.NAME.value, UserField.AGE.value}
+    NUMERIC_COLUMNS = {'is_new', UserField.AGE.value}
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS users (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               Name TEXT NOT NULL,
+               Age INTEGER NOT NULL,
+               is_new INTEGER NOT NULL
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_users_name ON users (Name)",
+        "CREATE INDEX IF NOT EXISTS idx_users_name_age ON users (Name, Age)",
+        "CREATE INDEX IF NOT EXISTS idx_users_age ON users (Age)",
+        # 資料版本：每次寫入遞增；instance 在建立資料庫時隨機產生，重建的資料庫不會沿用舊版本號
+        """CREATE TABLE IF NOT EXISTS meta (
+               id INTEGER PRIMARY KEY CHECK (id = 0),
+               instance TEXT NOT NULL,
+               version INTEGER NOT NULL
+           )""",
+        "INSERT OR IGNORE INTO meta (id, instance, version) VALUES (0, lower(hex(randomblob(8))), 0)",
+    ]
+
+    def __init__(self, path: Union[str, Path], sketches: Optional[UserSketches] = None):
+        self.path = Path(path)
+        self._sketch_template = sketches or UserSketches()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def add_multiple_users(self, users: List[Union[NewUser, User]]) -> None:
+        rows = [(user.Name, user.Age, isinstance(user, NewUser)) for user in users]
+        with self._connection() as conn:
+            conn.executemany("INSERT INTO users (Name, Age, is_new) VALUES (?, ?, ?)", rows)
+            self._bump_version(conn)
+
+    def add_user_columns(self, columns: UserColumns) -> None:
+        rows = zip(columns.names, columns.ages.tolist(), [columns.is_new] * len(columns))
+        with self._connection() as conn:
+            conn.executemany("INSERT INTO users (Name, Age, is_new) VALUES (?, ?, ?)", rows)
+            self._bump_version(conn)
+
+    def compute_group_average(self,
+                              grouping: UserGrouping,
+                              field: str) -> Dict[Any, float]:
+        if field not in self.COLUMNS:
+            raise GroupbyKeyException(f"Field {field} not found in GroupBy")
+        if grouping.field not in self.COLUMNS:
+            raise GroupbyKeyException(f"Group field {grouping.field} not found")
+        stats = self.compute_group_stats(grouping, field, [UserAggregation.MEAN])
+        return {key: values[UserAggregation.MEAN.value] for key, values in stats.items()}
+
+    def compute_group_stats(self,
+                            grouping: UserGrouping,
+                            field: str,
+                            aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+        if field not in self.NUMERIC_COLUMNS:
+            raise GroupbyKeyException(f"Field {field} not found in GroupBy or is not numeric")
+        if grouping.field not in self.COLUMNS:
+            raise DataframeKeyException(f"Field {grouping.field} not found")
+        # 欄位名稱已由白名單檢查，可以安全地放進 SQL
+        key, params = grouping.field, []
+        if grouping.bucket_size is not None:
+            if grouping.field not in self.NUMERIC_COLUMNS:
+                raise GroupbyKeyException(f"Field {grouping.field} is not numeric and cannot be bucketed")
+            key, params = f"({key} / ?) * ?", [grouping.bucket_size, grouping.bucket_size]
+        elif grouping.prefix_length is not None:
+            key, params = f"substr({key}, 1, ?)", [grouping.prefix_length]
+        rows = self._connection().execute(
+            f"""WITH g AS (SELECT {key} AS k, {field} AS v FROM users),
+                     m AS (SELECT k, AVG(v) AS mean FROM g GROUP BY k)
+                SELECT g.k, COUNT(*), AVG(v), MIN(v), MAX(v), SUM(v),
+                       SUM((v - m.mean) * (v - m.mean))
+                FROM g JOIN m ON g.k = m.k GROUP BY g.k ORDER BY g.k""", params)
+        groups = {k: (count, mean, minimum, maximum, total, squares)
+                  for k, count, mean, minimum, maximum, total, squares in rows}
+        if grouping.casefold and grouping.bucket_size is None:
+            # SQLite 的 lower() 只處理 ASCII；改在 Python 以 casefold 合併各分組，與 CSV 後端一致
+            groups = self._casefold_groups(groups)
+        stats = {}
+        for k, (count, mean, minimum, maximum, total, squares) in groups.items():
+            values = {'count': count, 'mean': mean, 'min': minimum, 'max': maximum, 'sum': total,
+                      'std': (squares / (count - 1)) ** 0.5 if count > 1 else None}
+            stats[k] = {UserAggregation(a).value: values[UserAggregation(a).value] for a in aggregations}
+        return stats
+
+    def create_user(self, user: NewUser) -> None:
+        with self._connection() as conn:
+            conn.execute("INSERT INTO users (Name, Age, is_new) VALUES (?, ?, 1)",
+                         (user.Name, user.Age))
+            self._bump_version(conn)
+
+    def delete_user(self, user: User) -> int:
+        with self._connection() as conn:
+            deleted = conn.execute("DELETE FROM users WHERE Name = ? AND Age = ?",
+                                   (user.Name, user.Age)).rowcount
+            if deleted:
+                self._bump_version(conn)
+            return deleted
+
+    def delete_user_by_name(self, name: str) -> int:
+        with self._connection() as conn:
+            deleted = conn.execute("DELETE FROM users WHERE Name = ?", (name,)).rowcount
+            if deleted:
+                self._bump_version(conn)
+            return deleted
+
+    def export_sketches(self) -> bytes:
+        return self._build_sketches().to_bytes()
+
+    def get_added_user(self) -> List[NewUser]:
+        return [NewUser.model_construct(**record) for record in self.get_added_user_records()]
+
+    def get_added_user_records(self) -> List[dict]:
+        rows = self._connection().execute(
+            "SELECT Name, Age FROM users WHERE is_new = 1 ORDER BY id")
+        return [{'Name': name, 'Age': age} for name, age in rows]
+
+    def get_all_users(self) -> List[User]:
+        return [self._to_user(record) for record in self.get_all_user_records()]
+
+    def get_all_user_records(self) -> List[dict]:
+        rows = self._connection().execute("SELECT is_new, Name, Age FROM users ORDER BY id")
+        return [{'is_new': bool(is_new), 'Name': name, 'Age': age} for is_new, name, age in rows]
+
+    def get_average_age_by_first_char(self) -> Dict[str, float]:
+        grouping = UserGrouping(UserField.NAME.value, prefix_length=1)
+        return self.compute_group_average(grouping, UserField.AGE.value)
+
+    def get_age_percentiles(self, percentiles: Sequence[float]) -> Dict[float, Optional[float]]:
+        conn = self._connection()
+        total = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        result = {}
+        for q in percentiles:
+            if total == 0:
+                result[q] = None
+                continue
+            position = q / 100 * (total - 1)
+            lower = int(position)
+            # Age 索引依序排列，OFFSET 直接取第 lower 與 lower+1 名
+            ages = [age for age, in conn.execute(
+                "SELECT Age FROM users ORDER BY Age LIMIT 2 OFFSET ?", (lower,))]
+            if len(ages) == 1 or position == lower:
+                result[q] = float(ages[0])
+            else:
+                result[q] = ages[0] + (ages[1] - ages[0]) * (position - lower)
+        return result
+
+    def get_data_version(self) -> str:
+        instance, version = self._connection().execute(
+            "SELECT instance, version FROM meta WHERE id = 0").fetchone()
+        return f"{instance}-{version}"
+
+    def get_grouped_users_by(self, field: str) -> UserGrouping:
+        if field not in self.COLUMNS:
+            raise DataframeKeyException(f"Field {field} not found")
+        return UserGrouping(field)
+
+    def get_grouped_users_by_first_char(self, field: str) -> UserGrouping:
+        if field not in self.COLUMNS:
+            raise DataframeKeyException(f"Field {field} not found in Dataframe")
+        return UserGrouping(field, prefix_length=1)
+
+    def get_memory_usage(self) -> Dict[str, Any]:
+        # 資料在磁碟上，行程內只有 SQLite 的頁面快取
+        stats = self.get_storage_stats()
+        return {'layout': 'sqlite', 'rows': stats['rows'], 'file_bytes': stats['file_bytes']}
+
+    def get_sketch_stats(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        return self._build_sketches().stats(percentiles)
+
+    def get_storage_stats(self) -> Dict[str, float]:
+        conn = self._connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            'rows': conn.execute("SELECT COUNT(*) FROM users").fetchone()[0],
+            'file_bytes': page_size * page_count,
+            'free_pages': free_pages,
+            'dead_ratio': free_pages / page_count if page_count else 0.0,
+        }
+
+    def get_users_by_name(self, name: str) -> List[User]:
+        rows = self._connection().execute(
+            "SELECT is_new, Name, Age FROM users WHERE Name = ? ORDER BY id", (name,))
+        return [self._to_user({'is_new': is_new, 'Name': n, 'Age': age}) for is_new, n, age in rows]
+
+    def get_user_ids(self, user: User) -> List[int]:
+        rows = self._connection().execute(
+            "SELECT id FROM users WHERE Name = ? AND Age = ? ORDER BY id", (user.Name, user.Age))
+        return [row_id for row_id, in rows]
+
+    def get_user_records_by_age(self, min_age: Optional[int], max_age: Optional[int],
+                                limit: int, offset: int = 0) -> Tuple[List[dict], int]:
+        conditions, params = [], []
+        if min_age is not None:
+            conditions.append("Age >= ?")
+            params.append(min_age)
+        if max_age is not None:
+            conditions.append("Age <= ?")
+            params.append(max_age)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM users {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT is_new, Name, Age FROM users {where} ORDER BY Age, id LIMIT ? OFFSET ?",
+            (*params, limit, offset))
+        return [{'is_new': bool(is_new), 'Name': name, 'Age': age} for is_new, name, age in rows], total
+
+    def get_user_records_by_age_rank(self, limit: int, oldest: bool) -> List[dict]:
+        order = "Age DESC, id" if oldest else "Age, id"
+        rows = self._connection().execute(
+            f"SELECT is_new, Name, Age FROM users ORDER BY {order} LIMIT ?", (limit,))
+        return [{'is_new': bool(is_new), 'Name': name, 'Age': age} for is_new, name, age in rows]
+
+    def get_user_records_page(self, after: Optional[int],
+                              limit: int) -> Tuple[List[dict], Optional[int]]:
+        # 多取一筆判斷是否還有下一頁
+        rows = self._connection().execute(
+            "SELECT id, is_new, Name, Age FROM users WHERE id > ? ORDER BY id LIMIT ?",
+            (-1 if after is None else after, limit + 1)).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return ([{'is_new': bool(is_new), 'Name': name, 'Age': age}
+                 for _, is_new, name, age in rows[:limit]], next_cursor)
+
+    def has_user(self, user: User) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM users WHERE Name = ? AND Age = ? LIMIT 1", (user.Name, user.Age)).fetchone()
+        return row is not None
+
+    def merge_user_columns(self, columns: UserColumns, strategy: UserDedupStrategy) -> Dict[str, int]:
+        if strategy == UserDedupStrategy.APPEND:
+            self.add_user_columns(columns)
+            return {'inserted': len(columns), 'skipped': 0, 'updated': 0}
+        pairs = zip(columns.names, columns.ages.tolist())
+        if strategy == UserDedupStrategy.SKIP_DUPLICATES:
+            rows = list(dict.fromkeys(pairs))
+        else:
+            # 同名以最後一筆為準，並依最後出現的位置排序
+            latest: Dict[str, int] = {}
+            for name, age in pairs:
+                latest.pop(name, None)
+                latest[name] = age
+            rows = list(latest.items())
+        with self._connection() as conn:
+            # 批次先放進暫存表，再以 (Name, Age) 索引逐列比對，成本與資料表大小無關
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (Name TEXT NOT NULL, Age INTEGER NOT NULL)")
+            conn.execute("DELETE FROM incoming")
+            conn.executemany("INSERT INTO incoming (Name, Age) VALUES (?, ?)", rows)
+            if strategy == UserDedupStrategy.SKIP_DUPLICATES:
+                updated = 0
+                conn.execute(
+                    "DELETE FROM incoming WHERE EXISTS (SELECT 1 FROM users u "
+                    "WHERE u.Name = incoming.Name AND u.Age = incoming.Age)")
+            else:
+                # 該名稱只有一列且年齡相同時內容不變，不需改寫
+                conn.execute(
+                    "DELETE FROM incoming WHERE (SELECT COUNT(*) FROM users u WHERE u.Name = incoming.Name) = 1 "
+                    "AND EXISTS (SELECT 1 FROM users u WHERE u.Name = incoming.Name AND u.Age = incoming.Age)")
+                updated = conn.execute(
+                    "SELECT COUNT(*) FROM incoming i WHERE EXISTS (SELECT 1 FROM users u WHERE u.Name = i.Name)"
+                ).fetchone()[0]
+                conn.execute("DELETE FROM users WHERE Name IN (SELECT Name FROM incoming)")
+            written = conn.execute("INSERT INTO users (Name, Age, is_new) SELECT Name, Age, ? FROM incoming "
+                                   "ORDER BY rowid", (int(columns.is_new),)).rowcount
+            if written:
+                self._bump_version(conn)
+        return {'inserted': written - updated, 'skipped': len(columns) - written, 'updated': updated}
+
+    def search_user_records(self, prefix: str, limit: int, offset: int = 0) -> List[dict]:
+        # 以範圍條件取代 LIKE 才能使用 Name 索引；TEXT 以 UTF-8 位元組比較，順序與 Python 字串相同
+        upper = _prefix_upper_bound(prefix)
+        condition, params = ("Name >= ?", [prefix]) if upper is None else ("Name >= ? AND Name < ?", [prefix, upper])
+        rows = self._connection().execute(
+            f"SELECT is_new, Name, Age FROM users WHERE {condition} ORDER BY Name, id LIMIT ? OFFSET ?",
+            (*params, limit, offset))
+        return [{'is_new': bool(is_new), 'Name': name, 'Age': age} for is_new, name, age in rows]
+
+    def _build_sketches(self) -> UserSketches:
+        # 其他行程也可能寫入同一個資料庫，無法在插入時增量更新：每次以分批掃描建立
+        sketches = self._sketch_template.empty()
+        cursor = self._connection().execute("SELECT Name, Age FROM users ORDER BY id")
+        while rows := cursor.fetchmany(UserSketches.FOLD_ROWS):
+            names, ages = zip(*rows)
+            sketches.add_many(names, ages)
+        return sketches
+
+    @staticmethod
+    def _casefold_groups(groups: Dict[Any, tuple]) -> Dict[Any, tuple]:
+        """Merge per-key (count, mean, min, max, sum, squared deviations) under casefolded keys."""
+        merged: Dict[Any, tuple] = {}
+        for k, (count, mean, minimum, maximum, total, squares) in groups.items():
+            key = k.casefold() if isinstance(k, str) else k
+            if key not in merged:
+                merged[key] = (count, mean, minimum, maximum, total, squares)
+                continue
+            other_count, other_mean, other_min, other_max, other_total, other_squares = merged[key]
+            combined = count + other_count
+            delta = mean - other_mean
+            # 兩組的平方差和以平行變異數公式合併
+            merged[key] = (combined, (total + other_total) / combined, min(minimum, other_min),
+                           max(maximum, other_max), total + other_total,
+                           squares + other_squares + delta * delta * count * other_count / combined)
+        return dict(sorted(merged.items()))
+
+    def _bump_version(self, conn: sqlite3.Connection) -> None:
+        # 與資料異動在同一個交易中，其他行程讀到的版本與資料一致
+        conn.execute("UPDATE meta SET version = version + 1 WHERE id = 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _to_user(self, record: dict) -> User:
+        model = NewUser if record['is_new'] else User
+        return model.model_construct(Name=record['Name'], Age=record['Age'])
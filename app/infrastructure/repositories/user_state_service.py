@@ -0,0 +1,160 @@
+import os
+import secrets
+import threading
+import uuid
+from collections import deque
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from app.domain.user import User, NewUser, UserColumns, UserDedupStrategy
+from .user_repository_csv import UserCSVRepository
+
+class UserStateService:
+    """Single owner of the user table shared by every uvicorn worker.
+
+    Every write is applied to the wrapped repository and appended to a
+    bounded change feed in journal record form. Only applying the write and
+    assigning its feed position happen under the service lock; waiting for
+    the journal to make it durable happens after the lock is released, so
+    concurrent writers share one group commit. Workers keep a local
+    replica and pull only the records they have not seen yet; a worker that
+    fell behind the feed, or that talks to a restarted server (new epoch),
+    re-downloads the table with export().
+    """
+
+    def __init__(self, repo: UserCSVRepository, feed_size: int = 10000):
+        self._repo = repo
+        self._lock = threading.Lock()
+        self._epoch = uuid.uuid4().hex
+        self._seq = 0
+        self._feed: deque = deque(maxlen=feed_size)
+
+    def add_multiple_users(self, users: List[Union[NewUser, User]]) -> int:
+        return self._apply({'op': 'bulk',
+                            'Name': [user.Name for user in users],
+                            'Age': [user.Age for user in users],
+                            'is_new': [isinstance(user, NewUser) for user in users]})
+
+    def add_user_columns(self, columns: UserColumns) -> int:
+        return self._apply({'op': 'bulk',
+                            'Name': list(columns.names),
+                            'Age': np.asarray(columns.ages).tolist(),
+                            'is_new': [columns.is_new] * len(columns.names)})
+
+    def changes_since(self, epoch: Optional[str], seq: int) -> Optional[List[Tuple[int, dict]]]:
+        """Records written after `seq`, or None if the caller must call export().
+
+        Args:
+            epoch: Epoch the caller's replica was exported from
+            seq: Last sequence number the caller has applied
+        """
+        with self._lock:
+            if epoch != self._epoch or seq > self._seq:
+                return None
+            if seq == self._seq:
+                return []
+            if not self._feed or self._feed[0][0] > seq + 1:
+                return None
+            return [(record_seq, record) for record_seq, record in self._feed if record_seq > seq]
+
+    def create_user(self, user: NewUser) -> int:
+        return self._apply({'op': 'create', 'Name': user.Name, 'Age': user.Age})
+
+    def delete_user(self, user: User) -> int:
+        return self._apply({'op': 'delete', 'Name': user.Name, 'Age': user.Age})
+
+    def delete_user_by_name(self, name: str) -> int:
+        return self._apply({'op': 'delete_by_name', 'Name': name})
+
+    def export(self) -> Tuple[str, int, pd.DataFrame, int]:
+        """Full copy of the live rows: (epoch, seq, frame indexed by row id, next row id).
+
+        Replicas keep the server's row ids, so id-based cursors are valid on every worker.
+        """
+        with self._lock:
+            return self._epoch, self._seq, self._repo.df, self._repo.next_row_id
+
+    def get_storage_stats(self) -> dict:
+        return {**self._repo.get_storage_stats(), 'feed_seq': self._seq,
+                'feed_records': len(self._feed)}
+
+    def merge_user_columns(self, columns: UserColumns, strategy: UserDedupStrategy) -> Dict[str, int]:
+        # 重播同一筆 merge 記錄會對相同的資料得到相同的結果，副本不必知道比對的細節
+        record = {'op': 'merge', 'strategy': strategy.value, 'Name': list(columns.names),
+                  'Age': np.asarray(columns.ages).tolist(), 'is_new': columns.is_new}
+        with self._lock:
+            summary, journal_seq = self._repo.stage_merge(columns, strategy)
+            if summary['inserted'] or summary['updated']:
+                self._seq += 1
+                self._feed.append((self._seq, record))
+        self._repo.commit(journal_seq)
+        return summary
+
+    def _apply(self, record: dict) -> int:
+        # 寫入與進入 change feed 必須是同一個順序，副本重播才會得到相同結果
+        with self._lock:
+            count, journal_seq = self._repo.stage_change(record)
+            if count:
+                self._seq += 1
+                self._feed.append((self._seq, record))
+        # 等待 fsync 時不持有鎖，其他寫入可以排進同一次 group commit
+        self._repo.commit(journal_seq)
+        return count
+
+class UserStateManager(BaseManager):
+    """Connects workers to the UserStateService over a Unix socket."""
+
+UserStateManager.register('user_state')
+
+def serve_user_state(service: UserStateService, address: Union[str, Path], authkey: bytes):
+    """Create the state server; call serve_forever() on the result to run it.
+
+    Args:
+        service: The service every worker should share
+        address: Path of the Unix socket to listen on
+        authkey: Shared secret workers must present
+    """
+    class _StateServerManager(UserStateManager):
+        pass
+
+    _StateServerManager.register('user_state', callable=lambda: service)
+    address = Path(address)
+    address.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # 上一次執行留下的 socket 檔會讓 bind 失敗
+    if address.exists():
+        os.unlink(address)
+    manager = _StateServerManager(address=str(address), authkey=authkey)
+    # bind 時就以 0600 建立 socket，不留下其他使用者可以連線的空檔
+    umask = os.umask(0o177)
+    try:
+        return manager.get_server()
+    finally:
+        os.umask(umask)
+
+def create_authkey(path: Union[str, Path]) -> bytes:
+    """Return the state server's key from path, generating it on first use.
+
+    The file is only readable by its owner; workers of the same user read it
+    with read_authkey.
+
+    Args:
+        path: Key file shared by the state server and its workers
+    """
+    path = Path(path)
+    if path.exists():
+        os.chmod(path, 0o600)
+        return read_authkey(path)
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.tmp-{uuid.uuid4().hex}')
+    # 先寫到暫存檔再改名，worker 不會讀到寫了一半的金鑰
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    os.rename(tmp, path)
+    return read_authkey(path)
+
+def read_authkey(path: Union[str, Path]) -> bytes:
+    """Read the key written by create_authkey; raises FileNotFoundError until it exists."""
+    return Path(path).read_text().strip().encode()
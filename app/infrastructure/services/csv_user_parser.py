@@ -1,25 +1,236 @@
 from app.interfaces.user_data_loader import IUserDataLoader
-from app.domain.user import User, NewUser, UserField
+from app.domain.user import User, NewUser, RejectedRow, UserColumns, UserField, UserImportReport
+from app.domain.user.exceptions import EmptyUserNameError, NegativeUserAgeError
+from app.infrastructure.persistence.columnar import decode_names, encode_names
+import io
+import os
+import multiprocessing
+import numpy as np
 import pandas as pd
-from typing import List
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
 from .exceptions import CSVParserException
 
+@dataclass
+class _ParsedRange:
+    """Validated columns of one byte range, left in a shared memory block by a worker."""
+    shm_name: str
+    rows: int
+    valid: int
+    name_bytes: int
+    rejected: List[RejectedRow]
+    rejected_count: int
+
+def _split_byte_ranges(path: str, rows_per_range: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """Header line plus (start, end) offsets of body ranges that each begin at a line start.
+
+    A range holds roughly rows_per_range rows, estimated from the average
+    line length of the first 64 KiB. Quoted fields spanning several lines
+    are not supported, since a boundary could fall inside one.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        size = os.fstat(f.fileno()).st_size
+        sample = f.read(1 << 16)
+        line_bytes = len(sample) / max(sample.count(b'\n'), 1)
+        target = max(int(line_bytes * rows_per_range), 1 << 16)
+        bounds = [body_start]
+        while bounds[-1] + target < size:
+            # 跳到下一個換行之後，確保每段都從完整的一列開始
+            f.seek(bounds[-1] + target)
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+        bounds.append(size)
+    return header, [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+def _parse_byte_range(path: str, header: bytes, start: int, end: int,
+                      is_new: bool, rejection_limit: int) -> _ParsedRange:
+    """Worker: parse and validate one range, then copy its columns into shared memory.
+
+    The block holds the name offsets (int64), the ages (int64) and the
+    UTF-8 name bytes back to back; the parent unlinks it after reading.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        body = f.read(end - start)
+    parser = CsvUserParserService()
+    frame = parser._read_csv(io.BytesIO(header + body))
+    report = UserImportReport(rejection_limit=rejection_limit)
+    columns = parser._validated_columns(frame, is_new, report)
+    name_data, name_offsets = encode_names(columns.names)
+    arrays = [name_offsets, np.asarray(columns.ages, dtype=np.int64), name_data]
+    shm = SharedMemory(create=True, size=max(sum(array.nbytes for array in arrays), 1))
+    try:
+        position = 0
+        for array in arrays:
+            shm.buf[position:position + array.nbytes] = array.tobytes()
+            position += array.nbytes
+    finally:
+        shm.close()
+    return _ParsedRange(shm.name, len(frame), len(columns), name_data.nbytes,
+                        report.rejected, report.rejected_count)
+
+def _take_columns(parsed: _ParsedRange, is_new: bool) -> UserColumns:
+    """Read a worker's columns out of shared memory and free the block."""
+    shm = SharedMemory(parsed.shm_name)
+    try:
+        count = parsed.valid
+        offsets = np.frombuffer(shm.buf, dtype=np.int64, count=count + 1)
+        ages = np.frombuffer(shm.buf, dtype=np.int64, count=count, offset=offsets.nbytes).copy()
+        data = np.frombuffer(shm.buf, dtype=np.uint8, count=parsed.name_bytes,
+                             offset=offsets.nbytes + ages.nbytes)
+        names = decode_names(data, offsets)
+        # 釋放對共享記憶體的參照，否則無法 close
+        del offsets, data
+    finally:
+        shm.close()
+        shm.unlink()
+    return UserColumns(names=names, ages=ages, is_new=is_new)
+
 class CsvUserParserService(IUserDataLoader):
 
     REQUIRED_COLUMNS = set(UserField)
+    NON_INTEGER_AGE = "User age must be an integer."
+    # 平行載入種子檔時每段約含的列數
+    PARALLEL_RANGE_ROWS = 1_000_000
 
-    def init_users(self, source: str) -> None:
-        df = pd.read_csv(source)
-        missing = self.REQUIRED_COLUMNS - set(df.columns)
-        if missing:
-            raise CSVParserException(f"Missing required columns: {missing}")
+    def __init__(self, workers: int = 1):
+        """
+        Args:
+            workers: Processes used to parse files given by path; 1 parses in
+                this process. File objects are always parsed in this process.
+        """
+        self.workers = workers
 
-        return [User(**row) for _, row in df.iterrows()]
+    def init_users(self, source: str) -> List[User]:
+        columns = self.init_user_columns(source)
+        # 欄位已通過與 User 相同的驗證，以 model_construct 建立模型，不再逐列驗證
+        return [User.model_construct(Name=name, Age=age)
+                for name, age in zip(columns.names, columns.ages.tolist())]
+
+    def init_user_columns(self, source: str) -> UserColumns:
+        if self.workers > 1:
+            chunks = list(self._iter_parallel(str(source), self.PARALLEL_RANGE_ROWS, is_new=False, report=None))
+            return UserColumns(names=[name for chunk in chunks for name in chunk.names],
+                               ages=np.concatenate([chunk.ages for chunk in chunks] or [np.empty(0, np.int64)]))
+        return self._validated_columns(self._read_csv(source), is_new=False)
+
+    def iter_user_columns(self, source: Union[str, BinaryIO], chunk_size: int,
+                          report: Optional[UserImportReport] = None) -> Iterator[UserColumns]:
+        if self.workers > 1 and isinstance(source, (str, os.PathLike)):
+            return self._iter_parallel(str(source), chunk_size, is_new=True, report=report)
+        return self._iter_chunks(source, chunk_size, is_new=True, report=report)
 
     def load_users(self, source: str) -> List[NewUser]:
-        df = pd.read_csv(source)
-        missing = self.REQUIRED_COLUMNS - set(df.columns)
+        columns = self._validated_columns(self._read_csv(source), is_new=True)
+        return [NewUser.model_construct(Name=name, Age=age)
+                for name, age in zip(columns.names, columns.ages.tolist())]
+
+    def _check_columns(self, frame: pd.DataFrame) -> None:
+        missing = self.REQUIRED_COLUMNS - set(frame.columns)
         if missing:
             raise CSVParserException(f"Missing required columns: {missing}")
 
-        return [NewUser(**row) for _, row in df.iterrows()]
+    def _iter_chunks(self, source: Union[str, BinaryIO], chunk_size: int, is_new: bool,
+                     report: Optional[UserImportReport]) -> Iterator[UserColumns]:
+        # 以 chunksize 逐塊讀取，記憶體用量只與 chunk 大小有關
+        with self._read_csv(source, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                self._check_columns(chunk)
+                columns = self._validated_columns(chunk, is_new=is_new, report=report)
+                if len(columns):
+                    yield columns
+
+    def _iter_parallel(self, path: str, chunk_size: int, is_new: bool,
+                       report: Optional[UserImportReport]) -> Iterator[UserColumns]:
+        """Parse newline-aligned byte ranges in a process pool, yielding them in file order.
+
+        At most two ranges per worker are in flight, so memory stays bounded
+        however large the file is.
+        """
+        header, ranges = _split_byte_ranges(path, chunk_size)
+        if len(ranges) < 2:
+            # 只有一段時不值得啟動 process pool
+            yield from self._iter_chunks(path, chunk_size, is_new, report)
+            return
+        self._check_columns(pd.read_csv(io.BytesIO(header), nrows=0))
+        limit = report.rejection_limit if report is not None else 1
+        # 先啟動 resource tracker，讓 worker 與本行程共用，共享記憶體由本行程 unlink 後即解除登記
+        resource_tracker.ensure_running()
+        pending: deque[Future] = deque()
+        rows_before = 0
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+            try:
+                remaining = iter(ranges)
+                for start, end in remaining:
+                    pending.append(pool.submit(_parse_byte_range, path, header, start, end, is_new, limit))
+                    if len(pending) >= 2 * self.workers:
+                        break
+                while pending:
+                    parsed = pending.popleft().result()
+                    following = next(remaining, None)
+                    if following is not None:
+                        pending.append(pool.submit(_parse_byte_range, path, header, *following, is_new, limit))
+                    columns = _take_columns(parsed, is_new)
+                    if parsed.rejected_count:
+                        # worker 的列號從該段開頭算起，加上前面各段的列數換成整個檔案的列號
+                        rows = [row.row + rows_before for row in parsed.rejected]
+                        reasons = [row.reason for row in parsed.rejected]
+                        if report is None:
+                            raise CSVParserException(f"Row {rows[0]}: {reasons[0]}")
+                        report.add_rejected(rows, reasons)
+                        report.rejected_count += parsed.rejected_count - len(rows)
+                    rows_before += parsed.rows
+                    if len(columns):
+                        yield columns
+            finally:
+                # 中途停止（例外或呼叫端不再讀取）時，釋放已解析但尚未讀取的共享記憶體
+                for future in pending:
+                    if not future.cancel() and future.exception() is None:
+                        shm = SharedMemory(future.result().shm_name)
+                        shm.close()
+                        shm.unlink()
+
+    def _read_csv(self, source: Union[str, BinaryIO], **kwargs):
+        # 只讀需要的欄位；Name 一律當字串，且不把 "NA"、"null" 等名稱當成缺值
+        try:
+            frame = pd.read_csv(source, dtype={UserField.NAME.value: str}, keep_default_na=False,
+                                usecols=lambda column: column in self.REQUIRED_COLUMNS, **kwargs)
+        except pd.errors.EmptyDataError:
+            raise CSVParserException("CSV file is empty")
+        if isinstance(frame, pd.DataFrame):
+            self._check_columns(frame)
+        return frame
+
+    def _validated_columns(self, frame: pd.DataFrame, is_new: bool,
+                           report: Optional[UserImportReport] = None) -> UserColumns:
+        """Validate whole columns with the rules of User.validate_name / validate_age.
+
+        Without a report the first invalid row raises; with one, invalid rows
+        are recorded there and only the valid rows are returned.
+        """
+        names = frame[UserField.NAME.value]
+        ages = pd.to_numeric(frame[UserField.AGE.value], errors='coerce')
+        empty_name = names.isna().to_numpy() | (names.str.len() == 0).to_numpy()
+        non_integer = (ages.isna() | (ages % 1 != 0) | (ages.abs() >= 2 ** 63)).to_numpy()
+        negative = (ages < 0).to_numpy()
+        invalid = empty_name | non_integer | negative
+        if invalid.any():
+            # 每列只回報第一個不通過的規則，順序與 User 欄位驗證相同
+            reasons = np.select([empty_name, non_integer],
+                                [EmptyUserNameError.detail, self.NON_INTEGER_AGE],
+                                NegativeUserAgeError.detail)[invalid]
+            # chunk 的 index 延續前面的 chunk，+1 即為資料列的列號（不含標題列）
+            rows = frame.index.to_numpy()[invalid] + 1
+            if report is None:
+                raise CSVParserException(f"Row {rows[0]}: {reasons[0]}")
+            report.add_rejected(rows.tolist(), reasons.tolist())
+            names, ages = names[~invalid], ages[~invalid]
+        return UserColumns(names=names.tolist(), ages=ages.to_numpy(dtype=np.int64), is_new=is_new)
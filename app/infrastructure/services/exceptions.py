@@ -6,3 +6,11 @@ class CSVParserException(AppBaseException):
 
     def __init__(self, message: str):
         self.detail = f"{message}"
+
+
+class ImportJobNotFoundError(AppBaseException):
+    status_code: int = 404
+    exception_type: str = "ImportJobNotFoundError"
+
+    def __init__(self, message: str):
+        self.detail = f"{message}"
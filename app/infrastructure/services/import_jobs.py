@@ -0,0 +1,200 @@
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional
+from app.core.exceptions import AppBaseException
+from app.domain.user import UserDedupStrategy, UserImportMode, UserImportReport
+from .exceptions import ImportJobNotFoundError
+
+ImportProgress = Callable[[int, UserImportReport], None]
+# (path, chunk_size, mode, rejection_limit, progress, strategy) -> report，例如 UserUseCase.import_users_from_csv
+ImportRunner = Callable[[str, int, UserImportMode, int, ImportProgress, UserDedupStrategy],
+                        UserImportReport]
+
+class ImportJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class _Cancelled(Exception):
+    """Raised from the progress callback to stop a cancelled job between chunks."""
+
+@dataclass
+class ImportJob:
+    """State of one background import; updated by its worker thread, read by pollers."""
+    id: str
+    mode: UserImportMode
+    path: Path
+    estimated_rows: int
+    strategy: UserDedupStrategy = UserDedupStrategy.APPEND
+    status: ImportJobStatus = ImportJobStatus.QUEUED
+    rows_processed: int = 0
+    report: Optional[UserImportReport] = None
+    error: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancel_requested: threading.Event = field(default_factory=threading.Event)
+    future: Optional[Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ImportJobStatus.SUCCEEDED, ImportJobStatus.FAILED, ImportJobStatus.CANCELLED)
+
+    def to_dict(self) -> dict:
+        # strict 模式會讀兩次檔案（先驗證再寫入），總工作量以兩倍列數估算
+        passes = 2 if self.mode == UserImportMode.STRICT else 1
+        total = max(self.estimated_rows * passes, self.rows_processed, 1)
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        rate = self.rows_processed / elapsed if elapsed else None
+        eta = None
+        if self.status == ImportJobStatus.RUNNING and rate:
+            eta = round((total - self.rows_processed) / rate, 1)
+        report = self.report or UserImportReport()
+        return {
+            "id": self.id,
+            "status": self.status.value,
+            "mode": self.mode.value,
+            "on_duplicate": self.strategy.value,
+            "rows_processed": self.rows_processed,
+            "rows_imported": report.imported,
+            "rows_inserted": report.inserted,
+            "rows_skipped": report.skipped,
+            "rows_updated": report.updated,
+            "rows_rejected": report.rejected_count,
+            "rejected": [asdict(row) for row in report.rejected],
+            "progress": 1.0 if self.status == ImportJobStatus.SUCCEEDED else round(self.rows_processed / total, 4),
+            "elapsed_seconds": round(elapsed, 2) if elapsed is not None else None,
+            "rows_per_second": round(rate) if rate is not None else None,
+            "eta_seconds": eta,
+            "error": self.error,
+        }
+
+class ImportJobManager:
+    """Runs CSV imports in the background with a bounded number of workers.
+
+    An upload is copied to upload_dir and queued; at most max_concurrent
+    jobs run at a time and the rest wait in the executor's queue, so bulk
+    imports cannot take every thread away from interactive requests.
+    Cancellation is checked after every chunk: a cancelled strict job
+    writes nothing if it is still validating, otherwise the chunks
+    appended before the cancel stay imported. Only the latest max_retained
+    finished jobs are kept for polling.
+
+    The import itself is the ImportRunner the caller submits, so this
+    service does not depend on the use case layer. A runner error that
+    carries the import's report as a `report` attribute (a strict import
+    rejecting invalid rows) keeps that report on the failed job.
+    """
+
+    def __init__(self, upload_dir: Path, max_concurrent: int, chunk_size: int,
+                 rejection_limit: int, max_retained: int = 100):
+        self.upload_dir = Path(upload_dir)
+        self.max_concurrent = max_concurrent
+        self.chunk_size = chunk_size
+        self.rejection_limit = rejection_limit
+        self.max_retained = max_retained
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def cancel(self, job_id: str) -> ImportJob:
+        job = self.get(job_id)
+        job.cancel_requested.set()
+        # 尚未開始的工作直接從佇列移除；執行中的工作在下一個 chunk 結束時停止
+        if job.future is not None and job.future.cancel():
+            self._finish(job, ImportJobStatus.CANCELLED)
+        return job
+
+    def get(self, job_id: str) -> ImportJob:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise ImportJobNotFoundError(f"Import job {job_id} not found")
+        return job
+
+    def shutdown(self) -> None:
+        """Cancel queued and running jobs and wait for the workers to stop."""
+        with self._lock:
+            jobs, executor = list(self._jobs.values()), self._executor
+        for job in jobs:
+            if not job.finished:
+                self.cancel(job.id)
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def submit(self, run_import: ImportRunner, file: BinaryIO, mode: UserImportMode,
+               strategy: UserDedupStrategy = UserDedupStrategy.APPEND) -> ImportJob:
+        """Copy an upload to disk and queue its import; returns without waiting for it.
+
+        Args:
+            run_import: Imports the saved upload, e.g. UserUseCase.import_users_from_csv
+            file: The uploaded CSV
+            mode: Strict or partial import
+            strategy: How rows matching existing users are handled
+        """
+        job_id = uuid.uuid4().hex
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        path = self.upload_dir / f"{job_id}.csv"
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(file, f, 1 << 20)
+        job = ImportJob(id=job_id, mode=mode, path=path, estimated_rows=self._estimate_rows(path),
+                        strategy=strategy)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix="user-import")
+            self._jobs[job_id] = job
+            self._evict()
+            job.future = self._executor.submit(self._run, job, run_import)
+        return job
+
+    def _estimate_rows(self, path: Path) -> int:
+        # 以開頭 64 KiB 的平均列長估算總列數，用於進度與剩餘時間
+        with open(path, 'rb') as f:
+            header = f.readline()
+            sample = f.read(1 << 16)
+        if not sample:
+            return 0
+        line_bytes = len(sample) / max(sample.count(b'\n'), 1)
+        return round((path.stat().st_size - len(header)) / line_bytes)
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.max_retained, 0)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: ImportJob, status: ImportJobStatus, error: Optional[str] = None) -> None:
+        job.status, job.error = status, error
+        job.finished_at = time.monotonic()
+        job.path.unlink(missing_ok=True)
+
+    def _run(self, job: ImportJob, run_import: ImportRunner) -> None:
+        job.status, job.started_at = ImportJobStatus.RUNNING, time.monotonic()
+
+        def progress(rows: int, report: UserImportReport) -> None:
+            job.rows_processed, job.report = rows, report
+            if job.cancel_requested.is_set():
+                raise _Cancelled()
+
+        try:
+            job.report = run_import(str(job.path), self.chunk_size, job.mode,
+                                    self.rejection_limit, progress, job.strategy)
+        except _Cancelled:
+            self._finish(job, ImportJobStatus.CANCELLED)
+        except AppBaseException as exc:
+            # 整批拒絕時錯誤附帶完整報告；沒有任何合格 chunk 時 progress 不會被呼叫
+            job.report = getattr(exc, 'report', None) or job.report
+            self._finish(job, ImportJobStatus.FAILED, exc.detail)
+        except Exception as exc:
+            self._finish(job, ImportJobStatus.FAILED, str(exc))
+        else:
+            self._finish(job, ImportJobStatus.SUCCEEDED)
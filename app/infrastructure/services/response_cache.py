@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+class ResponseCache:
+    """Byte-bounded LRU cache of encoded response bodies.
+
+    Each key holds a single body together with the data version it was
+    rendered from; a lookup with any other version is a miss, so a write
+    never needs to invalidate anything and a stale body is replaced the next
+    time its key is rendered.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, version: str, body: bytes) -> None:
+        # 超過上限的回應不快取，避免一次清空整個快取
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'response_cache_entries': len(self._entries),
+            'response_cache_bytes': self._bytes,
+            'response_cache_hits': self.hits,
+            'response_cache_misses': self.misses,
+            'response_cache_evictions': self.evictions,
+        }
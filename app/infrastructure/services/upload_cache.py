@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Union
+import numpy as np
+from app.domain.user import UserColumns, UserImportReport
+from app.infrastructure.persistence.columnar import decode_names, encode_names
+
+class UploadCache:
+    """Size-bounded, content-addressed disk cache of parsed CSV uploads.
+
+    An entry is keyed by the SHA-256 of the uploaded bytes and holds the
+    validated column blocks together with the rows the parse rejected, so
+    a repeat upload replays the blocks without parsing or validating the
+    CSV again. Entries are written to a temporary directory and renamed
+    into place once the whole upload has been parsed, so an interrupted
+    import never leaves a partial entry behind. When the entries exceed
+    max_bytes the least recently used ones are removed; entries being
+    replayed are never removed underneath their reader.
+    """
+
+    META_FILE = 'meta.json'
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._readers: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def digest(self, source: Union[str, BinaryIO]) -> Optional[str]:
+        """Hash a path or seekable file object, leaving a file object where it was.
+
+        Returns:
+            The hex SHA-256 of the content, or None if the source cannot be
+            read twice and therefore cannot be cached
+        """
+        if isinstance(source, (str, Path)):
+            with open(source, 'rb') as f:
+                return self._hash(f)
+        if not source.seekable():
+            return None
+        position = source.tell()
+        try:
+            return self._hash(source)
+        finally:
+            source.seek(position)
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'upload_cache_entries': len(self._entries),
+                'upload_cache_bytes': self._bytes,
+                'upload_cache_hits': self.hits,
+                'upload_cache_misses': self.misses,
+                'upload_cache_hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'upload_cache_evictions': self.evictions,
+            }
+
+    def record(self, key: str, chunks: Iterator[UserColumns],
+               report: UserImportReport) -> Iterator[UserColumns]:
+        """Pass parsed chunks through while storing them under key.
+
+        The entry is published only if chunks is exhausted; it is dropped
+        if the caller stops early, the parse raises, or the blocks outgrow
+        max_bytes.
+
+        Args:
+            key: Content hash of the upload, see digest
+            chunks: Validated chunks from the wrapped loader
+            report: Report the wrapped loader records rejected rows in
+        """
+        tmp = self.cache_dir / f'{key}.tmp-{uuid.uuid4().hex}'
+        tmp.mkdir(parents=True)
+        kept, counted = len(report.rejected), report.rejected_count
+        size, blocks, is_new = 0, 0, True
+        try:
+            for columns in chunks:
+                if size <= self.max_bytes:
+                    size += self._write_block(tmp / f'block-{blocks:06d}.npz', columns)
+                    blocks, is_new = blocks + 1, columns.is_new
+                yield columns
+            if size > self.max_bytes:
+                return
+            rejected = report.rejected[kept:]
+            meta = {
+                'blocks': blocks,
+                'is_new': is_new,
+                'rejected_rows': [row.row for row in rejected],
+                'rejected_reasons': [row.reason for row in rejected],
+                'rejected_count': report.rejected_count - counted,
+            }
+            (tmp / self.META_FILE).write_text(json.dumps(meta))
+            self._publish(key, tmp, size)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def replay(self, key: str, chunk_size: int, report: UserImportReport,
+               count_lookup: bool = True) -> Optional[Iterator[UserColumns]]:
+        """Look up a parsed upload and return its chunks, or None on a miss.
+
+        An entry whose rejection list was cut short by a lower
+        rejection_limit than the report's counts as a miss, since it cannot
+        fill the report the way a fresh parse would. The entry is pinned
+        against eviction until the returned iterator is exhausted or closed.
+        With count_lookup False the lookup is left out of the hit ratio.
+        """
+        with self._lock:
+            meta = self._read_meta(key) if key in self._entries else None
+            complete = meta is not None and len(meta['rejected_rows']) == meta['rejected_count']
+            room = report.rejection_limit - len(report.rejected)
+            if meta is None or not (complete or room <= len(meta['rejected_rows'])):
+                self.misses += count_lookup
+                return None
+            self.hits += count_lookup
+            self._entries.move_to_end(key)
+            self._readers[key] = self._readers.get(key, 0) + 1
+        # 以 meta 的 mtime 記錄最近使用時間，重啟後仍依 LRU 順序淘汰
+        os.utime(self.cache_dir / key / self.META_FILE)
+        return self._iter_blocks(key, meta, chunk_size, report)
+
+    def _evict(self) -> None:
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if self._readers.get(key):
+                continue
+            self._bytes -= self._entries.pop(key)
+            self.evictions += 1
+            shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+
+    def _iter_blocks(self, key: str, meta: dict, chunk_size: int,
+                     report: UserImportReport) -> Iterator[UserColumns]:
+        try:
+            for block in range(meta['blocks']):
+                with np.load(self.cache_dir / key / f'block-{block:06d}.npz') as arrays:
+                    names = decode_names(arrays['name_data'], arrays['name_offsets'])
+                    ages = arrays['ages']
+                # 區塊依寫入時的 chunk_size 切分，較小的 chunk_size 再切一次
+                for start in range(0, len(names), chunk_size):
+                    yield UserColumns(names=names[start:start + chunk_size],
+                                      ages=ages[start:start + chunk_size], is_new=meta['is_new'])
+            report.add_rejected(meta['rejected_rows'], meta['rejected_reasons'])
+            report.rejected_count += meta['rejected_count'] - len(meta['rejected_rows'])
+        finally:
+            with self._lock:
+                self._readers[key] -= 1
+                if not self._readers[key]:
+                    del self._readers[key]
+                self._evict()
+
+    def _load_index(self) -> None:
+        if not self.cache_dir.exists():
+            return
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            meta_path = entry / self.META_FILE
+            if '.tmp-' in entry.name or not meta_path.exists():
+                # 前一次執行中斷留下的暫存目錄
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            size = sum(path.stat().st_size for path in entry.iterdir() if path.name != self.META_FILE)
+            entries.append((meta_path.stat().st_mtime_ns, entry.name, size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def _publish(self, key: str, tmp: Path, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                # 相同內容的另一個上傳已先寫入
+                return
+            os.rename(tmp, self.cache_dir / key)
+            self._entries[key] = size
+            self._bytes += size
+            self._evict()
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads((self.cache_dir / key / self.META_FILE).read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _hash(f: BinaryIO) -> str:
+        digest = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _write_block(path: Path, columns: UserColumns) -> int:
+        name_data, name_offsets = encode_names(list(columns.names))
+        np.savez(path, name_data=name_data, name_offsets=name_offsets,
+                 ages=np.asarray(columns.ages, dtype=np.int64))
+        return path.stat().st_size
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List
-from app.domain.user import User
+from typing import BinaryIO, Iterator, List, Optional, Union
+from app.domain.user import User, UserColumns, UserImportReport
 
 class IUserDataLoader(ABC):
     @abstractmethod
@@ -8,6 +8,21 @@ class IUserDataLoader(ABC):
         """Initialize users from given source (could be a file path, URL, etc)."""
         pass
 
+    @abstractmethod
+    def init_user_columns(self, source: str) -> UserColumns:
+        """Initialize users from given source as validated columns."""
+        pass
+
+    @abstractmethod
+    def iter_user_columns(self, source: Union[str, BinaryIO], chunk_size: int,
+                          report: Optional[UserImportReport] = None) -> Iterator[UserColumns]:
+        """Parse and validate new users from a source in chunks of at most chunk_size rows.
+
+        Without a report the first invalid row raises; with one, invalid rows
+        are recorded in it and left out of the yielded chunks.
+        """
+        pass
+
     @abstractmethod
     def load_users(self, source: str) -> List[User]:
         """Load users from given source (could be a file path, URL, etc)."""
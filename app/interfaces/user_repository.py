@@ -1,8 +1,22 @@
 from abc import ABC, abstractmethod
-from typing import List
-from app.domain.user import User, NewUser
-from pandas.core.groupby.generic import DataFrameGroupBy
-import pandas as pd
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.domain.user import User, NewUser, UserAggregation, UserColumns, UserDedupStrategy
+
+@dataclass(frozen=True)
+class UserGrouping:
+    """Backend-neutral description of how users are grouped.
+
+    Attributes:
+        field: The field whose value is the group key
+        prefix_length: Group by the first N characters of the field instead of the whole value
+        bucket_size: Group numeric values into buckets of this width, keyed by the bucket's lower bound
+        casefold: Compare keys case-insensitively; groups are keyed by the case-folded value
+    """
+    field: str
+    prefix_length: Optional[int] = None
+    bucket_size: Optional[int] = None
+    casefold: bool = False
 
 class IUserRepository(ABC):
     """Interface for user data persistence operations.
@@ -20,17 +34,43 @@ class IUserRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    def add_user_columns(self, columns: UserColumns) -> None:
+        """Add an already validated column batch of users to storage.
+        
+        Args:
+            columns: The users to add, as columns
+        """
+        pass
+
     @abstractmethod
     def compute_group_average(self,
-                              groupby: DataFrameGroupBy,
-                              field: str) -> pd.Series:
-        """Compute the average of a field from a groupby object.
+                              grouping: UserGrouping,
+                              field: str) -> Dict[Any, float]:
+        """Compute the average of a field for each group.
         
         Args:
-            groupby: A pandas groupby object
+            grouping: The grouping returned by get_grouped_users_by*
             field: The field to compute the average of
         Returns:
-            The average of the field as a pandas Series
+            Mapping of group key to average, sorted by key
+        """
+        pass
+
+    @abstractmethod
+    def compute_group_stats(self,
+                            grouping: UserGrouping,
+                            field: str,
+                            aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+        """Compute several aggregations of a numeric field per group in one pass.
+        
+        Args:
+            grouping: How users are grouped
+            field: The numeric field to aggregate
+            aggregations: The aggregations to compute for every group
+        Returns:
+            Mapping of group key to {aggregation name: value}; std is the
+            sample standard deviation, None for groups of one user
         """
         pass
 
@@ -44,20 +84,36 @@ class IUserRepository(ABC):
         pass
 
     @abstractmethod
-    def delete_user(self, user: User) -> None:
+    def delete_user(self, user: User) -> int:
         """Delete an existing user from storage.
-        
+
+        The lookup and the delete happen atomically, so callers should use
+        the returned count rather than a separate has_user() check.
+
         Args:
             user: The user to delete
+        Returns:
+            Number of deleted rows, 0 if the user did not exist
         """
         pass
 
     @abstractmethod
-    def delete_user_by_name(self, name: str) -> None:
+    def delete_user_by_name(self, name: str) -> int:
         """Delete a user by name.
         
         Args:
             name: The name of the user to delete
+        Returns:
+            Number of deleted rows
+        """
+        pass
+
+    @abstractmethod
+    def export_sketches(self) -> bytes:
+        """Serialize the approximate statistics sketches so another worker can merge them.
+
+        Returns:
+            Compact binary blob readable by UserSketches.from_bytes
         """
         pass
 
@@ -70,6 +126,27 @@ class IUserRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    def get_added_user_records(self) -> List[dict]:
+        """Retrieve newly added users as JSON-ready dicts.
+        
+        Returns:
+            List of {"Name", "Age"} dicts, empty list if none exists
+        """
+        pass
+
+    @abstractmethod
+    def get_age_percentiles(self, percentiles: Sequence[float]) -> Dict[float, Optional[float]]:
+        """Get exact age percentiles through an order-maintained age index.
+
+        Args:
+            percentiles: Percentiles between 0 and 100; 50 is the median
+        Returns:
+            Mapping of percentile to age, linearly interpolated between the
+            two nearest ranks; None when there are no users
+        """
+        pass
+
     @abstractmethod
     def get_all_users(self) -> List[User]:
         """Get all users from the dataframe as User instances.
@@ -80,24 +157,149 @@ class IUserRepository(ABC):
         pass
 
     @abstractmethod
-    def get_grouped_users_by(self, field: str) -> DataFrameGroupBy:
-        """Get all users from the dataframe as NewUser instances.
+    def get_all_user_records(self) -> List[dict]:
+        """Get all users as JSON-ready dicts, skipping model construction.
+        
+        Returns:
+            List of {"is_new", "Name", "Age"} dicts
+        """
+        pass
+
+    @abstractmethod
+    def get_average_age_by_first_char(self) -> Dict[str, float]:
+        """Get the average age of users grouped by the first character of their name.
+        
+        Returns:
+            Mapping of first character to average age, sorted by character
+        """
+        pass
+
+    @abstractmethod
+    def get_data_version(self) -> str:
+        """Get an opaque token that changes whenever the stored users change.
+        
+        Returns:
+            Version token; equal tokens mean equal data, also across restarts
+        """
+        pass
+
+    @abstractmethod
+    def get_grouped_users_by(self, field: str) -> UserGrouping:
+        """Group users by the value of a field.
         
         Args:
             field: The field to group by
         Returns:
-            Grouped users as pd.api.typing.DataFrameGroupBy
+            Grouping to pass to compute_group_average
         """
         pass
 
     @abstractmethod
-    def get_grouped_users_by_first_char(self, field: str) -> DataFrameGroupBy:
-        """Get all users from the dataframe as NewUser instances.
+    def get_grouped_users_by_first_char(self, field: str) -> UserGrouping:
+        """Group users by the first character of a field.
         
         Args:
             field: The field to group by
         Returns:
-            Grouped users as pd.api.typing.DataFrameGroupBy
+            Grouping to pass to compute_group_average
+        """
+        pass
+
+    @abstractmethod
+    def get_memory_usage(self) -> Dict[str, Any]:
+        """Report how much memory the user table takes and how it is laid out.
+        
+        Returns:
+            Mapping of metric name to value, including per-column bytes
+        """
+        pass
+
+    @abstractmethod
+    def get_sketch_stats(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        """Get approximate statistics per first character of the name from mergeable sketches.
+
+        Args:
+            percentiles: Age percentiles between 0 and 100 to estimate
+        Returns:
+            {"groups": {first char: summary}, "total": summary}, where a summary has
+            count, distinct_names (HyperLogLog estimate), percentiles (t-digest
+            estimates) and histogram (exact age counts)
+        """
+        pass
+
+    @abstractmethod
+    def get_storage_stats(self) -> Dict[str, float]:
+        """Report storage health, such as dead rows and compaction counts.
+        
+        Returns:
+            Mapping of metric name to value
+        """
+        pass
+
+    @abstractmethod
+    def get_users_by_name(self, name: str) -> List[User]:
+        """Get all users with the given name through the name index.
+        
+        Args:
+            name: The name to look up
+        Returns:
+            List of matching users, empty list if none exists
+        """
+        pass
+
+    @abstractmethod
+    def get_user_ids(self, user: User) -> List[int]:
+        """Look up the storage row ids of a user through the (Name, Age) index.
+        
+        Args:
+            user: The user to look up
+        Returns:
+            Row ids holding the user, empty list if none exists
+        """
+        pass
+
+    @abstractmethod
+    def get_user_records_by_age(self, min_age: Optional[int], max_age: Optional[int],
+                                limit: int, offset: int = 0) -> Tuple[List[dict], int]:
+        """Get users whose age lies in an inclusive range, youngest first.
+
+        Args:
+            min_age: Lower bound, None for no lower bound
+            max_age: Upper bound, None for no upper bound
+            limit: Maximum number of users to return
+            offset: Number of matching users to skip
+        Returns:
+            ({"is_new", "Name", "Age"} dicts ordered by age then insertion order,
+             number of users in the range)
+        """
+        pass
+
+    @abstractmethod
+    def get_user_records_by_age_rank(self, limit: int, oldest: bool) -> List[dict]:
+        """Get the k oldest or youngest users.
+
+        Args:
+            limit: Number of users to return
+            oldest: True for the oldest users, False for the youngest
+        Returns:
+            {"is_new", "Name", "Age"} dicts ordered from the most extreme age;
+            users of equal age in insertion order
+        """
+        pass
+
+    @abstractmethod
+    def get_user_records_page(self, after: Optional[int],
+                              limit: int) -> Tuple[List[dict], Optional[int]]:
+        """Get one page of users in row id order.
+
+        Row ids never change or get reused, so a cursor stays valid while
+        users are inserted or deleted between pages.
+
+        Args:
+            after: Cursor returned with the previous page, None for the first page
+            limit: Maximum number of users in the page
+        Returns:
+            ({"is_new", "Name", "Age"} dicts, cursor of the next page or None if this is the last)
         """
         pass
 
@@ -111,3 +313,38 @@ class IUserRepository(ABC):
             True if the user exists, False otherwise
         """
         pass
+
+    @abstractmethod
+    def merge_user_columns(self, columns: UserColumns, strategy: UserDedupStrategy) -> Dict[str, int]:
+        """Add a validated column batch, resolving duplicates against stored users.
+
+        The batch is hash-joined against the stored users with the same
+        names, so the work is linear in the batch size plus the matching
+        rows, not in the table size.
+
+        Args:
+            columns: The users to add, as columns
+            strategy: append adds every row; skip_duplicates leaves out rows
+                whose (Name, Age) is already stored or earlier in the batch;
+                upsert keys on Name, replacing all stored rows of a name with
+                the batch's last row for it (a name whose only row already has
+                that age counts as skipped)
+        Returns:
+            {"inserted", "skipped", "updated"} row counts; rows superseded
+            within the batch count as skipped, so the three add up to the
+            batch size
+        """
+        pass
+
+    @abstractmethod
+    def search_user_records(self, prefix: str, limit: int, offset: int = 0) -> List[dict]:
+        """Find users whose name starts with a prefix through a sorted name index.
+
+        Args:
+            prefix: Name prefix to match (case-sensitive)
+            limit: Maximum number of users to return
+            offset: Number of matching users to skip
+        Returns:
+            {"is_new", "Name", "Age"} dicts ordered by name, then by insertion order
+        """
+        pass
@@ -1,15 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from app.core.exceptions import AppBaseException
-from app.di.container import container
+from app.core.settings import settings
+from app.di.container import container, user_use_case_ready, warm_up_user_use_case
 from dotenv import load_dotenv
 from app.api.v1 import user_router, voice_router
 
 # 載入環境變數
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 在接受請求前（或於背景）載入使用者資料，第一個請求不必負擔載入成本
+    await run_in_threadpool(warm_up_user_use_case, settings.warmup_mode)
+    yield
+    # 關閉前取消尚未完成的背景匯入，避免結束時等待整個檔案匯入完畢
+    await run_in_threadpool(container.import_jobs().shutdown)
+
 # 創建 FastAPI 應用
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # 將容器注入到 FastAPI 應用
 app.container = container
@@ -22,6 +33,13 @@ app.include_router(voice_router.router)
 async def root():
     return {"message": "Welcome to Pegatron Practice API"}
 
+@app.get("/ready")
+async def ready():
+    # 供負載平衡器判斷 worker 是否已完成資料載入
+    if not user_use_case_ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    return {"status": "ready"}
+
 @app.exception_handler(AppBaseException)
 async def app_exception_handler(request: Request, exc: AppBaseException):
     return JSONResponse(
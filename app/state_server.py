@@ -0,0 +1,28 @@
+"""State server for running the API with several uvicorn workers.
+
+    python -m app.state_server &
+    USER_REPOSITORY_BACKEND=shared uvicorn app.main:app --workers 4
+
+The server owns the only writable copy of the user table; workers connect
+over settings.shared_state_socket and keep read replicas of it.
+"""
+from app.core.settings import settings
+from app.di.container import container, load_initial_users
+from app.infrastructure.repositories.user_state_service import (
+    UserStateService, create_authkey, serve_user_state)
+from app.use_cases.user.user_use_case import UserUseCase
+
+def main() -> None:
+    repo = container.csv_user_repository()
+    # 與單一 worker 的 csv 模式相同：先從持久化狀態復原，否則載入種子 CSV
+    load_initial_users(UserUseCase(repo=repo, loader=container.user_loader()), repo, "csv")
+    service = UserStateService(repo, feed_size=settings.shared_state_feed_size)
+    # 沒有設定金鑰時不使用任何固定預設值，改用（必要時產生）僅擁有者可讀的金鑰檔
+    authkey = (settings.shared_state_authkey.encode()
+               or create_authkey(settings.shared_state_authkey_path))
+    server = serve_user_state(service, settings.shared_state_socket, authkey)
+    print(f"User state server listening on {settings.shared_state_socket}", flush=True)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,27 @@
+from dataclasses import asdict
 from app.core.exceptions import AppBaseException
+from app.domain.user import UserImportReport
 
 class UserNotFoundError(AppBaseException):
     status_code: int = 404
     detail: str = "User not found."
     exception_type: str = "UserNotFoundError"
+
+class InvalidPercentileError(AppBaseException):
+    status_code: int = 422
+    detail: str = "Percentiles must be between 0 and 100."
+    exception_type: str = "InvalidPercentileError"
+
+
+class UserImportRejectedError(AppBaseException):
+    status_code: int = 422
+    detail: str = "CSV contains invalid rows; nothing was imported."
+    exception_type: str = "UserImportRejectedError"
+
+    def __init__(self, report: UserImportReport):
+        self.report = report
+
+    def to_response(self) -> dict:
+        # 除了訊息外，附上被拒絕的列號與原因
+        return {**super().to_response(), "rejected_count": self.report.rejected_count,
+                "rejected": [asdict(row) for row in self.report.rejected]}
@@ -1,8 +1,9 @@
-from app.interfaces.user_repository import IUserRepository
+from app.interfaces.user_repository import IUserRepository, UserGrouping
 from app.interfaces.user_data_loader import IUserDataLoader
-from app.domain.user import User, NewUser, UserField
-from typing import Optional, List
-from .exceptions import UserNotFoundError
+from app.domain.user import (User, NewUser, UserAggregation, UserColumns, UserDedupStrategy, UserImportMode,
+                             UserImportReport)
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from .exceptions import InvalidPercentileError, UserImportRejectedError, UserNotFoundError
 
 class UserUseCase:
     """User management business logic.
@@ -29,14 +30,21 @@ class UserUseCase:
         """
         self.repo.add_multiple_users(users)
 
-    def calc_average_age_grouped_by_first_char_of_name(self) -> Optional[float]:
-        """Calculate the average age of users grouped by name.
+    def add_user_columns(self, columns: UserColumns) -> None:
+        """Add an already validated column batch of users to the repository.
+        
+        Args:
+            columns: The users to add, as columns
+        """
+        self.repo.add_user_columns(columns)
+
+    def calc_average_age_grouped_by_first_char_of_name(self) -> Dict[str, float]:
+        """Calculate the average age of users grouped by the first character of name.
         
         Returns:
-            Average age as float, None if no users exist
+            Mapping of first character to average age, empty if no users exist
         """
-        group = self.repo.get_grouped_users_by_first_char(UserField.NAME.value)
-        return self.repo.compute_group_average(group, UserField.AGE.value)
+        return self.repo.get_average_age_by_first_char()
 
     def create_user(self, user: NewUser) -> None:
         """Create a new user in the system.
@@ -52,9 +60,8 @@ class UserUseCase:
         Args:
             user: The user to delete
         """
-        if not self.repo.has_user(user):
+        if not self.repo.delete_user(user):
             raise UserNotFoundError()
-        self.repo.delete_user(user)
 
     def delete_user_by_name(self, name: str) -> None:
         """Delete a user by name.
@@ -64,6 +71,14 @@ class UserUseCase:
         """
         self.repo.delete_user_by_name(name)
     
+    def export_sketches(self) -> bytes:
+        """Serialize the statistics sketches for merging on another worker.
+        
+        Returns:
+            Compact binary blob
+        """
+        return self.repo.export_sketches()
+
     def get_added_user(self) -> List[NewUser]:
         """Get all newly added users.
         
@@ -72,6 +87,14 @@ class UserUseCase:
         """
         return self.repo.get_added_user()
     
+    def get_added_user_records(self) -> List[dict]:
+        """Get all newly added users as JSON-ready dicts.
+        
+        Returns:
+            List of {"Name", "Age"} dicts, empty list if none exists
+        """
+        return self.repo.get_added_user_records()
+
     def get_all_users(self) -> List[User]:
         """Get all users.
         
@@ -79,7 +102,196 @@ class UserUseCase:
             List of all users
         """
         return self.repo.get_all_users()
+
+    def get_all_user_records(self) -> List[dict]:
+        """Get all users as JSON-ready dicts.
+        
+        Returns:
+            List of {"is_new", "Name", "Age"} dicts
+        """
+        return self.repo.get_all_user_records()
     
+    def get_users_by_age(self, min_age: Optional[int], max_age: Optional[int],
+                         limit: int, offset: int = 0) -> Tuple[List[dict], int]:
+        """Get users in an inclusive age range, youngest first.
+        
+        Args:
+            min_age: Lower bound, None for no lower bound
+            max_age: Upper bound, None for no upper bound
+            limit: Maximum number of users to return
+            offset: Number of matching users to skip
+        Returns:
+            (List of {"is_new", "Name", "Age"} dicts, number of users in the range)
+        """
+        return self.repo.get_user_records_by_age(min_age, max_age, limit, offset)
+
+    def get_users_by_age_rank(self, limit: int, oldest: bool) -> List[dict]:
+        """Get the k oldest or youngest users.
+        
+        Args:
+            limit: Number of users to return
+            oldest: True for the oldest users, False for the youngest
+        Returns:
+            List of {"is_new", "Name", "Age"} dicts, most extreme age first
+        """
+        return self.repo.get_user_records_by_age_rank(limit, oldest)
+
+    def get_user_records_page(self, cursor: Optional[int],
+                              limit: int) -> Tuple[List[dict], Optional[int]]:
+        """Get one page of users as JSON-ready dicts.
+        
+        Args:
+            cursor: Cursor returned with the previous page, None for the first page
+            limit: Maximum number of users in the page
+        Returns:
+            (List of {"is_new", "Name", "Age"} dicts, cursor of the next page or None)
+        """
+        return self.repo.get_user_records_page(cursor, limit)
+
+    def iter_user_record_chunks(self, chunk_size: int,
+                                cursor: Optional[int] = None) -> Iterator[List[dict]]:
+        """Iterate over all users page by page, holding one chunk in memory at a time.
+        
+        Args:
+            chunk_size: Number of users per chunk
+            cursor: Cursor to resume from, None to start at the first user
+        Returns:
+            Iterator of lists of {"is_new", "Name", "Age"} dicts
+        """
+        while True:
+            records, cursor = self.repo.get_user_records_page(cursor, chunk_size)
+            if records:
+                yield records
+            if cursor is None:
+                return
+
+    def get_age_percentiles(self, percentiles: Sequence[float]) -> Dict[float, Optional[float]]:
+        """Get exact age percentiles without sorting the whole table.
+        
+        Args:
+            percentiles: Percentiles between 0 and 100; 50 is the median
+        Returns:
+            Mapping of percentile to age, None for every percentile when there are no users
+        Raises:
+            InvalidPercentileError: If a percentile is outside 0-100
+        """
+        self._validate_percentiles(percentiles)
+        return self.repo.get_age_percentiles(percentiles)
+
+    def get_data_version(self) -> str:
+        """Get a token that changes whenever the stored users change.
+        
+        Returns:
+            Opaque version token
+        """
+        return self.repo.get_data_version()
+
+    def get_memory_usage(self) -> Dict[str, Any]:
+        """Get the memory footprint of the user repository.
+        
+        Returns:
+            Mapping of metric name to value
+        """
+        return self.repo.get_memory_usage()
+
+    def get_sketch_stats(self, percentiles: Sequence[float]) -> Dict[str, Any]:
+        """Get approximate per-group statistics from mergeable sketches.
+        
+        Args:
+            percentiles: Age percentiles between 0 and 100 to estimate
+        Returns:
+            {"groups": {first char: summary}, "total": summary}
+        Raises:
+            InvalidPercentileError: If a percentile is outside 0-100
+        """
+        self._validate_percentiles(percentiles)
+        return self.repo.get_sketch_stats(percentiles)
+
+    def get_storage_stats(self) -> Dict[str, float]:
+        """Get storage statistics of the user repository.
+        
+        Returns:
+            Mapping of metric name to value
+        """
+        return self.repo.get_storage_stats()
+
+    def get_user_stats(self,
+                       grouping: UserGrouping,
+                       field: str,
+                       aggregations: Sequence[UserAggregation]) -> Dict[Any, Dict[str, Optional[float]]]:
+        """Compute several aggregations of a field per group in a single scan.
+        
+        Args:
+            grouping: How users are grouped
+            field: The numeric field to aggregate
+            aggregations: The aggregations to compute for every group
+        Returns:
+            Mapping of group key to {aggregation name: value}
+        """
+        return self.repo.compute_group_stats(grouping, field, aggregations)
+
+    def get_users_by_name(self, name: str) -> List[User]:
+        """Get all users with the given name.
+        
+        Args:
+            name: The name to look up
+        Returns:
+            List of matching users, empty list if none exists
+        """
+        return self.repo.get_users_by_name(name)
+    
+    def import_users_from_csv(self, source: Union[str, BinaryIO], chunk_size: int,
+                              mode: UserImportMode = UserImportMode.STRICT,
+                              rejection_limit: int = 1000,
+                              progress: Optional[Callable[[int, UserImportReport], None]] = None,
+                              strategy: UserDedupStrategy = UserDedupStrategy.APPEND) -> UserImportReport:
+        """Stream new users from a CSV source into the repository chunk by chunk.
+        
+        Each validated chunk is appended before the next one is parsed, so
+        memory use depends on chunk_size rather than on the file size. In
+        strict mode the whole source is validated first and any invalid row
+        rejects the import before anything is written; the source is then
+        read a second time, so a file object must be seekable. In partial
+        mode invalid rows are skipped and reported. Duplicates of stored
+        users are resolved per chunk by the repository, so a user repeated
+        in a later chunk is matched against the earlier chunks too.
+        
+        Args:
+            source: Path or binary file object of the CSV data
+            chunk_size: Maximum number of rows parsed and appended at a time
+            mode: Whether invalid rows reject the whole import or are skipped
+            rejection_limit: Maximum number of rejected rows listed in the report
+            progress: Called after every chunk with the rows processed so far
+                (counting both passes in strict mode) and the report so far; an
+                exception it raises stops the import, leaving the chunks
+                already appended
+            strategy: How rows that duplicate stored users are handled
+        Returns:
+            Inserted, skipped and updated counts and the rejected rows with their reasons
+        Raises:
+            UserImportRejectedError: If mode is strict and any row is invalid
+        """
+        report = UserImportReport(rejection_limit=rejection_limit)
+        validated = 0
+        if mode == UserImportMode.STRICT:
+            for columns in self.loader.iter_user_columns(source, chunk_size, report):
+                validated += len(columns)
+                if progress is not None:
+                    progress(validated + report.rejected_count, report)
+            if report.rejected_count:
+                raise UserImportRejectedError(report)
+            if not isinstance(source, str):
+                source.seek(0)
+        for columns in self.loader.iter_user_columns(source, chunk_size, report):
+            if strategy == UserDedupStrategy.APPEND:
+                self.repo.add_user_columns(columns)
+                report.add_merged({'inserted': len(columns), 'skipped': 0, 'updated': 0})
+            else:
+                report.add_merged(self.repo.merge_user_columns(columns, strategy))
+            if progress is not None:
+                progress(validated + report.imported + report.skipped + report.rejected_count, report)
+        return report
+
     def init_users(self, source: str) -> List[User]:
         """Initialize users in the repository.
         
@@ -88,6 +300,14 @@ class UserUseCase:
         """
         return self.loader.init_users(source)
     
+    def init_user_columns(self, source: str) -> UserColumns:
+        """Initialize users from a source as validated columns.
+        
+        Args:
+            source: Path to the source file containing user data
+        """
+        return self.loader.init_user_columns(source)
+    
     def load_users_from_csv(self, csv_path: str) -> List[User]:
         """Load users from a CSV file.
         
@@ -95,3 +315,19 @@ class UserUseCase:
             csv_path: Path to the CSV file containing user data
         """
         return self.loader.load_users(csv_path)
+
+    def search_users(self, prefix: str, limit: int, offset: int = 0) -> List[dict]:
+        """Find users whose name starts with a prefix, for autocomplete.
+        
+        Args:
+            prefix: Name prefix to match
+            limit: Maximum number of users to return
+            offset: Number of matching users to skip
+        Returns:
+            List of {"is_new", "Name", "Age"} dicts ordered by name
+        """
+        return self.repo.search_user_records(prefix, limit, offset)
+
+    def _validate_percentiles(self, percentiles: Sequence[float]) -> None:
+        if any(not 0 <= q <= 100 for q in percentiles):
+            raise InvalidPercentileError()
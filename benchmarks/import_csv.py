@@ -0,0 +1,115 @@
+"""CSV 匯入吞吐量與記憶體基準測試。
+
+產生指定大小的使用者 CSV，分別以串流分塊匯入與舊的整檔載入方式讀取，
+報告 MB/s、rows/s 與尖峰 RSS。每種方式在獨立的子行程中執行，尖峰 RSS 互不影響。
+--workers 可列出多個平行解析的行程數，觀察串流匯入隨核心數的擴展情形。
+
+    python -m benchmarks.import_csv --size-mb 2048
+    python -m benchmarks.import_csv --path users.csv --modes stream --sink repository
+    python -m benchmarks.import_csv --size-mb 1024 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+ROWS_PER_BLOCK = 1_000_000
+
+def generate_csv(path: Path, size_mb: int) -> int:
+    """寫出約 size_mb 大小的 CSV，回傳資料列數"""
+    rng = np.random.default_rng(0)
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        f.write('Name,Age\n')
+        while f.tell() < size_mb * 1024 * 1024:
+            ids = rng.integers(0, 10_000_000, ROWS_PER_BLOCK)
+            block = pd.DataFrame({'Name': np.char.add('User ', ids.astype(str)),
+                                  'Age': rng.integers(0, 100, ROWS_PER_BLOCK)})
+            block.to_csv(f, header=False, index=False)
+            rows += ROWS_PER_BLOCK
+    return rows
+
+def run(path: Path, mode: str, sink: str, chunk_size: int, workers: int) -> dict:
+    from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+    from app.infrastructure.services.csv_user_parser import CsvUserParserService
+    from app.use_cases.user.user_use_case import UserUseCase
+    from app.domain.user import NewUser
+
+    parser = CsvUserParserService(workers=workers)
+    repo = UserCSVRepository()
+    start = time.perf_counter()
+    if mode == 'stream':
+        if sink == 'repository':
+            rows = UserUseCase(repo, parser).import_users_from_csv(str(path), chunk_size).imported
+        else:
+            rows = sum(len(columns) for columns in parser.iter_user_columns(str(path), chunk_size))
+    else:
+        # 舊的上傳流程：整檔讀進 DataFrame 並逐列建立、驗證 NewUser
+        users = [NewUser(**row) for _, row in pd.read_csv(path).iterrows()]
+        rows = len(users)
+        if sink == 'repository':
+            repo.add_multiple_users(users)
+    elapsed = time.perf_counter() - start
+    size_mb = path.stat().st_size / 1024 / 1024
+    return {
+        'mode': mode,
+        'sink': sink,
+        'workers': workers,
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'mb_per_second': round(size_mb / elapsed, 1),
+        'rows_per_second': round(rows / elapsed),
+        # Linux 的 ru_maxrss 單位為 KiB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        # 平行解析時單一 worker 的尖峰 RSS
+        'worker_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', type=Path, help='既有的 CSV；未指定時產生一個暫存檔')
+    parser.add_argument('--size-mb', type=int, default=2048, help='產生的 CSV 大小')
+    parser.add_argument('--modes', nargs='+', default=['stream'], choices=['stream', 'legacy'])
+    parser.add_argument('--sink', default='discard', choices=['discard', 'repository'],
+                        help='discard 只量測解析與驗證；repository 同時寫入記憶體資料表')
+    parser.add_argument('--chunk-size', type=int, default=50_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='平行解析的行程數（僅 stream 模式）')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run(args.path, args.modes[0], args.sink, args.chunk_size, args.workers[0])))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.path
+        if path is None:
+            path = Path(tmp) / 'users.csv'
+            rows = generate_csv(path, args.size_mb)
+            print(f"generated {path.stat().st_size / 1024 / 1024:.0f} MB, {rows} rows", file=sys.stderr)
+        runs = [(mode, workers) for mode in args.modes for workers in (args.workers if mode == 'stream' else [1])]
+        baseline = None
+        for mode, workers in runs:
+            command = [sys.executable, '-m', 'benchmarks.import_csv', '--child', '--path', str(path),
+                       '--modes', mode, '--sink', args.sink, '--chunk-size', str(args.chunk_size),
+                       '--workers', str(workers)]
+            result = subprocess.run(command, capture_output=True, text=True, cwd=Path(__file__).parent.parent,
+                                    env={**os.environ, 'PYTHONPATH': str(Path(__file__).parent.parent)})
+            if result.returncode:
+                print(result.stderr.strip().splitlines()[-1])
+                continue
+            report = json.loads(result.stdout)
+            # 相對於第一個成功的執行（通常是單一行程）的加速倍數
+            baseline = baseline or report['seconds']
+            report['speedup'] = round(baseline / report['seconds'], 2)
+            print(json.dumps(report))
+
+if __name__ == '__main__':
+    main()
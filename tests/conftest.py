@@ -1,16 +1,32 @@
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.core.settings import settings
+from app.di.container import container
+from app.infrastructure.services.columnar_user_cache import CachedUserDataLoader
+from app.infrastructure.services.upload_cache import UploadCache
 import os
 import sys
 
 # 添加項目根目錄到 Python 路徑
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+@pytest.fixture(scope="session", autouse=True)
+def isolated_caches(tmp_path_factory):
+    """種子與上傳快取寫到暫存目錄，不沿用先前執行留在 data/cache 的項目"""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    upload_cache = UploadCache(cache_dir / "uploads", settings.upload_cache_max_bytes)
+    loader = CachedUserDataLoader(container.csv_parser(), cache_dir / "seed", upload_cache)
+    with container.upload_cache.override(upload_cache), container.user_loader.override(loader):
+        yield
+
 @pytest.fixture
-def client():
-    """創建測試客戶端"""
-    return TestClient(app)
+def client(tmp_path, monkeypatch):
+    """創建測試客戶端；每個測試使用自己的上傳快取，結果與先前上傳過什麼無關"""
+    upload_cache = UploadCache(tmp_path / "uploads", settings.upload_cache_max_bytes)
+    monkeypatch.setattr(container.user_loader(), "upload_cache", upload_cache)
+    with container.upload_cache.override(upload_cache):
+        yield TestClient(app)
 
 @pytest.fixture
 def test_app():
@@ -1,11 +1,15 @@
+import io
 import pytest
 import pandas as pd
 import tempfile
 import os
-from app.infrastructure.services.csv_user_parser import CsvUserParserService
+from app.infrastructure.services.csv_user_parser import CsvUserParserService, _split_byte_ranges
+from app.infrastructure.services.columnar_user_cache import CachedUserDataLoader
 from app.infrastructure.services.exceptions import CSVParserException
 from app.domain.user.models.user import User
 from app.domain.user.models.new_user import NewUser
+from app.domain.user import RejectedRow, UserImportReport
+from app.domain.user.exceptions import EmptyUserNameError, NegativeUserAgeError
 
 @pytest.fixture
 def temp_valid_csv():
@@ -57,4 +61,168 @@ def test_load_users_valid_csv(temp_valid_csv):
 def test_load_users_invalid_csv(temp_invalid_csv):
     parser = CsvUserParserService()
     with pytest.raises(CSVParserException):
-        parser.load_users(temp_invalid_csv) 
\ No newline at end of file
+        parser.load_users(temp_invalid_csv) 
+
+def test_init_user_columns(temp_valid_csv):
+    parser = CsvUserParserService()
+    columns = parser.init_user_columns(temp_valid_csv)
+    
+    assert list(columns.names) == ['Test User']
+    assert columns.ages.tolist() == [25]
+    assert columns.is_new is False
+
+def test_cached_loader_reuses_compiled_columns(temp_valid_csv, tmp_path):
+    loader = CachedUserDataLoader(CsvUserParserService(), tmp_path / "cache")
+    
+    cold = loader.init_user_columns(temp_valid_csv)
+    warm = loader.init_user_columns(temp_valid_csv)
+    
+    assert (loader.misses, loader.hits) == (1, 1)
+    assert list(warm.names) == list(cold.names)
+    assert warm.ages.tolist() == cold.ages.tolist()
+
+def test_cached_loader_checks_hash_when_mtime_changes(temp_valid_csv, tmp_path):
+    loader = CachedUserDataLoader(CsvUserParserService(), tmp_path / "cache")
+    loader.init_user_columns(temp_valid_csv)
+    
+    # 內容不變、只更新 mtime：仍使用快取
+    stat = os.stat(temp_valid_csv)
+    os.utime(temp_valid_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    loader.init_user_columns(temp_valid_csv)
+    assert (loader.misses, loader.hits) == (1, 1)
+    
+    # 內容改變：重新解析
+    pd.DataFrame({'Name': ['Changed'], 'Age': [7]}).to_csv(temp_valid_csv, index=False)
+    columns = loader.init_user_columns(temp_valid_csv)
+    assert (loader.misses, loader.hits) == (2, 1)
+    assert list(columns.names) == ['Changed']
+
+def test_iter_user_columns_matches_full_parse(tmp_path):
+    # 準備測試數據
+    path = tmp_path / "users.csv"
+    pd.DataFrame({'Name': [f'User {i}' for i in range(7)], 'Age': list(range(20, 27))}).to_csv(path, index=False)
+    parser = CsvUserParserService()
+    
+    # 執行測試
+    chunks = list(parser.iter_user_columns(str(path), chunk_size=3))
+    
+    # 驗證結果
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [name for chunk in chunks for name in chunk.names] == [user.Name for user in parser.load_users(str(path))]
+    assert [age for chunk in chunks for age in chunk.ages.tolist()] == list(range(20, 27))
+    assert all(chunk.is_new for chunk in chunks)
+
+def test_iter_user_columns_from_binary_file():
+    # 準備測試數據
+    source = io.BytesIO("Name,Age,Extra\nAlice,30,x\nBob,41.0,y\n".encode())
+    
+    # 執行測試
+    chunks = list(CsvUserParserService().iter_user_columns(source, chunk_size=10))
+    
+    # 驗證結果
+    assert list(chunks[0].names) == ['Alice', 'Bob']
+    assert chunks[0].ages.tolist() == [30, 41]
+
+@pytest.mark.parametrize("content, message", [
+    ("Name,Age\nA,1\nB,2\nC,-3\n", "Row 3: User age cannot be negative."),
+    ("Name,Age\nA,1\n,2\n", "Row 2: User name cannot be empty."),
+    ("Name,Age\nA,1\nB,2\nC,3\nD,old\n", "Row 4: User age must be an integer."),
+    ("Name,Age\nA,1.5\n", "Row 1: User age must be an integer."),
+    ("name,age\nA,1\n", "Missing required columns"),
+    ("", "CSV file is empty"),
+])
+def test_iter_user_columns_rejects_invalid_rows(content, message):
+    # 準備測試數據
+    source = io.BytesIO(content.encode())
+    
+    # 執行測試
+    with pytest.raises(CSVParserException) as exc_info:
+        list(CsvUserParserService().iter_user_columns(source, chunk_size=2))
+    
+    # 驗證結果
+    assert message in exc_info.value.detail
+
+def test_iter_user_columns_reports_rejected_rows():
+    # 準備測試數據
+    source = io.BytesIO("Name,Age\nA,1\n,2\nNA,3\nD,-4\nE,x\nF,6\n".encode())
+    report = UserImportReport(rejection_limit=2)
+    
+    # 執行測試
+    chunks = list(CsvUserParserService().iter_user_columns(source, chunk_size=2, report=report))
+    
+    # 驗證結果：每列的原因與 User 模型驗證相同，報告只保留前 rejection_limit 筆
+    assert [name for chunk in chunks for name in chunk.names] == ['A', 'NA', 'F']
+    assert [age for chunk in chunks for age in chunk.ages.tolist()] == [1, 3, 6]
+    assert report.rejected_count == 3
+    assert report.rejected == [RejectedRow(2, EmptyUserNameError.detail),
+                               RejectedRow(4, NegativeUserAgeError.detail)]
+
+def test_load_users_matches_model_validation(tmp_path):
+    # 準備測試數據
+    path = tmp_path / "users.csv"
+    path.write_text("Name,Age\n123,7\nNull,30\n")
+    
+    # 執行測試
+    users = CsvUserParserService().load_users(str(path))
+    
+    # 驗證結果：與逐列建立 NewUser 的結果相同
+    assert users == [NewUser(Name="123", Age=7), NewUser(Name="Null", Age=30)]
+    assert all(isinstance(user, NewUser) for user in users)
+
+def test_init_users_rejects_invalid_row(tmp_path):
+    # 準備測試數據
+    path = tmp_path / "users.csv"
+    path.write_text("Name,Age\nA,1\nB,-2\n")
+    
+    # 執行測試
+    with pytest.raises(CSVParserException) as exc_info:
+        CsvUserParserService().init_users(str(path))
+    
+    # 驗證結果
+    assert exc_info.value.detail == "Row 2: User age cannot be negative."
+
+@pytest.fixture
+def large_csv(tmp_path):
+    path = tmp_path / "large.csv"
+    ages = [i % 90 for i in range(30000)]
+    ages[7], ages[20000] = -1, -2
+    pd.DataFrame({'Name': [f'User {i}' for i in range(30000)], 'Age': ages}).to_csv(path, index=False)
+    return str(path)
+
+def test_split_byte_ranges_align_to_lines(large_csv):
+    # 執行測試
+    header, ranges = _split_byte_ranges(large_csv, 1000)
+    
+    # 驗證結果：各段首尾相接，且每段都從一列的開頭開始
+    data = open(large_csv, 'rb').read()
+    assert header == b'Name,Age\n'
+    assert len(ranges) > 2
+    assert ranges[0][0] == len(header) and ranges[-1][1] == len(data)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(data[start - 1:start] == b'\n' for start, _ in ranges)
+
+def test_parallel_parse_matches_serial(large_csv):
+    # 準備測試數據
+    serial_report, parallel_report = UserImportReport(), UserImportReport()
+    
+    # 執行測試
+    serial = list(CsvUserParserService().iter_user_columns(large_csv, 4000, serial_report))
+    parallel = list(CsvUserParserService(workers=2).iter_user_columns(large_csv, 4000, parallel_report))
+    
+    # 驗證結果：依檔案順序回傳，列號換算成整個檔案的列號
+    assert len(parallel) > 2
+    assert [name for chunk in parallel for name in chunk.names] == [name for chunk in serial for name in chunk.names]
+    assert [age for chunk in parallel for age in chunk.ages.tolist()] == [age for chunk in serial for age in chunk.ages.tolist()]
+    assert parallel_report == serial_report
+    assert [row.row for row in parallel_report.rejected] == [8, 20001]
+
+def test_parallel_init_user_columns_rejects_invalid_row(large_csv, monkeypatch):
+    # 準備測試數據
+    monkeypatch.setattr(CsvUserParserService, "PARALLEL_RANGE_ROWS", 4000)
+    
+    # 執行測試
+    with pytest.raises(CSVParserException) as exc_info:
+        CsvUserParserService(workers=2).init_user_columns(large_csv)
+    
+    # 驗證結果
+    assert exc_info.value.detail == "Row 8: User age cannot be negative."
@@ -0,0 +1,122 @@
+import io
+import threading
+import time
+import pytest
+from app.domain.user import UserImportMode, UserImportReport
+from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.infrastructure.services.csv_user_parser import CsvUserParserService
+from app.infrastructure.services.exceptions import ImportJobNotFoundError
+from app.infrastructure.services.import_jobs import ImportJobManager, ImportJobStatus
+from app.use_cases.user.user_use_case import UserUseCase
+
+class BlockingUseCase:
+    """匯入時持續回報進度，直到工作被取消"""
+
+    def __init__(self):
+        self.started = threading.Event()
+
+    def import_users_from_csv(self, source, chunk_size, mode, rejection_limit, progress, strategy):
+        self.started.set()
+        rows = 0
+        while True:
+            rows += chunk_size
+            progress(rows, UserImportReport(imported=rows))
+            time.sleep(0.01)
+
+@pytest.fixture
+def jobs(tmp_path):
+    manager = ImportJobManager(tmp_path / "upload", max_concurrent=1, chunk_size=2, rejection_limit=10)
+    yield manager
+    manager.shutdown()
+
+def test_import_job_runs_in_background(jobs):
+    # 準備測試數據
+    repo = UserCSVRepository()
+    use_case = UserUseCase(repo, CsvUserParserService())
+    upload = io.BytesIO(b"Name,Age\nJob A,20\nJob B,30\nJob C,40\n")
+    
+    # 執行測試
+    job = jobs.submit(use_case.import_users_from_csv, upload, UserImportMode.STRICT)
+    job.future.result(timeout=10)
+    status = jobs.get(job.id).to_dict()
+    
+    # 驗證結果
+    assert status["status"] == "succeeded"
+    assert (status["rows_imported"], status["rows_rejected"], status["progress"]) == (3, 0, 1.0)
+    assert status["rows_processed"] == 6
+    assert len(repo.get_users_by_name("Job B")) == 1
+    assert not job.path.exists()
+
+def test_import_job_reports_rejected_rows(jobs):
+    # 準備測試數據
+    use_case = UserUseCase(UserCSVRepository(), CsvUserParserService())
+    upload = io.BytesIO(b"Name,Age\nJob A,20\nJob B,-1\n")
+    
+    # 執行測試
+    strict = jobs.submit(use_case.import_users_from_csv, upload, UserImportMode.STRICT)
+    strict.future.result(timeout=10)
+    upload.seek(0)
+    partial = jobs.submit(use_case.import_users_from_csv, upload, UserImportMode.PARTIAL)
+    partial.future.result(timeout=10)
+    
+    # 驗證結果
+    assert strict.to_dict()["status"] == "failed"
+    assert strict.to_dict()["rejected"] == [{"row": 2, "reason": "User age cannot be negative."}]
+    assert partial.to_dict()["status"] == "succeeded"
+    assert (partial.to_dict()["rows_imported"], partial.to_dict()["rows_rejected"]) == (1, 1)
+
+def test_import_job_keeps_report_when_every_row_is_rejected(jobs):
+    # 準備測試數據：沒有任何合格的列
+    use_case = UserUseCase(UserCSVRepository(), CsvUserParserService())
+    upload = io.BytesIO(b"Name,Age\nJob A,-1\nJob B,abc\n")
+    
+    # 執行測試
+    job = jobs.submit(use_case.import_users_from_csv, upload, UserImportMode.STRICT)
+    job.future.result(timeout=10)
+    status = job.to_dict()
+    
+    # 驗證結果
+    assert status["status"] == "failed"
+    assert status["error"] == "CSV contains invalid rows; nothing was imported."
+    assert [row["row"] for row in status["rejected"]] == [1, 2]
+
+def test_cancel_running_and_queued_jobs(jobs):
+    # 準備測試數據：上限為 1，第二個工作排隊等待
+    use_case = BlockingUseCase()
+    run_import = use_case.import_users_from_csv
+    running = jobs.submit(run_import, io.BytesIO(b"Name,Age\nA,1\n"), UserImportMode.PARTIAL)
+    queued = jobs.submit(run_import, io.BytesIO(b"Name,Age\nB,2\n"), UserImportMode.PARTIAL)
+    use_case.started.wait(timeout=10)
+    
+    # 執行測試
+    jobs.cancel(queued.id)
+    queued_status = queued.to_dict()["status"]
+    progress = running.to_dict()
+    jobs.cancel(running.id)
+    running.future.result(timeout=10)
+    
+    # 驗證結果
+    assert queued_status == "cancelled"
+    assert progress["status"] == "running"
+    assert progress["rows_per_second"] is not None and progress["eta_seconds"] is not None
+    assert running.status == ImportJobStatus.CANCELLED
+    assert not running.path.exists() and not queued.path.exists()
+
+def test_finished_jobs_are_evicted(tmp_path):
+    # 準備測試數據
+    manager = ImportJobManager(tmp_path, max_concurrent=1, chunk_size=2, rejection_limit=10, max_retained=1)
+    use_case = UserUseCase(UserCSVRepository(), CsvUserParserService())
+    
+    # 執行測試
+    ids = []
+    for _ in range(3):
+        job = manager.submit(use_case.import_users_from_csv, io.BytesIO(b"Name,Age\nA,1\n"),
+                             UserImportMode.STRICT)
+        job.future.result(timeout=10)
+        ids.append(job.id)
+    manager.shutdown()
+    
+    # 驗證結果：只保留最新的已結束工作（以及剛提交的工作）
+    with pytest.raises(ImportJobNotFoundError):
+        manager.get(ids[0])
+    assert manager.get(ids[2]).status == ImportJobStatus.SUCCEEDED
@@ -1,9 +1,12 @@
 from fastapi.testclient import TestClient
 from app.main import app
 from app.core.exceptions import AppBaseException
+from app.di.container import user_use_case_ready, warm_up_user_use_case
+import threading
 
 client = TestClient(app)
 
+
 def test_app_exception_handler(client, test_app):
     """測試自定義異常處理器"""
     class TestException(AppBaseException):
@@ -19,4 +22,34 @@ def test_app_exception_handler(client, test_app):
     assert response.status_code == 400
     assert response.json() == {
         "detail": "TEST_ERROR: Test error message"
-    } 
\ No newline at end of file
+    } 
+
+
+def test_ready_after_startup_warmup(test_app):
+    """測試啟動時預先載入資料後回報就緒"""
+    with TestClient(test_app) as started_client:
+        response = started_client.get("/ready")
+    
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
+def test_ready_reports_loading(client, monkeypatch):
+    """測試資料尚未載入完成時回報 503"""
+    monkeypatch.setattr(user_use_case_ready, "is_set", lambda: False)
+    
+    response = client.get("/ready")
+    
+    assert response.status_code == 503
+    assert response.json() == {"status": "loading"}
+
+
+def test_background_warmup(monkeypatch):
+    """測試背景載入模式不阻塞，完成後設定就緒"""
+    from app.di import container as container_module
+    loaded = threading.Event()
+    monkeypatch.setattr(container_module.container, "user_use_case", loaded.set)
+    
+    warm_up_user_use_case("background")
+    
+    assert loaded.wait(timeout=5)
@@ -0,0 +1,42 @@
+from app.infrastructure.services.response_cache import ResponseCache
+
+def test_get_requires_matching_version():
+    # 準備測試數據
+    cache = ResponseCache(max_bytes=100)
+    cache.put("users", "v1", b"[1]")
+    
+    # 執行測試並驗證結果：版本不同即視為未命中
+    assert cache.get("users", "v1") == b"[1]"
+    assert cache.get("users", "v2") is None
+    assert cache.get_stats()["response_cache_hits"] == 1
+    assert cache.get_stats()["response_cache_misses"] == 1
+
+def test_put_replaces_older_version():
+    # 準備測試數據
+    cache = ResponseCache(max_bytes=100)
+    cache.put("users", "v1", b"[1]")
+    
+    # 執行測試
+    cache.put("users", "v2", b"[1,2]")
+    
+    # 驗證結果：同一個 key 只保留最新版本
+    assert cache.get_stats()["response_cache_entries"] == 1
+    assert cache.get_stats()["response_cache_bytes"] == 5
+
+def test_lru_eviction_by_bytes():
+    # 準備測試數據
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", "v1", b"aaaa")
+    cache.put("b", "v1", b"bbbb")
+    cache.get("a", "v1")
+    
+    # 執行測試：超過上限時淘汰最久未使用的 b
+    cache.put("c", "v1", b"cccc")
+    cache.put("huge", "v1", b"x" * 11)
+    
+    # 驗證結果
+    assert cache.get("b", "v1") is None
+    assert cache.get("a", "v1") == b"aaaa"
+    assert cache.get("c", "v1") == b"cccc"
+    assert cache.get("huge", "v1") is None
+    assert cache.get_stats()["response_cache_evictions"] == 1
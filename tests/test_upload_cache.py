@@ -0,0 +1,151 @@
+import io
+from unittest.mock import MagicMock
+import numpy as np
+import pytest
+from app.domain.user import UserColumns, UserImportMode, UserImportReport
+from app.infrastructure.services.columnar_user_cache import CachedUserDataLoader
+from app.infrastructure.services.csv_user_parser import CsvUserParserService
+from app.infrastructure.services.upload_cache import UploadCache
+from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.use_cases.user.user_use_case import UserUseCase
+
+CSV = b"Name,Age\nUser 1,25\nUser 2,-1\nUser 3,30\nUser 4,35\n"
+
+@pytest.fixture
+def parser():
+    # 包裝真正的解析器以計算實際解析的次數
+    return MagicMock(wraps=CsvUserParserService())
+
+def load(loader, content, chunk_size=2, rejection_limit=1000):
+    report = UserImportReport(rejection_limit=rejection_limit)
+    chunks = list(loader.iter_user_columns(io.BytesIO(content), chunk_size, report))
+    return [name for chunk in chunks for name in chunk.names], report
+
+def test_repeat_upload_skips_parsing(parser, tmp_path):
+    # 準備測試數據
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    loader = CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=cache)
+    
+    # 執行測試
+    cold_names, cold_report = load(loader, CSV)
+    warm_names, warm_report = load(loader, CSV)
+    
+    # 驗證結果：第二次直接讀取快取的欄位區塊與被拒絕的列
+    assert parser.iter_user_columns.call_count == 1
+    assert warm_names == cold_names == ["User 1", "User 3", "User 4"]
+    assert warm_report.rejected == cold_report.rejected
+    assert warm_report.rejected_count == 1
+    assert cache.get_stats()["upload_cache_hit_ratio"] == 0.5
+
+def test_strict_upload_counts_one_lookup(parser, tmp_path, monkeypatch):
+    # 準備測試數據
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    use_case = UserUseCase(UserCSVRepository(), CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=cache))
+    content = b"Name,Age\nUser 1,25\nUser 2,30\n"
+    digests = []
+    digest = cache.digest
+    monkeypatch.setattr(cache, "digest", lambda source: digests.append(source) or digest(source))
+    
+    # 執行測試：strict 模式讀兩次來源
+    report = use_case.import_users_from_csv(io.BytesIO(content), 10, UserImportMode.STRICT)
+    
+    # 驗證結果：只雜湊一次，第二次讀取本次寫入的項目不計入命中率
+    assert report.imported == 2
+    assert len(digests) == 1
+    assert parser.iter_user_columns.call_count == 1
+    stats = cache.get_stats()
+    assert (stats["upload_cache_hits"], stats["upload_cache_misses"]) == (0, 1)
+    
+    # 重新上傳同一個檔案才算命中
+    use_case.import_users_from_csv(io.BytesIO(content), 10, UserImportMode.STRICT)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_different_content_misses(parser, tmp_path):
+    # 準備測試數據
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    loader = CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=cache)
+    load(loader, CSV)
+    
+    # 執行測試
+    names, _ = load(loader, CSV + b"User 5,40\n")
+    
+    # 驗證結果
+    assert parser.iter_user_columns.call_count == 2
+    assert names[-1] == "User 5"
+
+def test_replay_rechunks_to_smaller_chunk_size(parser, tmp_path):
+    # 準備測試數據
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    loader = CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=cache)
+    load(loader, CSV, chunk_size=10)
+    
+    # 執行測試
+    chunks = list(loader.iter_user_columns(io.BytesIO(CSV), 1, UserImportReport()))
+    
+    # 驗證結果
+    assert [len(chunk) for chunk in chunks] == [1, 1, 1]
+    assert parser.iter_user_columns.call_count == 1
+
+def test_truncated_rejections_miss_for_higher_limit(parser, tmp_path):
+    # 準備測試數據：第一次只保留 0 筆被拒絕的列
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    loader = CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=cache)
+    load(loader, CSV, rejection_limit=0)
+    
+    # 執行測試
+    _, same_limit = load(loader, CSV, rejection_limit=0)
+    _, higher_limit = load(loader, CSV)
+    
+    # 驗證結果：較高上限需要完整的清單，重新解析
+    assert (same_limit.rejected_count, same_limit.rejected) == (1, [])
+    assert higher_limit.rejected_count == 1 and len(higher_limit.rejected) == 1
+    assert parser.iter_user_columns.call_count == 2
+
+def test_interrupted_parse_is_not_cached(tmp_path):
+    # 準備測試數據
+    cache = UploadCache(tmp_path / "uploads", max_bytes=1 << 20)
+    chunks = iter([UserColumns(names=["A"], ages=np.array([1]), is_new=True),
+                   UserColumns(names=["B"], ages=np.array([2]), is_new=True)])
+    
+    # 執行測試：只取第一個 chunk 後停止
+    recording = cache.record("key", chunks, UserImportReport())
+    next(recording)
+    recording.close()
+    
+    # 驗證結果
+    assert cache.replay("key", 10, UserImportReport()) is None
+    assert list((tmp_path / "uploads").iterdir()) == []
+
+def test_lru_eviction_by_bytes(tmp_path):
+    # 準備測試數據
+    columns = UserColumns(names=["User"] * 100, ages=np.arange(100), is_new=True)
+    probe = UploadCache(tmp_path / "probe", max_bytes=1 << 20)
+    list(probe.record("probe", iter([columns]), UserImportReport()))
+    entry_bytes = probe.get_stats()["upload_cache_bytes"]
+    cache = UploadCache(tmp_path / "uploads", max_bytes=entry_bytes * 2)
+    for key in ("a", "b"):
+        list(cache.record(key, iter([columns]), UserImportReport()))
+    list(cache.replay("a", 100, UserImportReport()))
+    
+    # 執行測試：超過上限時淘汰最久未使用的 b
+    list(cache.record("c", iter([columns]), UserImportReport()))
+    list(cache.record("huge", iter([columns] * 3), UserImportReport()))
+    
+    # 驗證結果
+    assert cache.replay("b", 100, UserImportReport()) is None
+    assert cache.replay("a", 100, UserImportReport()) is not None
+    assert cache.get_stats()["upload_cache_evictions"] == 1
+    assert cache.get_stats()["upload_cache_entries"] == 2
+    # 重新啟動後依磁碟上的項目重建索引
+    assert UploadCache(tmp_path / "uploads", max_bytes=entry_bytes * 2).get_stats()["upload_cache_entries"] == 2
+
+def test_disabled_cache_delegates(parser, tmp_path):
+    # 準備測試數據
+    loader = CachedUserDataLoader(parser, tmp_path / "seed", upload_cache=UploadCache(tmp_path / "uploads", 0))
+    
+    # 執行測試
+    load(loader, CSV)
+    load(loader, CSV)
+    
+    # 驗證結果
+    assert parser.iter_user_columns.call_count == 2
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from app.infrastructure.repositories.user_age_index import AgeIndex
+
+@pytest.fixture
+def populated():
+    rng = np.random.default_rng(7)
+    ages = rng.integers(0, 120, 3000).tolist()
+    index = AgeIndex()
+    index.add_many(ages[:2000], list(range(2000)))
+    for row_id in range(2000, 3000):
+        index.add_many([ages[row_id]], [row_id])
+    # 刪除一部分列，包含整個年齡被清空的情況
+    removed = [row_id for row_id in range(0, 3000, 3)] + [i for i, age in enumerate(ages) if age == 42]
+    for row_id in sorted(set(removed)):
+        index.remove(ages[row_id], row_id)
+    live = sorted((age, row_id) for row_id, age in enumerate(ages) if row_id not in set(removed))
+    return index, live
+
+def test_percentile_matches_numpy(populated):
+    # 準備測試數據
+    index, live = populated
+    values = np.array([age for age, _ in live], dtype=float)
+    
+    # 執行測試 & 驗證結果
+    for q in [0, 1, 25, 50, 75, 99.9, 100]:
+        assert index.percentile(q) == pytest.approx(np.percentile(values, q))
+    assert AgeIndex().percentile(50) is None
+
+def test_ranks_and_counts(populated):
+    # 準備測試數據
+    index, live = populated
+    
+    # 執行測試 & 驗證結果
+    assert index.total == len(live)
+    assert index.count_below(42) == index.count_at_most(42) == sum(1 for age, _ in live if age < 42)
+    assert [index.kth(rank) for rank in range(0, len(live), 97)] == [live[r][0] for r in range(0, len(live), 97)]
+    assert index.ids_from(150, 300) == [row_id for _, row_id in live[150:450]]
+
+def test_oldest_ids_keep_insertion_order_within_age(populated):
+    # 準備測試數據
+    index, live = populated
+    expected = sorted(live, key=lambda pair: (-pair[0], pair[1]))
+    
+    # 執行測試
+    result = index.oldest_ids(40)
+    
+    # 驗證結果
+    assert result == [row_id for _, row_id in expected[:40]]
@@ -0,0 +1,134 @@
+import threading
+import numpy as np
+import pytest
+from app.domain.user.models.user import User
+from app.domain.user.models.new_user import NewUser
+from app.domain.user.models.user_columns import UserColumns
+from app.domain.user import UserDedupStrategy
+from app.infrastructure.persistence.user_journal import UserJournal
+from app.infrastructure.persistence.write_ahead_log import WriteAheadLog
+from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return tmp_path / "state"
+
+def restart(journal_dir, **kwargs):
+    repo = UserCSVRepository()
+    restored = repo.attach_journal(UserJournal(journal_dir, fsync=False, **kwargs))
+    return repo, restored
+
+def test_restart_replays_log(journal_dir):
+    # 準備測試數據
+    repo, restored = restart(journal_dir)
+    repo.add_multiple_users([User(Name="Seed", Age=10), User(Name="Other", Age=20)])
+    repo.create_user(NewUser(Name="Created", Age=30))
+    repo.delete_user(User(Name="Seed", Age=10))
+    repo.delete_user_by_name("Other")
+    
+    # 執行測試
+    recovered, restored_again = restart(journal_dir)
+    
+    # 驗證結果
+    assert restored is False
+    assert restored_again is True
+    assert recovered.get_all_user_records() == [{"is_new": True, "Name": "Created", "Age": 30}]
+
+def test_restart_replays_merge(journal_dir):
+    # 準備測試數據
+    repo, _ = restart(journal_dir)
+    repo.add_multiple_users([User(Name="Seed", Age=10), User(Name="Other", Age=20)])
+    columns = UserColumns(names=["Seed", "Other", "Fresh"], ages=np.array([11, 20, 30]), is_new=True)
+    repo.merge_user_columns(columns, UserDedupStrategy.UPSERT)
+    
+    # 執行測試
+    recovered, _ = restart(journal_dir)
+    
+    # 驗證結果
+    assert recovered.get_all_user_records() == repo.get_all_user_records()
+    assert [user.Age for user in recovered.get_users_by_name("Seed")] == [11]
+
+def test_restart_loads_snapshot_and_log_tail(journal_dir):
+    # 準備測試數據：每 3 筆記錄寫一次快照
+    repo, _ = restart(journal_dir, snapshot_interval=3)
+    for i in range(4):
+        repo.create_user(NewUser(Name=f"User {i}", Age=i))
+    repo.delete_user(User(Name="User 0", Age=0))
+    
+    # 執行測試
+    recovered, _ = restart(journal_dir, snapshot_interval=3)
+    
+    # 驗證結果：快照涵蓋前 3 筆，WAL 只剩快照之後的 2 筆
+    assert repo.get_storage_stats()["snapshots"] == 1
+    assert len(list(WriteAheadLog.read(journal_dir / UserJournal.LOG_FILE))) == 2
+    assert recovered.get_all_user_records() == repo.get_all_user_records()
+
+def test_torn_log_tail_is_ignored(journal_dir):
+    # 準備測試數據
+    repo, _ = restart(journal_dir)
+    repo.create_user(NewUser(Name="Durable", Age=1))
+    with open(journal_dir / UserJournal.LOG_FILE, "ab") as f:
+        f.write(b'{"seq": 2, "op": "cre')
+    
+    # 執行測試
+    recovered, _ = restart(journal_dir)
+    
+    # 驗證結果
+    assert recovered.get_all_user_records() == [{"is_new": True, "Name": "Durable", "Age": 1}]
+
+def test_writes_after_torn_tail_survive_restart(journal_dir):
+    # 準備測試數據：崩潰留下寫到一半的最後一筆
+    repo, _ = restart(journal_dir)
+    repo.create_user(NewUser(Name="Durable", Age=1))
+    with open(journal_dir / UserJournal.LOG_FILE, "ab") as f:
+        f.write(b'{"seq": 2, "op": "cre')
+    
+    # 執行測試：復原後繼續寫入，再重啟一次
+    recovered, _ = restart(journal_dir)
+    recovered.create_user(NewUser(Name="After Crash", Age=2))
+    recovered.create_user(NewUser(Name="Also After", Age=3))
+    again, _ = restart(journal_dir)
+    
+    # 驗證結果
+    assert [record["Name"] for record in again.get_all_user_records()] == ["Durable", "After Crash", "Also After"]
+    assert all(line.endswith(b"\n") for line in (journal_dir / UserJournal.LOG_FILE).read_bytes().splitlines(True))
+
+def test_group_commit_shares_fsync(tmp_path):
+    # 準備測試數據
+    wal = WriteAheadLog(tmp_path / "test.wal")
+    barrier = threading.Barrier(8)
+    
+    def writer(i):
+        barrier.wait()
+        for j in range(50):
+            wal.commit(wal.append({"op": "create", "Name": f"{i}-{j}", "Age": j}))
+    
+    # 執行測試
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wal.close()
+    
+    # 驗證結果：全部記錄都寫入，且依序號排列
+    records = list(WriteAheadLog.read(tmp_path / "test.wal"))
+    assert [r["seq"] for r in records] == list(range(1, 401))
+    assert wal.commits <= 400
+
+def test_snapshot_packs_new_user_flags(journal_dir):
+    # 準備測試數據
+    repo, _ = restart(journal_dir)
+    repo.add_multiple_users([User(Name=f"Seed {i}", Age=i) for i in range(10)])
+    for i in range(3):
+        repo.create_user(NewUser(Name=f"New {i}", Age=i))
+    
+    # 執行測試
+    repo.snapshot()
+    recovered, _ = restart(journal_dir)
+    
+    # 驗證結果：is_new 以 bit 存放，年齡以最小型別存放，復原後內容不變
+    with np.load(journal_dir / UserJournal.SNAPSHOT_FILE) as data:
+        assert data["is_new_bits"].nbytes == 2
+        assert data["ages"].dtype == np.uint8
+    assert recovered.get_all_user_records() == repo.get_all_user_records()
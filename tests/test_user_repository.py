@@ -1,11 +1,17 @@
 import pytest
+import numpy as np
 import pandas as pd
 from app.domain.user.models.user import User
 from app.domain.user.models.new_user import NewUser
-from app.infrastructure.repositories.exceptions import DataframeKeyException, GroupbyKeyException
+from app.domain.user.models.user_columns import UserColumns
+from app.domain.user import UserAggregation, UserDedupStrategy
+from app.infrastructure.repositories.exceptions import AggregateConsistencyException, DataframeKeyException, GroupbyKeyException
 from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.infrastructure.repositories.user_sketches import UserSketches
+from app.interfaces.user_repository import UserGrouping
 import tempfile
 import os
+import threading
 
 @pytest.fixture
 def temp_csv_file():
@@ -46,13 +52,13 @@ def test_add_multiple_users(repository):
 
 def test_compute_group_average_basic(repository):
     # 準備測試數據
-    groupby = repository.df.groupby("Name")
+    grouping = repository.get_grouped_users_by("Name")
     
     # 執行測試
-    result = repository.compute_group_average(groupby, "Age")
+    result = repository.compute_group_average(grouping, "Age")
     
     # 驗證結果
-    assert isinstance(result, pd.Series)  # 返回值應該是 pandas Series
+    assert isinstance(result, dict)  # 返回值為與後端無關的 dict
     assert result["Test User"] == 25
     assert result["Another User"] == 30
 
@@ -63,7 +69,7 @@ def test_compute_group_average_with_invalid_field(repository, sample_users):
     
     # 驗證正常情況
     average = repository.compute_group_average(grouped, 'Age')
-    assert isinstance(average, pd.Series)
+    assert isinstance(average, dict)
     assert average["Test User 1"] == 25
     assert average["Test User 2"] == 30
     
@@ -113,8 +119,8 @@ def test_get_grouped_users_by_basic(repository):
     result = repository.get_grouped_users_by("Name")
     
     # 驗證結果
-    assert isinstance(result, pd.core.groupby.generic.DataFrameGroupBy)
-    assert len(result.groups) == 2
+    assert result == UserGrouping("Name")
+    assert len(repository.compute_group_average(result, "Age")) == 2
 
 def test_get_grouped_users_by_with_invalid_field(repository, sample_users):
     # 準備測試數據
@@ -122,7 +128,7 @@ def test_get_grouped_users_by_with_invalid_field(repository, sample_users):
     
     # 驗證正常情況
     grouped = repository.get_grouped_users_by('Age')
-    assert len(grouped.groups) == 2
+    assert len(repository.compute_group_average(grouped, 'Age')) == 2
     
     # 驗證異常情況
     with pytest.raises(DataframeKeyException):
@@ -133,8 +139,8 @@ def test_get_grouped_users_by_first_char_basic(repository):
     result = repository.get_grouped_users_by_first_char("Name")
     
     # 驗證結果
-    assert isinstance(result, pd.core.groupby.generic.DataFrameGroupBy)
-    assert len(result.groups) == 2  # 'T' 和 'A'
+    assert result == UserGrouping("Name", prefix_length=1)
+    assert len(repository.compute_group_average(result, "Age")) == 2  # 'T' 和 'A'
 
 def test_get_grouped_users_by_first_char_with_invalid_field(repository, sample_users):
     # 準備測試數據
@@ -142,7 +148,7 @@ def test_get_grouped_users_by_first_char_with_invalid_field(repository, sample_u
     
     # 驗證正常情況
     grouped = repository.get_grouped_users_by_first_char('Name')
-    assert len(grouped.groups) == 2  # 'T' 和 'A'
+    assert len(repository.compute_group_average(grouped, 'Age')) == 2  # 'T' 和 'A'
     
     # 驗證異常情況
     with pytest.raises(DataframeKeyException):
@@ -155,4 +161,599 @@ def test_has_user(repository):
     
     # 執行測試並驗證結果
     assert repository.has_user(existing_user) is True
-    assert repository.has_user(nonexistent_user) is False 
\ No newline at end of file
+    assert repository.has_user(nonexistent_user) is False 
+
+def test_create_user_buffers_until_read():
+    # 準備測試數據
+    repository = UserCSVRepository()
+    
+    # 執行測試
+    for i in range(10):
+        repository.create_user(NewUser(Name=f"Buffered {i}", Age=i))
+    
+    # 驗證結果：寫入先進緩衝區，讀取時才合併且看得到全部資料
+    assert len(repository._frame) == 0
+    assert len(repository.df) == 10
+    assert repository.df["Name"].tolist() == [f"Buffered {i}" for i in range(10)]
+    assert repository.df.index.tolist() == list(range(10))
+
+def test_create_user_flushes_proportionally_to_table_size():
+    # 準備測試數據
+    repository = UserCSVRepository()
+    total = UserCSVRepository.MIN_FLUSH_ROWS * 3
+    
+    # 執行測試
+    for i in range(total):
+        repository.create_user(NewUser(Name="Bulk", Age=i % 100))
+    
+    # 驗證結果：緩衝區不會超過主表大小
+    assert len(repository._pending['is_new']) <= max(UserCSVRepository.MIN_FLUSH_ROWS,
+                                                     len(repository._frame))
+    assert len(repository.df) == total
+
+def test_get_user_ids(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Test User", Age=25))
+    
+    # 執行測試
+    row_ids = repository.get_user_ids(User(Name="Test User", Age=25))
+    
+    # 驗證結果
+    assert row_ids == [0, 2]
+    assert repository.get_user_ids(User(Name="Test User", Age=26)) == []
+
+def test_delete_user_updates_index(repository):
+    # 準備測試數據
+    user = User(Name="Test User", Age=25)
+    repository.create_user(NewUser(Name="Test User", Age=25))
+    
+    # 執行測試
+    repository.delete_user(user)
+    
+    # 驗證結果：同名同齡的列全部刪除，索引同步更新
+    assert repository.has_user(user) is False
+    assert len(repository.df) == 1
+    assert repository.get_user_ids(User(Name="Another User", Age=30)) == [1]
+
+def test_has_user_with_quote_in_name(repository):
+    # 準備測試數據
+    user = NewUser(Name="O'Brien", Age=40)
+    repository.create_user(user)
+    
+    # 執行測試並驗證結果
+    assert repository.has_user(user) is True
+    repository.delete_user(user)
+    assert repository.has_user(user) is False
+
+def test_get_users_by_name(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Test User", Age=40))
+    
+    # 執行測試
+    users = repository.get_users_by_name("Test User")
+    
+    # 驗證結果
+    assert [(type(u), u.Age) for u in users] == [(User, 25), (NewUser, 40)]
+    assert repository.get_users_by_name("Nobody") == []
+
+def test_delete_user_by_name(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Test User", Age=40))
+    
+    # 執行測試
+    repository.delete_user_by_name("Test User")
+    
+    # 驗證結果：名稱索引與 (Name, Age) 索引都同步移除
+    assert repository.df["Name"].tolist() == ["Another User"]
+    assert repository.get_users_by_name("Test User") == []
+    assert repository.has_user(User(Name="Test User", Age=25)) is False
+    assert repository.has_user(User(Name="Test User", Age=40)) is False
+
+def test_delete_user_marks_tombstone(sample_users):
+    # 準備測試數據
+    repository = UserCSVRepository(compaction_threshold=0.9)
+    repository.add_multiple_users(sample_users * 5)
+    
+    # 執行測試
+    repository.delete_user(User(Name="Test User 1", Age=25))
+    
+    # 驗證結果：只標記墓碑，讀取時排除已刪除列
+    stats = repository.get_storage_stats()
+    assert stats['dead_rows'] == 5
+    assert stats['dead_ratio'] == 0.5
+    assert stats['compactions'] == 0
+    assert repository.df["Name"].tolist() == ["Test User 2"] * 5
+    assert repository.get_users_by_name("Test User 2")[0].Age == 30
+
+def test_compaction_after_threshold(sample_users):
+    # 準備測試數據
+    repository = UserCSVRepository(compaction_threshold=0.25)
+    repository.add_multiple_users(sample_users * 2)
+    repository.delete_user_by_name("Test User 1")
+    
+    # 執行測試：讀取時超過門檻即壓縮
+    live = repository.df
+    
+    # 驗證結果：壓縮後列 id 不變，索引仍然有效
+    stats = repository.get_storage_stats()
+    assert stats['compactions'] == 1
+    assert stats['dead_rows'] == 0
+    assert live.index.tolist() == [1, 3]
+    repository.delete_user(User(Name="Test User 2", Age=30))
+    assert len(repository.df) == 0
+
+def test_delete_pending_user_by_name(repository):
+    # 準備測試數據：尚未合併到主表的列也能被刪除
+    repository.create_user(NewUser(Name="Pending User", Age=50))
+    
+    # 執行測試
+    repository.delete_user_by_name("Pending User")
+    
+    # 驗證結果
+    assert repository.has_user(User(Name="Pending User", Age=50)) is False
+    assert "Pending User" not in repository.df["Name"].values
+
+def test_get_all_user_records_matches_models(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Record User", Age=41))
+    repository.delete_user(User(Name="Another User", Age=30))
+    expected = [{'is_new': isinstance(u, NewUser), **u.model_dump()}
+                for u in repository.get_all_users()]
+    
+    # 執行測試
+    records = repository.get_all_user_records()
+    
+    # 驗證結果：欄位順序與型別都需與原本的回應一致
+    assert records == expected
+    assert [list(r) for r in records] == [['is_new', 'Name', 'Age']] * 2
+    assert all(type(r['Age']) is int and type(r['is_new']) is bool for r in records)
+
+def test_get_added_user_records_matches_models(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Record User", Age=41))
+    
+    # 執行測試
+    records = repository.get_added_user_records()
+    
+    # 驗證結果
+    assert records == [u.model_dump() for u in repository.get_added_user()]
+    assert records == [{'Name': "Record User", 'Age': 41}]
+
+def test_get_average_age_by_first_char(repository):
+    # 準備測試數據
+    repository.add_multiple_users([NewUser(Name="Tom", Age=35), NewUser(Name="Amy", Age=20)])
+    
+    # 執行測試
+    averages = repository.get_average_age_by_first_char()
+    
+    # 驗證結果：原有 Test User(25)、Another User(30)
+    assert averages == {"A": 25.0, "T": 30.0}
+
+def test_average_age_consistency_check_mode(sample_users):
+    # 準備測試數據：開啟驗證模式，每次查詢都與完整重算比對
+    repository = UserCSVRepository(verify_aggregates=True)
+    repository.add_multiple_users(sample_users + [NewUser(Name="Bob", Age=40)])
+    
+    # 執行測試
+    repository.delete_user(User(Name="Test User 1", Age=25))
+    repository.create_user(NewUser(Name="Tina", Age=22))
+    repository.delete_user_by_name("Bob")
+    
+    # 驗證結果
+    assert repository.get_average_age_by_first_char() == {"T": 26.0}
+    
+    # 驗證異常情況：增量值被破壞時應該偵測到
+    age_sum, count = repository._first_char_aggregates["T"]
+    repository._first_char_aggregates["T"] = (age_sum + 1, count)
+    with pytest.raises(AggregateConsistencyException):
+        repository.get_average_age_by_first_char()
+
+def test_add_user_columns(repository):
+    # 準備測試數據
+    columns = UserColumns(names=["Column A", "Column B"], ages=np.array([5, 6]), is_new=True)
+    
+    # 執行測試
+    repository.add_user_columns(columns)
+    
+    # 驗證結果
+    assert repository.get_added_user_records() == [{"Name": "Column A", "Age": 5},
+                                                   {"Name": "Column B", "Age": 6}]
+    assert repository.get_average_age_by_first_char() == {"A": 30.0, "C": 5.5, "T": 25.0}
+
+def test_merge_user_columns_skip_duplicates(repository):
+    # 準備測試數據：一筆與既有資料相同，一筆在批次內重複
+    columns = UserColumns(names=["Test User", "New User", "New User", "Test User"],
+                          ages=np.array([25, 40, 40, 26]), is_new=True)
+    
+    # 執行測試
+    summary = repository.merge_user_columns(columns, UserDedupStrategy.SKIP_DUPLICATES)
+    
+    # 驗證結果
+    assert summary == {"inserted": 2, "skipped": 2, "updated": 0}
+    assert repository.get_added_user_records() == [{"Name": "New User", "Age": 40},
+                                                   {"Name": "Test User", "Age": 26}]
+    assert repository.merge_user_columns(columns, UserDedupStrategy.SKIP_DUPLICATES)["inserted"] == 0
+
+def test_merge_user_columns_upsert(repository):
+    # 準備測試數據：同名的既有使用者以批次中最後一筆取代，被取代的列計為略過
+    repository.add_user_columns(UserColumns(names=["Test User"], ages=np.array([27]), is_new=False))
+    columns = UserColumns(names=["Test User", "Another User", "Test User", "New User"],
+                          ages=np.array([40, 30, 41, 50]), is_new=True)
+    
+    # 執行測試
+    summary = repository.merge_user_columns(columns, UserDedupStrategy.UPSERT)
+    
+    # 驗證結果
+    assert summary == {"inserted": 1, "skipped": 2, "updated": 1}
+    assert [user.Age for user in repository.get_users_by_name("Test User")] == [41]
+    assert repository.get_users_by_name("Another User") == [User(Name="Another User", Age=30)]
+    assert repository.has_user(User(Name="New User", Age=50))
+    assert repository.get_average_age_by_first_char() == {"A": 30.0, "N": 50.0, "T": 41.0}
+
+def test_delete_user_returns_deleted_count(repository):
+    # 準備測試數據
+    user = User(Name="Test User", Age=25)
+    
+    # 執行測試：同一使用者只能被刪除一次
+    first = repository.delete_user(user)
+    second = repository.delete_user(user)
+    
+    # 驗證結果
+    assert first == 1
+    assert second == 0
+    assert repository.delete_user_by_name("Another User") == 1
+
+def test_snapshot_is_immutable_across_writes(repository):
+    # 準備測試數據：讀取者先拿到快照與版本
+    snapshot = repository.df
+    version = repository.data_version
+    
+    # 執行測試
+    repository.create_user(NewUser(Name="Later User", Age=50))
+    repository.delete_user(User(Name="Test User", Age=25))
+    
+    # 驗證結果：舊快照不受之後的寫入影響
+    assert snapshot['Name'].tolist() == ["Test User", "Another User"]
+    assert repository.data_version > version
+    assert repository.df['Name'].tolist() == ["Another User", "Later User"]
+
+def test_concurrent_writers_and_readers(sample_users):
+    # 準備測試數據：多個寫入執行緒各自新增再刪除一部分自己的使用者，同時有讀取者
+    repository = UserCSVRepository(verify_aggregates=True)
+    repository.add_multiple_users(sample_users)
+    writers, per_writer = 8, 200
+    errors = []
+    done = threading.Event()
+    
+    def write(worker):
+        try:
+            for i in range(per_writer):
+                repository.create_user(NewUser(Name=f"W{worker} {i}", Age=i % 100))
+            for i in range(0, per_writer, 2):
+                assert repository.delete_user(User(Name=f"W{worker} {i}", Age=i % 100)) == 1
+        except Exception as e:
+            errors.append(e)
+    
+    def read():
+        try:
+            while not done.is_set():
+                snapshot = repository.df
+                assert snapshot.index.is_monotonic_increasing
+                repository.get_average_age_by_first_char()
+                repository.get_users_by_name("Test User 1")
+                repository.get_memory_usage()
+                repository.get_storage_stats()
+                repository.search_user_records("W", 10)
+        except Exception as e:
+            errors.append(e)
+    
+    # 執行測試
+    readers = [threading.Thread(target=read) for _ in range(2)]
+    threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+    for thread in readers + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    for thread in readers:
+        thread.join()
+    
+    # 驗證結果：沒有遺失的更新，索引與增量彙總與資料一致
+    assert errors == []
+    names = repository.df['Name'].tolist()
+    assert len(names) == len(sample_users) + writers * per_writer // 2
+    assert all(repository.has_user(User(Name=f"W{w} {i}", Age=i % 100))
+               for w in range(writers) for i in range(1, per_writer, 2))
+    assert not any(repository.has_user(User(Name=f"W{w} {i}", Age=i % 100))
+                   for w in range(writers) for i in range(0, per_writer, 2))
+    repository.get_average_age_by_first_char()
+    stats = repository.get_storage_stats()
+    assert stats['live_rows'] == len(names)
+    assert stats['lock_acquisitions'] > 0
+    assert stats['lock_wait_seconds_max'] >= 0
+
+def test_snapshot_without_journal_is_noop(repository):
+    # 準備測試數據
+    version = repository.data_version
+    
+    # 執行測試
+    repository.snapshot()
+    
+    # 驗證結果
+    assert repository.data_version == version
+    assert repository.df['Name'].tolist() == ["Test User", "Another User"]
+
+def test_user_records_page_cursor_survives_writes(sample_users):
+    # 準備測試數據
+    repository = UserCSVRepository()
+    repository.add_multiple_users(sample_users + [User(Name="Test User 3", Age=35)])
+    first, cursor = repository.get_user_records_page(None, 2)
+    
+    # 執行測試：翻頁之間刪除已讀與未讀的使用者，並新增使用者
+    repository.delete_user(User(Name="Test User 1", Age=25))
+    repository.delete_user(User(Name="Test User 3", Age=35))
+    repository.create_user(NewUser(Name="Late User", Age=40))
+    second, next_cursor = repository.get_user_records_page(cursor, 2)
+    
+    # 驗證結果：不會重複或跳過仍存在的使用者
+    assert [r["Name"] for r in first] == ["Test User 1", "Test User 2"]
+    assert second == [{"is_new": True, "Name": "Late User", "Age": 40}]
+    assert next_cursor is None
+
+def test_compute_group_stats_matches_pandas():
+    # 準備測試數據
+    rng = np.random.default_rng(0)
+    names = [f"{c}{i}" for i, c in enumerate(rng.choice(list("abAB"), size=500))]
+    ages = rng.integers(0, 100, size=500)
+    repository = UserCSVRepository()
+    repository.add_user_columns(UserColumns(names=names, ages=ages))
+    aggregations = list(UserAggregation)
+    
+    # 執行測試
+    stats = repository.compute_group_stats(
+        UserGrouping("Name", prefix_length=1, casefold=True), "Age", aggregations)
+    
+    # 驗證結果：與 pandas 的逐組計算一致
+    expected = pd.Series(ages).groupby([n[0].casefold() for n in names]).agg(
+        ["count", "mean", "min", "max", "sum", "std"])
+    assert list(stats) == ["a", "b"]
+    for key, row in expected.iterrows():
+        assert stats[key]["count"] == row["count"]
+        assert stats[key]["min"] == row["min"] and stats[key]["max"] == row["max"]
+        assert stats[key]["sum"] == row["sum"]
+        assert stats[key]["mean"] == pytest.approx(row["mean"])
+        assert stats[key]["std"] == pytest.approx(row["std"])
+
+def test_compute_group_stats_age_buckets(sample_users):
+    # 準備測試數據
+    repository = UserCSVRepository()
+    repository.add_multiple_users(sample_users + [User(Name="Solo", Age=41)])
+    
+    # 執行測試
+    stats = repository.compute_group_stats(UserGrouping("Age", bucket_size=10), "Age",
+                                           [UserAggregation.COUNT, UserAggregation.STD])
+    
+    # 驗證結果：只有一人的分組沒有樣本標準差
+    assert stats == {20: {"count": 1, "std": None}, 30: {"count": 1, "std": None},
+                     40: {"count": 1, "std": None}}
+
+def test_compute_group_stats_bucket_wider_than_age_dtype(sample_users):
+    # 準備測試數據：精簡布局下年齡為 uint8，分桶寬度超過 255
+    repository = UserCSVRepository(compact_storage=True)
+    repository.add_multiple_users(sample_users)
+    
+    # 執行測試
+    stats = repository.compute_group_stats(UserGrouping("Age", bucket_size=300), "Age", [UserAggregation.COUNT])
+    
+    # 驗證結果
+    assert stats == {0: {"count": 2}}
+
+def test_compute_group_stats_empty_repository():
+    # 準備測試數據
+    repository = UserCSVRepository(verify_aggregates=True)
+    
+    # 執行測試
+    stats = repository.compute_group_stats(UserGrouping("Name"), "Age", [UserAggregation.COUNT])
+    
+    # 驗證結果
+    assert stats == {}
+    assert repository.get_average_age_by_first_char() == {}
+
+def test_compute_group_stats_invalid_fields(repository):
+    # 執行測試並驗證異常
+    with pytest.raises(GroupbyKeyException):
+        repository.compute_group_stats(UserGrouping("Name"), "Name", [UserAggregation.COUNT])
+    with pytest.raises(GroupbyKeyException):
+        repository.compute_group_stats(UserGrouping("Name", bucket_size=5), "Age", [UserAggregation.COUNT])
+    with pytest.raises(DataframeKeyException):
+        repository.compute_group_stats(UserGrouping("Missing"), "Age", [UserAggregation.COUNT])
+
+def test_data_version_changes_only_on_writes(repository):
+    # 準備測試數據
+    version = repository.get_data_version()
+    
+    # 執行測試
+    repository.get_all_user_records()
+    repository.compact()
+    unchanged = repository.get_data_version()
+    repository.create_user(NewUser(Name="Versioned User", Age=20))
+    
+    # 驗證結果
+    assert unchanged == version
+    assert repository.get_data_version() != version
+    assert UserCSVRepository().get_data_version() != UserCSVRepository().get_data_version()
+
+def test_data_version_unchanged_by_no_op_writes(repository):
+    # 準備測試數據
+    version = repository.get_data_version()
+    
+    # 執行測試：刪除不存在的使用者、全部略過的合併、寫入失敗
+    repository.delete_user(User(Name="Nobody", Age=1))
+    repository.delete_user_by_name("Nobody")
+    repository.merge_user_columns(UserColumns(names=["Test User"], ages=np.array([25]), is_new=True),
+                                  UserDedupStrategy.SKIP_DUPLICATES)
+    with pytest.raises(ZeroDivisionError):
+        with repository._writing():
+            1 / 0
+    
+    # 驗證結果
+    assert repository.get_data_version() == version
+    repository.delete_user_by_name("Test User")
+    assert repository.get_data_version() != version
+
+def build_repository(compact_storage, users):
+    repo = UserCSVRepository(compact_storage=compact_storage)
+    repo.add_multiple_users(users)
+    repo.create_user(NewUser(Name="Big", Age=300))
+    repo.delete_user(User(Name="User 1", Age=1))
+    repo.delete_user_by_name("User 2")
+    return repo
+
+def test_compact_storage_returns_identical_results():
+    # 準備測試數據
+    users = [User(Name=f"User {i % 7}", Age=i % 90) for i in range(500)]
+    plain, compact = build_repository(False, users), build_repository(True, users)
+    grouping = UserGrouping("Name", prefix_length=6, casefold=True)
+    
+    # 執行測試
+    results = [(repo.get_all_user_records(), repo.get_added_user_records(),
+                repo.get_user_records_page(3, 10), repo.get_users_by_name("User 3"),
+                repo.get_user_ids(User(Name="User 3", Age=3)), repo.get_average_age_by_first_char(),
+                repo.compute_group_stats(grouping, "Age", list(UserAggregation)))
+               for repo in (plain, compact)]
+    
+    # 驗證結果
+    assert results[0] == results[1]
+    assert isinstance(compact.df["Name"].dtype, pd.CategoricalDtype)
+
+def test_compact_storage_widens_age_dtype(sample_users):
+    # 準備測試數據
+    repo = UserCSVRepository(compact_storage=True)
+    repo.add_multiple_users(sample_users)
+    assert repo.df["Age"].dtype == np.uint8
+    
+    # 執行測試
+    repo.create_user(NewUser(Name="Old", Age=70000))
+    
+    # 驗證結果：超出範圍時自動改用較寬的型別，數值不變
+    assert repo.df["Age"].dtype == np.uint32
+    assert [record["Age"] for record in repo.get_all_user_records()] == [25, 30, 70000]
+
+def test_compact_storage_keeps_distinct_names_plain():
+    # 準備測試數據：名稱幾乎都不重複
+    repo = UserCSVRepository(compact_storage=True)
+    repo.add_multiple_users([User(Name=f"User {i % 3}", Age=i) for i in range(3000)])
+    repo.get_all_user_records()
+    assert isinstance(repo.df["Name"].dtype, pd.CategoricalDtype)
+    
+    # 執行測試：加入大量不重複名稱後，不重複比例超過上限
+    repo.add_multiple_users([User(Name=f"Unique {i}", Age=1) for i in range(5000)])
+    records = repo.get_all_user_records()
+    
+    # 驗證結果：名稱改回一般字串欄位，資料不變
+    assert not isinstance(repo.df["Name"].dtype, pd.CategoricalDtype)
+    assert len(records) == 8000 and records[-1]["Name"] == "Unique 4999"
+    loaded = UserCSVRepository(compact_storage=True)
+    loaded.load(pd.DataFrame({"Name": ["A", "B"], "Age": [1, 2], "is_new": [False, False]}))
+    assert not isinstance(loaded.df["Name"].dtype, pd.CategoricalDtype)
+
+def test_memory_usage_reports_savings():
+    # 準備測試數據
+    users = [User(Name=f"User {i % 100}", Age=i % 100) for i in range(5000)]
+    plain, compact = build_repository(False, users), build_repository(True, users)
+    
+    # 執行測試
+    plain_usage, compact_usage = plain.get_memory_usage(), compact.get_memory_usage()
+    
+    # 驗證結果
+    assert compact_usage["layout"] == "compact" and plain_usage["layout"] == "plain"
+    assert compact_usage["rows"] == plain_usage["rows"]
+    assert compact_usage["plain_total_bytes"] == pytest.approx(plain_usage["total_bytes"], rel=0.05)
+    assert compact_usage["total_bytes"] < plain_usage["total_bytes"] / 2
+    assert compact_usage["savings_ratio"] > 2
+
+def test_search_user_records_by_prefix(repository):
+    # 準備測試數據
+    repository.add_multiple_users([User(Name="Tess", Age=40), User(Name="Test User", Age=26)])
+    repository.create_user(NewUser(Name="Tea", Age=50))
+    repository.delete_user_by_name("Tess")
+    
+    # 執行測試
+    result = repository.search_user_records("Te", limit=10)
+    
+    # 驗證結果：依名稱排序，同名依加入順序，已刪除的名稱不再出現
+    assert result == [
+        {"is_new": True, "Name": "Tea", "Age": 50},
+        {"is_new": False, "Name": "Test User", "Age": 25},
+        {"is_new": False, "Name": "Test User", "Age": 26},
+    ]
+    assert repository.search_user_records("Te", limit=1, offset=2) == result[2:]
+    assert repository.search_user_records("Tess", limit=10) == []
+    assert repository.search_user_records("te", limit=10) == []
+
+def test_search_user_records_matches_scan():
+    # 準備測試數據
+    rng = np.random.default_rng(1)
+    repo = UserCSVRepository()
+    repo.add_multiple_users([User(Name=f"N{i}", Age=int(a))
+                             for i, a in zip(rng.integers(0, 300, 2000), rng.integers(0, 90, 2000))])
+    repo.delete_user_by_name("N12")
+    df = repo.df.reset_index()
+    
+    # 執行測試
+    result = repo.search_user_records("N1", limit=50, offset=30)
+    
+    # 驗證結果
+    matched = df[df["Name"].astype(str).str.startswith("N1")].sort_values(["Name", "index"], kind="stable")
+    expected = [{"is_new": bool(f), "Name": n, "Age": int(a)}
+                for f, n, a in zip(matched["is_new"], matched["Name"], matched["Age"])][30:80]
+    assert result == expected
+
+def test_age_queries_match_pandas():
+    # 準備測試數據
+    rng = np.random.default_rng(3)
+    repo = UserCSVRepository()
+    repo.add_multiple_users([User(Name=f"N{i}", Age=int(a))
+                             for i, a in zip(rng.integers(0, 200, 2000), rng.integers(0, 90, 2000))])
+    repo.delete_user_by_name("N7")
+    repo.create_user(NewUser(Name="Elder", Age=300))
+    df = repo.df.reset_index().sort_values(["Age", "index"], kind="stable")
+    records = [{"is_new": bool(f), "Name": n, "Age": int(a)}
+               for f, n, a in zip(df["is_new"], df["Name"], df["Age"])]
+    
+    # 執行測試
+    users, total = repo.get_user_records_by_age(20, 30, limit=25, offset=10)
+    percentiles = repo.get_age_percentiles([0, 50, 90, 100])
+    oldest = repo.get_user_records_by_age_rank(3, oldest=True)
+    youngest = repo.get_user_records_by_age_rank(3, oldest=False)
+    
+    # 驗證結果
+    in_range = [r for r in records if 20 <= r["Age"] <= 30]
+    assert total == len(in_range)
+    assert users == in_range[10:35]
+    assert percentiles == pytest.approx({q: np.percentile(df["Age"].to_numpy(float), q) for q in [0, 50, 90, 100]})
+    assert oldest[0] == {"is_new": True, "Name": "Elder", "Age": 300}
+    assert [r["Age"] for r in oldest] == sorted(df["Age"], reverse=True)[:3]
+    assert youngest == records[:3]
+    assert repo.get_user_records_by_age(91, 299, 10) == ([], 0)
+
+def test_sketch_stats_incremental_matches_rebuilt(sample_users):
+    # 準備測試數據
+    incremental = UserCSVRepository(incremental_sketches=True)
+    on_demand = UserCSVRepository()
+    for repo in (incremental, on_demand):
+        repo.add_multiple_users([User(Name=f"{c}{i}", Age=i) for c in "AB" for i in range(100)])
+        repo.create_user(NewUser(Name="Zed", Age=40))
+    
+    # 執行測試
+    before = incremental.get_sketch_stats([50])
+    incremental.delete_user_by_name("Zed")
+    after = incremental.get_sketch_stats([50])
+    
+    # 驗證結果：增量結果與重建相同；刪除後以現有資料重建
+    assert before == on_demand.get_sketch_stats([50])
+    assert before["groups"]["Z"]["count"] == 1
+    assert "Z" not in after["groups"]
+    assert after["total"]["count"] == 200
+    assert after["total"]["percentiles"][50] == pytest.approx(49.5)
+    assert UserSketches.from_bytes(incremental.export_sketches()).stats([50]) == after
@@ -0,0 +1,177 @@
+import os
+import pytest
+import stat
+import threading
+from app.domain.user.models.user import User
+from app.domain.user.models.new_user import NewUser
+from app.infrastructure.persistence.user_journal import UserJournal
+from app.infrastructure.repositories.exceptions import SharedStateUnavailableException
+from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.infrastructure.repositories.user_repository_shared import UserSharedRepository
+from app.infrastructure.repositories.user_state_service import (
+    UserStateService, create_authkey, serve_user_state)
+
+AUTHKEY = b"test-key"
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return tmp_path / "users.sock"
+
+def start_server(socket_path, feed_size=10000):
+    repo = UserCSVRepository()
+    repo.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    service = UserStateService(repo, feed_size=feed_size)
+    server = serve_user_state(service, socket_path, AUTHKEY)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return service, server
+
+@pytest.fixture
+def server(socket_path):
+    service, server = start_server(socket_path)
+    yield service
+    server.stop_event.set()
+
+def test_workers_see_each_others_writes(server, socket_path):
+    # 準備測試數據：兩個 worker 連到同一個 state server
+    worker_a = UserSharedRepository(socket_path, AUTHKEY)
+    worker_b = UserSharedRepository(socket_path, AUTHKEY)
+
+    # 執行測試
+    worker_a.create_user(NewUser(Name="Created User", Age=35))
+    deleted = worker_b.delete_user(User(Name="Test User", Age=25))
+
+    # 驗證結果
+    assert deleted == 1
+    expected = [{"is_new": False, "Name": "Another User", "Age": 30},
+                {"is_new": True, "Name": "Created User", "Age": 35}]
+    assert worker_a.get_all_user_records() == expected
+    assert worker_b.get_all_user_records() == expected
+    assert worker_b.get_average_age_by_first_char() == {"A": 30.0, "C": 35.0}
+    assert worker_b.delete_user(User(Name="Test User", Age=25)) == 0
+
+def test_replica_applies_only_new_changes(server, socket_path):
+    # 準備測試數據
+    worker = UserSharedRepository(socket_path, AUTHKEY)
+    worker.get_all_user_records()
+
+    # 執行測試
+    worker.create_user(NewUser(Name="Created User", Age=35))
+    stats = worker.get_storage_stats()
+
+    # 驗證結果：第一次讀取下載整張表，之後只重播 change feed
+    assert stats['replica_resyncs'] == 1
+    assert stats['replica_seq'] == 1
+    assert worker.has_user(User(Name="Created User", Age=35))
+
+def test_replica_resyncs_when_behind_feed(socket_path):
+    # 準備測試數據：change feed 只保留 2 筆
+    service, server = start_server(socket_path, feed_size=2)
+    worker = UserSharedRepository(socket_path, AUTHKEY)
+    worker.get_all_user_records()
+
+    # 執行測試
+    for i in range(5):
+        worker.create_user(NewUser(Name=f"User {i}", Age=i))
+    records = worker.get_all_user_records()
+    resyncs = worker.get_storage_stats()['replica_resyncs']
+    server.stop_event.set()
+
+    # 驗證結果：落後超過 feed 長度時重新下載整張表
+    assert len(records) == 7
+    assert resyncs == 2
+
+def test_connect_timeout(socket_path):
+    # 執行測試並驗證異常：沒有 state server 時逾時
+    with pytest.raises(SharedStateUnavailableException):
+        UserSharedRepository(socket_path, AUTHKEY, connect_timeout=0.2)
+
+def test_socket_is_owner_only(server, socket_path):
+    # 驗證結果：其他使用者無法連線到 state server
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+def test_generated_authkey_is_shared_through_owner_only_file(tmp_path, socket_path):
+    # 準備測試數據：state server 產生金鑰檔，worker 只知道檔案位置
+    key_path = tmp_path / "state" / "users.key"
+    authkey = create_authkey(key_path)
+    repo = UserCSVRepository()
+    repo.add_multiple_users([User(Name="Test User", Age=25)])
+    server = serve_user_state(UserStateService(repo), socket_path, authkey)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # 執行測試
+    worker = UserSharedRepository(socket_path, authkey_path=key_path)
+    records = worker.get_all_user_records()
+    server.stop_event.set()
+
+    # 驗證結果：金鑰夠長、僅擁有者可讀，重啟時沿用同一把金鑰
+    assert records == [{"is_new": False, "Name": "Test User", "Age": 25}]
+    assert len(authkey) == 64
+    assert stat.S_IMODE(os.stat(key_path).st_mode) == 0o600
+    assert create_authkey(key_path) == authkey
+
+def test_connect_waits_for_authkey_file(tmp_path, socket_path):
+    # 執行測試並驗證異常：金鑰檔一直沒有出現時逾時
+    with pytest.raises(SharedStateUnavailableException):
+        UserSharedRepository(socket_path, authkey_path=tmp_path / "missing.key", connect_timeout=0.2)
+
+def test_journal_commit_waits_outside_service_lock(tmp_path):
+    # 準備測試數據：journal 的 commit 卡住，模擬緩慢的 fsync
+    repo = UserCSVRepository()
+    journal = UserJournal(tmp_path / "state", fsync=False)
+    repo.attach_journal(journal)
+    service = UserStateService(repo)
+    entered, release = threading.Event(), threading.Event()
+    commit = journal.commit
+
+    def slow_commit(seq):
+        entered.set()
+        release.wait(5)
+        commit(seq)
+
+    journal.commit = slow_commit
+    writer = threading.Thread(target=service.create_user, args=(NewUser(Name="Created User", Age=35),))
+    writer.start()
+    assert entered.wait(5)
+
+    # 執行測試：寫入還在等待 fsync 時，worker 仍可取得服務鎖拉取 change feed
+    changes = []
+    other = threading.Thread(target=lambda: changes.extend(service.changes_since(service.export()[0], 0)))
+    other.start()
+    other.join(2)
+    blocked = other.is_alive()
+    release.set()
+    writer.join()
+    other.join()
+
+    # 驗證結果
+    assert not blocked
+    assert [record['Name'] for _, record in changes] == ["Created User"]
+
+def test_cursor_is_valid_across_workers(server, socket_path):
+    # 準備測試數據：刪除讓列 id 出現空洞，之後才連線的 worker 需要保留伺服器端的 id
+    worker_a = UserSharedRepository(socket_path, AUTHKEY)
+    worker_a.delete_user(User(Name="Test User", Age=25))
+    worker_a.create_user(NewUser(Name="Created User", Age=35))
+    worker_b = UserSharedRepository(socket_path, AUTHKEY)
+    
+    # 執行測試：在 worker A 取得游標，到 worker B 取下一頁
+    first, cursor = worker_a.get_user_records_page(None, 1)
+    worker_b.create_user(NewUser(Name="Later User", Age=40))
+    second, next_cursor = worker_b.get_user_records_page(cursor, 5)
+    
+    # 驗證結果
+    assert first == [{"is_new": False, "Name": "Another User", "Age": 30}]
+    assert [r["Name"] for r in second] == ["Created User", "Later User"]
+    assert next_cursor is None
+
+def test_data_version_is_shared_across_workers(server, socket_path):
+    # 準備測試數據
+    worker_a = UserSharedRepository(socket_path, AUTHKEY)
+    worker_b = UserSharedRepository(socket_path, AUTHKEY)
+    version = worker_a.get_data_version()
+
+    # 執行測試
+    worker_b.create_user(NewUser(Name="Created User", Age=35))
+
+    # 驗證結果：任一個 worker 的寫入都會改變所有 worker 的版本
+    assert worker_a.get_data_version() == worker_b.get_data_version() != version
@@ -0,0 +1,236 @@
+import pytest
+import numpy as np
+from app.domain.user.models.user import User
+from app.domain.user.models.new_user import NewUser
+from app.infrastructure.repositories.exceptions import DataframeKeyException, GroupbyKeyException
+from app.infrastructure.repositories.user_repository_csv import UserCSVRepository
+from app.infrastructure.repositories.user_repository_sqlite import UserSQLiteRepository
+from app.interfaces.user_repository import UserGrouping
+from app.domain.user import UserAggregation, UserDedupStrategy
+from app.domain.user.models.user_columns import UserColumns
+
+@pytest.fixture
+def repository(tmp_path):
+    repo = UserSQLiteRepository(tmp_path / "users.sqlite3")
+    repo.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    return repo
+
+def test_create_and_get_all_user_records(repository):
+    # 執行測試
+    repository.create_user(NewUser(Name="Created User", Age=35))
+    
+    # 驗證結果
+    assert repository.get_all_user_records() == [
+        {"is_new": False, "Name": "Test User", "Age": 25},
+        {"is_new": False, "Name": "Another User", "Age": 30},
+        {"is_new": True, "Name": "Created User", "Age": 35},
+    ]
+    assert repository.get_added_user() == [NewUser(Name="Created User", Age=35)]
+
+def test_has_and_delete_user(repository):
+    # 準備測試數據
+    user = User(Name="Test User", Age=25)
+    
+    # 執行測試並驗證結果
+    assert repository.has_user(user) is True
+    assert repository.get_user_ids(user) == [1]
+    repository.delete_user(user)
+    assert repository.has_user(user) is False
+
+def test_delete_user_by_name(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Another User", Age=31))
+    
+    # 執行測試
+    repository.delete_user_by_name("Another User")
+    
+    # 驗證結果
+    assert repository.get_users_by_name("Another User") == []
+    assert [u.Name for u in repository.get_all_users()] == ["Test User"]
+
+def test_group_average_pushed_down(repository):
+    # 準備測試數據
+    repository.create_user(NewUser(Name="Tom", Age=35))
+    
+    # 執行測試
+    grouping = repository.get_grouped_users_by_first_char("Name")
+    
+    # 驗證結果
+    assert grouping == UserGrouping("Name", prefix_length=1)
+    assert repository.compute_group_average(grouping, "Age") == {"A": 30.0, "T": 30.0}
+    assert repository.get_average_age_by_first_char() == {"A": 30.0, "T": 30.0}
+    with pytest.raises(GroupbyKeyException):
+        repository.compute_group_average(grouping, "invalid_field")
+    with pytest.raises(DataframeKeyException):
+        repository.get_grouped_users_by("invalid_field")
+
+def test_group_average_rejects_unknown_group_field(repository):
+    # 執行測試並驗證異常：分組欄位必須在白名單內，不能直接組進 SQL
+    with pytest.raises(GroupbyKeyException):
+        repository.compute_group_average(UserGrouping("Age) FROM users; --"), "Age")
+    with pytest.raises(GroupbyKeyException):
+        repository.compute_group_average(UserGrouping("Missing", prefix_length=1), "Age")
+
+def test_data_survives_reopen(repository, tmp_path):
+    # 執行測試：以新的連線重新開啟同一個檔案
+    reopened = UserSQLiteRepository(tmp_path / "users.sqlite3")
+    
+    # 驗證結果
+    assert reopened.get_storage_stats()["rows"] == 2
+    assert reopened.get_all_user_records() == repository.get_all_user_records()
+
+def test_parity_with_csv_repository(repository):
+    # 準備測試數據：兩個後端執行相同操作
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    for repo in (repository, csv_repository):
+        repo.add_multiple_users([NewUser(Name="Amy", Age=20), NewUser(Name="Tina", Age=22)])
+        repo.delete_user(User(Name="Test User", Age=25))
+        repo.create_user(NewUser(Name="Bob", Age=50))
+    
+    # 驗證結果
+    assert repository.get_all_user_records() == csv_repository.get_all_user_records()
+    assert repository.get_average_age_by_first_char() == csv_repository.get_average_age_by_first_char()
+    grouping = UserGrouping("Age")
+    assert repository.compute_group_average(grouping, "Age") == csv_repository.compute_group_average(grouping, "Age")
+
+@pytest.mark.parametrize("strategy", [UserDedupStrategy.SKIP_DUPLICATES, UserDedupStrategy.UPSERT])
+def test_merge_user_columns_matches_csv_repository(repository, strategy):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    columns = UserColumns(names=["Test User", "Another User", "New User", "Test User", "New User"],
+                          ages=np.array([25, 31, 40, 26, 40]), is_new=True)
+    
+    # 執行測試
+    summaries = [repo.merge_user_columns(columns, strategy) for repo in (repository, csv_repository)]
+    
+    # 驗證結果
+    assert summaries[0] == summaries[1]
+    assert sorted(map(str, repository.get_all_user_records())) == sorted(map(str, csv_repository.get_all_user_records()))
+
+def test_user_records_page_matches_csv_repository(repository):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    for repo in (repository, csv_repository):
+        repo.create_user(NewUser(Name="Created User", Age=35))
+        repo.delete_user(User(Name="Another User", Age=30))
+    
+    # 執行測試
+    def all_pages(repo):
+        pages, cursor = [], None
+        while True:
+            page, cursor = repo.get_user_records_page(cursor, 1)
+            pages.append(page)
+            if cursor is None:
+                return pages
+    
+    # 驗證結果
+    assert all_pages(repository) == all_pages(csv_repository) == [
+        [{"is_new": False, "Name": "Test User", "Age": 25}],
+        [{"is_new": True, "Name": "Created User", "Age": 35}],
+    ]
+
+@pytest.mark.parametrize("grouping", [
+    UserGrouping("Name", prefix_length=1),
+    UserGrouping("Name", prefix_length=2, casefold=True),
+    UserGrouping("Age", bucket_size=10),
+])
+def test_compute_group_stats_matches_csv_repository(repository, grouping):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    users = [User(Name="Test User", Age=25), User(Name="Another User", Age=30),
+             User(Name="tEst Two", Age=37), User(Name="Anna", Age=31)]
+    csv_repository.add_multiple_users(users)
+    repository.add_multiple_users(users[2:])
+    aggregations = list(UserAggregation)
+    
+    # 執行測試
+    expected = csv_repository.compute_group_stats(grouping, "Age", aggregations)
+    actual = repository.compute_group_stats(grouping, "Age", aggregations)
+    
+    # 驗證結果
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key])
+
+@pytest.mark.parametrize("grouping", [
+    UserGrouping("Name", casefold=True),
+    UserGrouping("Name", prefix_length=1, casefold=True),
+    UserGrouping("Age", bucket_size=10),
+])
+def test_compute_group_average_matches_csv_repository(repository, grouping):
+    # 準備測試數據：非 ASCII 名稱只有 casefold 才會合併
+    csv_repository = UserCSVRepository()
+    users = [User(Name="Émile", Age=20), User(Name="éMILE", Age=41), User(Name="Öz", Age=33),
+             User(Name="öz", Age=35), User(Name="Straße", Age=50)]
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    csv_repository.add_multiple_users(users)
+    repository.add_multiple_users(users)
+    
+    # 執行測試
+    expected = csv_repository.compute_group_average(grouping, "Age")
+    actual = repository.compute_group_average(grouping, "Age")
+    
+    # 驗證結果
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        assert actual[key] == pytest.approx(expected[key])
+
+def test_data_version_changes_only_on_writes(repository, tmp_path):
+    # 準備測試數據
+    version = repository.get_data_version()
+    
+    # 執行測試
+    repository.delete_user(User(Name="Nobody", Age=1))
+    unchanged = repository.get_data_version()
+    repository.create_user(NewUser(Name="Versioned User", Age=20))
+    
+    # 驗證結果：版本存在資料庫中，其他連線看到相同版本
+    assert unchanged == version
+    assert repository.get_data_version() != version
+    assert UserSQLiteRepository(tmp_path / "users.sqlite3").get_data_version() == repository.get_data_version()
+
+def test_search_user_records_matches_csv_repository(repository):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    for repo in (repository, csv_repository):
+        repo.add_multiple_users([User(Name="Tester", Age=1), User(Name="Test User", Age=2), User(Name="Tf", Age=3)])
+        repo.create_user(NewUser(Name="Test\U0010ffff", Age=4))
+    
+    # 執行測試
+    results = [(repo.search_user_records("Test", 10), repo.search_user_records("Test", 2, 1),
+                repo.search_user_records("T", 10, 4)) for repo in (repository, csv_repository)]
+    
+    # 驗證結果
+    assert results[0] == results[1]
+    assert [record["Name"] for record in results[0][0]] == ["Test User", "Test User", "Tester", "Test\U0010ffff"]
+
+def test_age_queries_match_csv_repository(repository):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    for repo in (repository, csv_repository):
+        repo.add_multiple_users([User(Name=f"User {i}", Age=i % 7 * 10) for i in range(20)])
+        repo.delete_user(User(Name="User 3", Age=30))
+    
+    # 執行測試
+    results = [(repo.get_user_records_by_age(10, 30, 5, 2), repo.get_user_records_by_age(None, None, 3),
+                repo.get_age_percentiles([0, 33.3, 50, 100]),
+                repo.get_user_records_by_age_rank(4, True), repo.get_user_records_by_age_rank(4, False))
+               for repo in (repository, csv_repository)]
+    
+    # 驗證結果
+    assert results[0] == results[1]
+
+def test_sketch_stats_match_csv_repository(repository):
+    # 準備測試數據
+    csv_repository = UserCSVRepository()
+    csv_repository.add_multiple_users([User(Name="Test User", Age=25), User(Name="Another User", Age=30)])
+    for repo in (repository, csv_repository):
+        repo.add_multiple_users([User(Name=f"User {i}", Age=i % 50) for i in range(300)])
+    
+    # 執行測試 & 驗證結果
+    assert repository.get_sketch_stats([10, 50]) == csv_repository.get_sketch_stats([10, 50])
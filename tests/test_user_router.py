@@ -1,4 +1,9 @@
 import io
+import time
+import pytest
+from app.core.settings import settings
+from app.infrastructure.repositories.user_sketches import UserSketches
+
 
 def test_create_user(client):
     # 準備測試數據
@@ -13,6 +18,7 @@ def test_create_user(client):
     # 驗證結果
     assert response.status_code == 200
 
+
 def test_delete_user(client):
     # 準備測試數據
     test_user = {
@@ -26,6 +32,7 @@ def test_delete_user(client):
     # 驗證結果
     assert response.status_code == 200
 
+
 def test_get_added_user(client):
     # 執行測試
     response = client.get("/get_added_user")
@@ -40,6 +47,7 @@ def test_get_added_user(client):
         assert "Name" in user
         assert "Age" in user
 
+
 def test_add_multiple_users_from_csv(client):
     # 準備測試數據
     csv_content = "Name,Age\nTest User 1,25\nTest User 2,30"
@@ -54,6 +62,7 @@ def test_add_multiple_users_from_csv(client):
     # 驗證結果
     assert response.status_code == 200
 
+
 def test_calc_average_age_of_user_grouped_by_first_char_of_name(client):
     # 執行測試
     response = client.get("/calc_average_age_of_user_grouped_by_first_char_of_name")
@@ -66,6 +75,7 @@ def test_calc_average_age_of_user_grouped_by_first_char_of_name(client):
     for avg_age in result.values():
         assert isinstance(avg_age, (int, float))
 
+
 def test_create_user_empty_name(client):
     # 準備測試數據 - 無效的用戶數據
     empty_name_user = {
@@ -80,6 +90,7 @@ def test_create_user_empty_name(client):
     assert response.status_code == 422
     assert "detail" in response.json()
 
+
 def test_create_user_negative_age(client):
     # 準備測試數據 - 無效的用戶數據
     negative_age_user = {
@@ -94,6 +105,7 @@ def test_create_user_negative_age(client):
     assert response.status_code == 422
     assert "detail" in response.json()
 
+
 def test_delete_nonexistent_user(client):
     # 準備測試數據
     nonexistent_user = {
@@ -108,6 +120,7 @@ def test_delete_nonexistent_user(client):
     assert response.status_code == 404
     assert "detail" in response.json()
 
+
 def test_create_user_with_invalid_type(client):
     # 準備測試數據 - 類型錯誤
     invalid_user = {
@@ -134,4 +147,277 @@ def test_create_user_with_missing_field(client):
     
     # 驗證結果
     assert response.status_code == 422
-    assert "detail" in response.json()
\ No newline at end of file
+    assert "detail" in response.json()
+
+
+def test_get_users_by_name(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Lookup User", "Age": 33})
+    
+    # 執行測試
+    response = client.get("/api/v1/users/by_name/Lookup User")
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert {"is_new": True, "Name": "Lookup User", "Age": 33} in response.json()
+    assert client.get("/api/v1/users/by_name/Nobody At All").json() == []
+
+
+def test_import_users_from_csv_upload(client):
+    # 準備測試數據
+    valid_csv = "Name,Age\nStream User,25\nStream User,30\n"
+    invalid_csv = valid_csv + "Bad User,-1\n"
+    
+    # 執行測試
+    imported = client.post("/api/v1/add_multiple_users_from_csv",
+                           files={"file": ("test.csv", io.BytesIO(valid_csv.encode()), "text/csv")})
+    rejected = client.post("/api/v1/add_multiple_users_from_csv",
+                           files={"file": ("bad.csv", io.BytesIO(invalid_csv.encode()), "text/csv")})
+    partial = client.post("/api/v1/add_multiple_users_from_csv", params={"mode": "partial"},
+                          files={"file": ("bad.csv", io.BytesIO(invalid_csv.encode()), "text/csv")})
+    
+    # 驗證結果
+    assert imported.status_code == 200
+    assert imported.json() == {"imported": 2, "inserted": 2, "skipped": 0, "updated": 0,
+                               "rejected_count": 0, "rejected": []}
+    assert rejected.status_code == 422
+    assert rejected.json()["rejected"] == [{"row": 3, "reason": "User age cannot be negative."}]
+    assert partial.json()["imported"] == 2
+    assert partial.json()["rejected"] == rejected.json()["rejected"]
+    # strict 模式被拒絕時不寫入任何資料，partial 模式寫入合格的兩筆
+    assert len(client.get("/api/v1/users/by_name/Stream User").json()) == 4
+
+
+def test_import_users_from_csv_on_duplicate(client):
+    # 準備測試數據
+    csv = "Name,Age\nDedup User,25\nDedup Other,30\n"
+    changed = "Name,Age\nDedup User,26\nDedup New,40\n"
+    
+    def upload(content, on_duplicate):
+        return client.post("/api/v1/add_multiple_users_from_csv", params={"on_duplicate": on_duplicate},
+                           files={"file": ("test.csv", io.BytesIO(content.encode()), "text/csv")}).json()
+    
+    # 執行測試
+    first = upload(csv, "skip_duplicates")
+    again = upload(csv, "skip_duplicates")
+    upserted = upload(changed, "upsert")
+    
+    # 驗證結果
+    assert (first["inserted"], first["skipped"]) == (2, 0)
+    # 重新上傳同一個檔案不會產生重複的使用者
+    assert (again["inserted"], again["skipped"]) == (0, 2)
+    assert (upserted["inserted"], upserted["updated"]) == (1, 1)
+    users = client.get("/api/v1/users/by_name/Dedup User").json()
+    assert [user["Age"] for user in users] == [26]
+    assert len(client.get("/api/v1/users/by_name/Dedup Other").json()) == 1
+
+
+def test_import_job_endpoints(client):
+    # 準備測試數據
+    csv_content = "Name,Age\nJob Router User,25\nJob Router User,30\n"
+    
+    # 執行測試
+    created = client.post("/api/v1/imports", files={"file": ("test.csv", io.BytesIO(csv_content.encode()), "text/csv")})
+    job_id = created.json()["id"]
+    for _ in range(100):
+        status = client.get(f"/api/v1/imports/{job_id}").json()
+        if status["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.05)
+    
+    # 驗證結果
+    assert created.status_code == 202
+    assert status["status"] == "succeeded"
+    assert status["rows_imported"] == 2
+    assert client.delete(f"/api/v1/imports/{job_id}").json()["status"] == "succeeded"
+    assert client.get("/api/v1/imports/missing").status_code == 404
+
+
+def test_get_storage_stats(client):
+    # 執行測試
+    response = client.get("/api/v1/users/storage")
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert {"dead_rows", "dead_ratio", "compactions", "upload_cache_hit_ratio"} <= response.json().keys()
+
+
+def test_search_users(client):
+    # 準備測試數據
+    for name, age in [("Prefix Bob", 30), ("Prefix Ann", 20), ("Other", 40)]:
+        client.post("/api/v1/create_user", json={"Name": name, "Age": age})
+    
+    # 執行測試
+    response = client.get("/api/v1/users/search", params={"prefix": "Prefix", "limit": 1, "offset": 1})
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert response.json() == [{"is_new": True, "Name": "Prefix Bob", "Age": 30}]
+    assert client.get("/api/v1/users/search", params={"prefix": ""}).status_code == 422
+
+
+def test_age_index_endpoints(client):
+    # 準備測試數據
+    for name, age in [("Age Low", 1), ("Age Mid", 150), ("Age High", 151)]:
+        client.post("/api/v1/create_user", json={"Name": name, "Age": age})
+    
+    # 執行測試
+    by_age = client.get("/api/v1/users/by_age", params={"min_age": 150, "max_age": 151})
+    oldest = client.get("/api/v1/users/top_by_age", params={"order": "oldest", "limit": 1})
+    percentiles = client.get("/api/v1/users/age_percentiles", params={"q": [0, 100]})
+    
+    # 驗證結果
+    assert by_age.json() == {"users": [{"is_new": True, "Name": "Age Mid", "Age": 150},
+                                       {"is_new": True, "Name": "Age High", "Age": 151}], "total": 2}
+    assert oldest.json() == [{"is_new": True, "Name": "Age High", "Age": 151}]
+    assert percentiles.json()["100"] == 151
+    assert client.get("/api/v1/users/age_percentiles", params={"q": 150}).status_code == 422
+
+
+def test_sketch_endpoints(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Sketch User", "Age": 33})
+    
+    # 執行測試
+    stats = client.get("/api/v1/users/sketch_stats", params={"q": [50, 99.5]})
+    blob = client.get("/api/v1/users/sketches")
+    
+    # 驗證結果
+    assert stats.status_code == 200
+    assert set(stats.json()["total"]["percentiles"]) == {"50", "99.5"}
+    assert stats.json()["groups"]["S"]["count"] >= 1
+    assert blob.headers["content-type"] == "application/octet-stream"
+    assert UserSketches.from_bytes(blob.content).stats([50])["total"]["count"] == stats.json()["total"]["count"]
+
+
+def test_get_memory_usage(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Memory User", "Age": 40})
+    
+    # 執行測試
+    response = client.get("/api/v1/users/memory")
+    
+    # 驗證結果
+    assert response.status_code == 200
+    body = response.json()
+    # 預設為一般布局，compact_storage 開啟時為精簡布局
+    assert body["layout"] == ("compact" if settings.compact_storage else "plain")
+    assert body["rows"] >= 1
+    assert {"frame_bytes", "plain_total_bytes", "savings_ratio"} <= body.keys()
+
+
+def test_get_all_users(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Listed User", "Age": 21})
+    
+    # 執行測試
+    response = client.get("/api/v1/get_all_users")
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert response.content.endswith(b'{"is_new":true,"Name":"Listed User","Age":21}]')
+
+
+def test_calc_average_age_matches_full_recompute(client):
+    # 準備測試數據
+    from app.di.container import container
+    repository = container.user_repository()
+    client.post("/api/v1/create_user", json={"Name": "Zed", "Age": 44})
+    
+    # 執行測試
+    response = client.get("/api/v1/calc_average_age_of_user_grouped_by_first_char_of_name")
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert response.json() == repository._recompute_average_age_by_first_char()
+
+
+def test_get_all_users_cursor_pagination(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Paged User", "Age": 22})
+    expected = client.get("/api/v1/get_all_users").json()
+    
+    # 執行測試：逐頁取回所有使用者
+    users, cursor = [], None
+    while True:
+        params = {"limit": 7} if cursor is None else {"limit": 7, "cursor": cursor}
+        page = client.get("/api/v1/get_all_users", params=params).json()
+        users.extend(page["users"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    
+    # 驗證結果
+    assert users == expected
+    assert client.get("/api/v1/get_all_users", params={"limit": 0}).status_code == 422
+
+
+def test_get_all_users_ndjson_stream(client):
+    # 準備測試數據
+    import json
+    expected = client.get("/api/v1/get_all_users").json()
+    
+    # 執行測試
+    response = client.get("/api/v1/get_all_users", params={"format": "ndjson"})
+    
+    # 驗證結果
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == expected
+
+
+def test_get_user_stats(client):
+    # 準備測試數據
+    client.post("/api/v1/create_user", json={"Name": "Stats User", "Age": 50})
+    averages = client.get("/api/v1/calc_average_age_of_user_grouped_by_first_char_of_name").json()
+    
+    # 執行測試
+    response = client.get("/api/v1/users/stats",
+                          params={"prefix": 1, "agg": ["count", "mean", "max"]})
+    
+    # 驗證結果：一次呼叫涵蓋平均值 API 的結果
+    assert response.status_code == 200
+    stats = response.json()
+    assert {key: value["mean"] for key, value in stats.items()} == pytest.approx(averages)
+    assert set(stats["S"]) == {"count", "mean", "max"}
+    assert client.get("/api/v1/users/stats", params={"agg": "median"}).status_code == 422
+    assert client.get("/api/v1/users/stats", params={"group_by": "Missing"}).status_code == 400
+
+
+@pytest.mark.parametrize("url", [
+    "/api/v1/get_all_users",
+    "/api/v1/get_added_user",
+    "/api/v1/calc_average_age_of_user_grouped_by_first_char_of_name",
+    "/api/v1/users/stats?prefix=1&agg=count",
+])
+
+
+def test_read_endpoints_etag(client, url):
+    # 準備測試數據
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    
+    # 執行測試：資料未變時回 304，寫入後回新內容
+    not_modified = client.get(url, headers={"If-None-Match": etag})
+    client.post("/api/v1/create_user", json={"Name": "Etag User", "Age": 27})
+    modified = client.get(url, headers={"If-None-Match": etag})
+    
+    # 驗證結果
+    assert first.status_code == 200
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert modified.status_code == 200
+    assert modified.headers["ETag"] != etag
+    assert modified.json() != first.json()
+
+
+def test_read_endpoint_served_from_cache(client):
+    # 準備測試數據
+    client.get("/api/v1/get_all_users")
+    hits = client.get("/api/v1/users/storage").json()["response_cache_hits"]
+    
+    # 執行測試
+    client.get("/api/v1/get_all_users")
+    
+    # 驗證結果
+    assert client.get("/api/v1/users/storage").json()["response_cache_hits"] == hits + 1
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from app.infrastructure.repositories.user_sketches import AgeHistogram, HyperLogLog, TDigest, UserSketches
+
+def rank_error(digest, values):
+    """t-digest 估計值在精確資料中的排名與 q 的最大差距"""
+    ordered = np.sort(values)
+    worst = 0.0
+    for q in np.linspace(0, 1, 201):
+        estimate = digest.quantile(q)
+        low = np.searchsorted(ordered, estimate, "left") / len(ordered)
+        high = np.searchsorted(ordered, estimate, "right") / len(ordered)
+        worst = max(worst, 0.0 if low <= q <= high else min(abs(q - low), abs(q - high)))
+    return worst
+
+@pytest.mark.parametrize("values", [
+    np.random.default_rng(1).lognormal(3, 1, 100_000),
+    np.random.default_rng(2).integers(0, 100, 100_000).astype(float),
+])
+def test_tdigest_rank_error_within_one_percent(values):
+    # 準備測試數據：單一 digest 分批寫入，以及四個 worker 各自建立後合併
+    single = TDigest()
+    for chunk in np.array_split(values, 50):
+        single.add_many(chunk)
+    workers = [TDigest() for _ in range(4)]
+    for digest, chunk in zip(workers, np.array_split(values, 4)):
+        digest.add_many(chunk)
+    for digest in workers[1:]:
+        workers[0].merge(digest)
+    
+    # 執行測試
+    restored = TDigest.from_bytes(single.to_bytes())
+    
+    # 驗證結果
+    for digest in (single, workers[0], restored):
+        assert rank_error(digest, values) <= 0.01
+        assert digest.quantile(0) == values.min()
+        assert digest.quantile(1) == values.max()
+    assert len(single.to_bytes()) < 4096
+
+def test_tdigest_small_input_is_exact():
+    # 準備測試數據
+    values = [5.0, 1.0, 9.0, 3.0]
+    digest = TDigest()
+    digest.add_many(values)
+    
+    # 執行測試 & 驗證結果
+    for q in [0, 0.1, 0.5, 0.75, 1]:
+        assert digest.quantile(q) == pytest.approx(np.percentile(values, q * 100))
+    assert TDigest().quantile(0.5) is None
+
+@pytest.mark.parametrize("distinct", [50, 3_000, 100_000])
+def test_hyperloglog_error_within_three_sigma(distinct):
+    # 準備測試數據：每個名稱出現兩次，分給兩個 worker 後合併
+    names = [f"user-{i}" for i in range(distinct)]
+    first, second = HyperLogLog(), HyperLogLog()
+    first.add_many(names)
+    second.add_many(names[::-1])
+    
+    # 執行測試
+    first.merge(HyperLogLog.from_bytes(second.to_bytes()))
+    
+    # 驗證結果：標準誤差 1.04/sqrt(4096) ≈ 1.6%
+    assert first.estimate() == pytest.approx(distinct, rel=3 * 1.04 / 64)
+
+def test_histogram_is_exact_and_mergeable():
+    # 準備測試數據
+    ages = np.random.default_rng(3).integers(0, 120, 10_000)
+    first, second = AgeHistogram(), AgeHistogram()
+    first.add_many(ages[:4000])
+    second.add_many(ages[4000:])
+    
+    # 執行測試
+    first.merge(AgeHistogram.from_bytes(second.to_bytes()))
+    first.add_many(ages[:10], sign=-1)
+    
+    # 驗證結果
+    remaining = ages[10:]
+    assert first.bins() == dict(zip(*np.unique(remaining, return_counts=True)))
+    assert first.quantile(0.5) == np.percentile(remaining, 50)
+
+def test_histogram_memory_does_not_depend_on_max_age():
+    # 準備測試數據：遠超過 120 歲的年齡不應配置稠密的區間陣列
+    histogram = AgeHistogram()
+    
+    # 執行測試
+    histogram.add_many([30, 5_000_000_000])
+    restored = AgeHistogram.from_bytes(histogram.to_bytes())
+    
+    # 驗證結果
+    assert len(histogram.counts) == 2
+    assert restored.bins() == {30: 1, 5_000_000_000: 1}
+    assert restored.quantile(1.0) == 5_000_000_000
+    assert restored.quantile(0.5) == pytest.approx((30 + 5_000_000_000) / 2)
+
+def test_user_sketches_merge_and_serialization():
+    # 準備測試數據
+    rng = np.random.default_rng(4)
+    names = [f"{chr(65 + i % 5)}{i}" for i in rng.integers(0, 20_000, 30_000)]
+    ages = rng.integers(0, 90, 30_000).tolist()
+    whole, merged = UserSketches(), UserSketches()
+    whole.add_many(names, ages)
+    for start in range(0, 30_000, 10_000):
+        worker = UserSketches()
+        worker.add_many(names[start:start + 10_000], ages[start:start + 10_000])
+        merged.merge(UserSketches.from_bytes(worker.to_bytes()))
+    
+    # 執行測試
+    stats, merged_stats = whole.stats([50]), merged.stats([50])
+    
+    # 驗證結果
+    assert merged_stats["total"]["count"] == stats["total"]["count"] == 30_000
+    assert merged_stats["total"]["histogram"] == stats["total"]["histogram"]
+    assert merged_stats["total"]["distinct_names"] == stats["total"]["distinct_names"]
+    assert merged_stats["total"]["distinct_names"] == pytest.approx(len(set(names)), rel=0.05)
+    assert set(stats["groups"]) == {"A", "B", "C", "D", "E"}
+    assert len(whole.to_bytes()) < 64 * 1024
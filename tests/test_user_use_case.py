@@ -1,12 +1,14 @@
 import pytest
 from unittest.mock import MagicMock
+import numpy as np
 from app.use_cases.user.user_use_case import UserUseCase
 from app.domain.user.models.new_user import NewUser
 from app.domain.user.models.user import User
-from app.use_cases.user.exceptions import UserNotFoundError
-from app.interfaces.user_repository import IUserRepository
+from app.domain.user.models.user_columns import UserColumns
+from app.use_cases.user.exceptions import InvalidPercentileError, UserImportRejectedError, UserNotFoundError
+from app.domain.user import UserAggregation, UserDedupStrategy, UserImportMode
+from app.interfaces.user_repository import IUserRepository, UserGrouping
 from app.interfaces.user_data_loader import IUserDataLoader
-from app.domain.user import UserField
 
 @pytest.fixture
 def mock_repository():
@@ -37,27 +39,24 @@ def test_add_multiple_users(user_use_case, mock_repository):
 
 def test_calc_average_age_grouped_by_first_char_of_name(user_use_case, mock_repository):
     # 準備測試數據
-    mock_repository.get_grouped_users_by_first_char.return_value = {"A": [User(Name="Alice", Age=25), User(Name="Anna", Age=35)]}
-    mock_repository.compute_group_average.return_value = 30.0
+    mock_repository.get_average_age_by_first_char.return_value = {"A": 30.0}
     
     # 執行測試
     result = user_use_case.calc_average_age_grouped_by_first_char_of_name()
     
     # 驗證結果
-    assert result == 30.0
-    mock_repository.get_grouped_users_by_first_char.assert_called_once_with(UserField.NAME.value)
-    mock_repository.compute_group_average.assert_called_once()
+    assert result == {"A": 30.0}
+    mock_repository.get_average_age_by_first_char.assert_called_once_with()
 
 def test_calc_average_age_grouped_by_first_char_of_name_no_users(user_use_case, mock_repository):
     # 準備測試數據
-    mock_repository.get_grouped_users_by_first_char.return_value = {}
-    mock_repository.compute_group_average.return_value = None
+    mock_repository.get_average_age_by_first_char.return_value = {}
     
     # 執行測試
     result = user_use_case.calc_average_age_grouped_by_first_char_of_name()
     
     # 驗證結果
-    assert result is None
+    assert result == {}
 
 def test_init_users(user_use_case, mock_loader):
     # 準備測試數據
@@ -116,7 +115,7 @@ def test_create_user(user_use_case, mock_repository):
 def test_delete_user(user_use_case, mock_repository):
     # 準備測試數據
     user = User(Name="Test User", Age=25)
-    mock_repository.has_user.return_value = True
+    mock_repository.delete_user.return_value = 1
     
     # 執行測試
     user_use_case.delete_user(user)
@@ -127,8 +126,154 @@ def test_delete_user(user_use_case, mock_repository):
 def test_delete_nonexistent_user(user_use_case, mock_repository):
     # 準備測試數據
     user = User(Name="Test User", Age=25)
-    mock_repository.has_user.return_value = False
+    mock_repository.delete_user.return_value = 0
     
     # 執行測試並驗證異常
     with pytest.raises(UserNotFoundError):
-        user_use_case.delete_user(user) 
\ No newline at end of file
+        user_use_case.delete_user(user) 
+def test_get_users_by_name(user_use_case, mock_repository):
+    # 準備測試數據
+    expected_users = [User(Name="Test User", Age=25)]
+    mock_repository.get_users_by_name.return_value = expected_users
+    
+    # 執行測試
+    users = user_use_case.get_users_by_name("Test User")
+    
+    # 驗證結果
+    assert users == expected_users
+    mock_repository.get_users_by_name.assert_called_once_with("Test User")
+
+def test_get_storage_stats(user_use_case, mock_repository):
+    # 準備測試數據
+    mock_repository.get_storage_stats.return_value = {"dead_rows": 0}
+    
+    # 執行測試並驗證結果
+    assert user_use_case.get_storage_stats() == {"dead_rows": 0}
+
+def test_get_all_user_records(user_use_case, mock_repository):
+    # 準備測試數據
+    expected = [{"is_new": False, "Name": "Test User", "Age": 25}]
+    mock_repository.get_all_user_records.return_value = expected
+    
+    # 執行測試並驗證結果
+    assert user_use_case.get_all_user_records() == expected
+
+def test_get_added_user_records(user_use_case, mock_repository):
+    # 準備測試數據
+    expected = [{"Name": "Test User", "Age": 25}]
+    mock_repository.get_added_user_records.return_value = expected
+    
+    # 執行測試並驗證結果
+    assert user_use_case.get_added_user_records() == expected
+
+def test_init_user_columns(user_use_case, mock_loader, mock_repository):
+    # 準備測試數據
+    columns = UserColumns(names=["User 1"], ages=np.array([25]))
+    mock_loader.init_user_columns.return_value = columns
+    
+    # 執行測試
+    user_use_case.add_user_columns(user_use_case.init_user_columns("test.csv"))
+    
+    # 驗證結果
+    mock_loader.init_user_columns.assert_called_once_with("test.csv")
+    mock_repository.add_user_columns.assert_called_once_with(columns)
+
+def test_import_users_from_csv(user_use_case, mock_loader, mock_repository):
+    # 準備測試數據
+    chunks = [UserColumns(names=["User 1", "User 2"], ages=np.array([25, 30]), is_new=True),
+              UserColumns(names=["User 3"], ages=np.array([35]), is_new=True)]
+    mock_loader.iter_user_columns.side_effect = lambda source, chunk_size, report: iter(chunks)
+    
+    # 執行測試
+    report = user_use_case.import_users_from_csv("test.csv", 2, UserImportMode.PARTIAL)
+    
+    # 驗證結果
+    assert report.imported == 3
+    assert mock_loader.iter_user_columns.call_count == 1
+    assert [call.args[0] for call in mock_repository.add_user_columns.call_args_list] == chunks
+
+def test_import_users_from_csv_with_dedup_strategy(user_use_case, mock_loader, mock_repository):
+    # 準備測試數據
+    chunks = [UserColumns(names=["User 1", "User 2"], ages=np.array([25, 30]), is_new=True)]
+    mock_loader.iter_user_columns.side_effect = lambda source, chunk_size, report: iter(chunks)
+    mock_repository.merge_user_columns.return_value = {"inserted": 1, "skipped": 0, "updated": 1}
+    
+    # 執行測試
+    report = user_use_case.import_users_from_csv("test.csv", 2, UserImportMode.PARTIAL,
+                                                 strategy=UserDedupStrategy.UPSERT)
+    
+    # 驗證結果
+    assert (report.imported, report.inserted, report.updated) == (2, 1, 1)
+    mock_repository.merge_user_columns.assert_called_once_with(chunks[0], UserDedupStrategy.UPSERT)
+    mock_repository.add_user_columns.assert_not_called()
+
+def test_import_users_from_csv_strict_rejects_before_writing(user_use_case, mock_loader, mock_repository):
+    # 準備測試數據：驗證階段回報一筆不合格的列
+    def iter_user_columns(source, chunk_size, report):
+        report.add_rejected([2], ["User age cannot be negative."])
+        return iter([UserColumns(names=["User 1"], ages=np.array([25]), is_new=True)])
+    mock_loader.iter_user_columns.side_effect = iter_user_columns
+    
+    # 執行測試
+    with pytest.raises(UserImportRejectedError) as exc_info:
+        user_use_case.import_users_from_csv("test.csv", 2)
+    
+    # 驗證結果
+    assert exc_info.value.to_response()["rejected"] == [{"row": 2, "reason": "User age cannot be negative."}]
+    mock_repository.add_user_columns.assert_not_called()
+
+def test_iter_user_record_chunks(user_use_case, mock_repository):
+    # 準備測試數據：repository 分兩頁回傳
+    first = [{"is_new": False, "Name": "User 1", "Age": 25}]
+    second = [{"is_new": True, "Name": "User 2", "Age": 30}]
+    mock_repository.get_user_records_page.side_effect = [(first, 0), (second, None)]
+    
+    # 執行測試
+    chunks = list(user_use_case.iter_user_record_chunks(1))
+    
+    # 驗證結果
+    assert chunks == [first, second]
+    assert mock_repository.get_user_records_page.call_args_list[1].args == (0, 1)
+
+def test_get_user_stats(user_use_case, mock_repository):
+    # 準備測試數據
+    grouping = UserGrouping("Age", bucket_size=10)
+    mock_repository.compute_group_stats.return_value = {20: {"count": 2}}
+    
+    # 執行測試
+    result = user_use_case.get_user_stats(grouping, "Age", [UserAggregation.COUNT])
+    
+    # 驗證結果
+    assert result == {20: {"count": 2}}
+    mock_repository.compute_group_stats.assert_called_once_with(grouping, "Age", [UserAggregation.COUNT])
+
+def test_search_users(user_use_case, mock_repository):
+    # 準備測試數據
+    mock_repository.search_user_records.return_value = [{"is_new": False, "Name": "Test User", "Age": 25}]
+    
+    # 執行測試
+    result = user_use_case.search_users("Te", 5, 10)
+    
+    # 驗證結果
+    assert result == [{"is_new": False, "Name": "Test User", "Age": 25}]
+    mock_repository.search_user_records.assert_called_once_with("Te", 5, 10)
+
+def test_get_age_percentiles_rejects_out_of_range(user_use_case, mock_repository):
+    # 準備測試數據
+    mock_repository.get_age_percentiles.return_value = {50: 30.0}
+    
+    # 執行測試 & 驗證結果
+    assert user_use_case.get_age_percentiles([50]) == {50: 30.0}
+    with pytest.raises(InvalidPercentileError):
+        user_use_case.get_age_percentiles([101])
+    mock_repository.get_age_percentiles.assert_called_once_with([50])
+
+def test_get_sketch_stats(user_use_case, mock_repository):
+    # 準備測試數據
+    mock_repository.get_sketch_stats.return_value = {"groups": {}, "total": {"count": 0}}
+    
+    # 執行測試 & 驗證結果
+    assert user_use_case.get_sketch_stats([50]) == {"groups": {}, "total": {"count": 0}}
+    with pytest.raises(InvalidPercentileError):
+        user_use_case.get_sketch_stats([-1])
+    mock_repository.get_sketch_stats.assert_called_once_with([50])